@@ -15,53 +15,313 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
 
+import base64
 import datetime
 import html
+import json
 import logging
 
 from ckan import model
-from ckan.common import config
-from ckan.lib import base, mailer
+from ckan.common import asbool
+from ckan.lib.dictization import model_dictize
 from ckan.plugins import toolkit as tk
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 
-from . import constants, db, validator
+from . import cache, constants, db, notifications, validator
 
 log = logging.getLogger(__name__)
 
-# Avoid user_show lag
-USERS_CACHE = {}
+# Avoid user_show, organization_show and package_show lag. Their limits are
+# set by the plugin from the configuration
+USERS_CACHE = cache.LRUCache()
+ORGANIZATIONS_CACHE = cache.LRUCache()
+PACKAGES_CACHE = cache.LRUCache()
+
+# Number of open data requests (under OPEN_DATAREQUESTS_KEY). It's removed when
+# data requests are created, closed or deleted
+OPEN_DATAREQUESTS_CACHE = cache.LRUCache(
+    max_size=1, ttl=cache.DEFAULT_OPEN_DATAREQUESTS_TTL
+)
+OPEN_DATAREQUESTS_KEY = "open"
+
+CURSOR_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+# Fields that contain the dict of another entity, which has to be retrieved
+EXPANDABLE_FIELDS = ("user", "organization", "accepted_dataset")
+DATAREQUEST_FIELDS = (
+    "id",
+    "user_id",
+    "title",
+    "description",
+    "organization_id",
+    "open_time",
+    "accepted_dataset_id",
+    "close_time",
+    "closed",
+    "followers",
+    "comments",
+) + EXPANDABLE_FIELDS
 
 
 def _get_user(user_id):
     try:
-        if user_id in USERS_CACHE:
-            return USERS_CACHE[user_id]
-        else:
+        user = USERS_CACHE.get(user_id)
+        if user is None:
             user = tk.get_action("user_show")({"ignore_auth": True}, {"id": user_id})
-            USERS_CACHE[user_id] = user
-            return user
+            USERS_CACHE.set(user_id, user)
+        return user
     except Exception as e:
         log.warn(e)
 
 
-def _get_organization(organization_id):
+def invalidate_cached_user(sender, **kwargs):
+    """Receiver of the action_succeeded signal. Removes the cached copy of the
+    users that are updated or deleted"""
+    data_dict = kwargs.get("data_dict") or {}
+    result = kwargs.get("result")
+
+    user_id = result.get("id") if isinstance(result, dict) else None
+    if not user_id and data_dict.get("id"):
+        # user_delete does not return the user and it can receive its name
+        user = model.User.get(data_dict["id"])
+        user_id = user.id if user else None
+
+    if user_id:
+        USERS_CACHE.invalidate(user_id)
+
+
+def invalidate_cached_organization(sender, **kwargs):
+    """Receiver of the action_succeeded signal. Removes the cached copy of the
+    organizations that are created, updated, deleted or purged"""
+    data_dict = kwargs.get("data_dict") or {}
+    result = kwargs.get("result")
+
+    # Organizations are cached by ID and by name, and the old name is still
+    # cached when they are renamed
+    keys = {data_dict.get("id")}
+    if isinstance(result, dict):
+        keys.update((result.get("id"), result.get("name")))
+    elif data_dict.get("id"):
+        group = model.Group.get(data_dict["id"])
+        if group:
+            keys.update((group.id, group.name))
+
+    for key in keys - {None}:
+        ORGANIZATIONS_CACHE.invalidate(key)
+
+
+def invalidate_cached_package(package):
+    """Removes the cached copy of a dataset. It is called by the plugin when
+    datasets are created, updated or deleted"""
+    PACKAGES_CACHE.invalidate(package.id)
+    PACKAGES_CACHE.invalidate(package.name)
+
+
+def _get_cached(lru, keys, retrieve):
+    """Returns a dict with the values of keys. The ones that are not cached
+    are retrieved with retrieve, which must return a dict with the values it
+    finds (by ID and by name). Keys that are not found are cached as None, so
+    they are not retrieved again until they expire"""
+    values = {}
+    missing = set()
+
+    for key in keys:
+        value = lru.get(key, cache.MISSING)
+        if value is cache.MISSING:
+            missing.add(key)
+        elif value is not None:
+            values[key] = value
+
+    if missing:
+        try:
+            retrieved = retrieve(missing)
+        except Exception as e:
+            # Errors are not cached, so the values are retrieved next time
+            log.warn(e)
+            return values
+
+        for key, value in retrieved.items():
+            lru.set(key, value)
+
+        for key in missing:
+            if key in retrieved:
+                values[key] = retrieved[key]
+            else:
+                log.warn("%s cannot be found", key)
+                lru.set(key, None)
+
+    return values
+
+
+def _show_organization(organization_ids):
+    (organization_id,) = organization_ids
+    # The members, datasets, groups and followers are not needed
+    data_dict = {
+        "id": organization_id,
+        "include_dataset_count": False,
+        "include_groups": False,
+        "include_users": False,
+        "include_followers": False,
+    }
     try:
         organization_show = tk.get_action("organization_show")
-        return organization_show({"ignore_auth": True}, {"id": organization_id})
-    except Exception as e:
-        log.warn(e)
+        organization = organization_show({"ignore_auth": True}, data_dict)
+    except tk.ObjectNotFound:
+        return {}
+
+    return {
+        organization_id: organization,
+        organization["id"]: organization,
+        organization["name"]: organization,
+    }
 
 
-def _get_package(package_id):
+def _show_package(package_ids):
+    (package_id,) = package_ids
     try:
         package_show = tk.get_action("package_show")
-        return package_show({"ignore_auth": True}, {"id": package_id})
-    except Exception as e:
-        log.warn(e)
+        package = package_show({"ignore_auth": True}, {"id": package_id})
+    except tk.ObjectNotFound:
+        return {}
+
+    return {package_id: package, package["id"]: package, package["name"]: package}
+
+
+def _get_organization(organization_id):
+    organizations = _get_cached(
+        ORGANIZATIONS_CACHE, [organization_id], _show_organization
+    )
+    return organizations.get(organization_id)
+
+
+def _get_package(package_id):
+    packages = _get_cached(PACKAGES_CACHE, [package_id], _show_package)
+    return packages.get(package_id)
+
+
+def get_open_datarequests_number():
+    """Returns the number of open data requests. It's cached for a few seconds
+    (ckan.datarequests.cache.open_datarequests_ttl)"""
+    number = OPEN_DATAREQUESTS_CACHE.get(OPEN_DATAREQUESTS_KEY)
+
+    if number is None:
+        db.init_db(model)
+        number = db.DataRequest.get_open_datarequests_number()
+        OPEN_DATAREQUESTS_CACHE.set(OPEN_DATAREQUESTS_KEY, number)
+
+    return number
+
+
+def _get_organization_members(organization_id):
+    """Returns the IDs of the users that are members of an organization. The
+    cached organizations do not include their members"""
+    query = model.Session.query(model.Member.table_id).filter(
+        model.Member.group_id == organization_id,
+        model.Member.table_name == "user",
+        model.Member.state == "active",
+    )
+    return {user_id for (user_id,) in query}
 
 
-def _dictize_datarequest(datarequest):
-    # Transform time
+def _get_users(user_ids):
+    """Returns a dict with the users whose ID is included in user_ids. Users
+    that are not cached are retrieved with one query"""
+    users = {}
+    missing = set()
+
+    for user_id in user_ids:
+        user = USERS_CACHE.get(user_id)
+        if user is None:
+            missing.add(user_id)
+        else:
+            users[user_id] = user
+
+    if missing:
+        # Users are dictized as user_show does
+        context = {
+            "ignore_auth": True,
+            "model": model,
+            "session": model.Session,
+            "count_private_and_draft_datasets": False,
+        }
+        query = model.Session.query(model.User).filter(model.User.id.in_(missing))
+        for user in query:
+            user_dict = model_dictize.user_dictize(user, context)
+            USERS_CACHE.set(user.id, user_dict)
+            users[user.id] = user_dict
+
+    return users
+
+
+def _query_organizations(organization_ids):
+    context = {"ignore_auth": True, "model": model, "session": model.Session}
+    query = model.Session.query(model.Group).filter(
+        or_(
+            model.Group.id.in_(organization_ids),
+            model.Group.name.in_(organization_ids),
+        ),
+        model.Group.is_organization.is_(True),
+    )
+
+    organizations = {}
+    for group in query:
+        # Dictized as _show_organization does
+        organization = model_dictize.group_dictize(
+            group,
+            context,
+            include_groups=False,
+            include_users=False,
+            packages_field=None,
+        )
+        organizations[group.id] = organization
+        organizations[group.name] = organization
+
+    return organizations
+
+
+def _search_packages(package_ids):
+    terms = " OR ".join(
+        '"{}"'.format(package_id.replace("\\", "\\\\").replace('"', '\\"'))
+        for package_id in package_ids
+    )
+    search_dict = {
+        "fq": f"+(id:({terms}) OR name:({terms}))",
+        "rows": len(package_ids),
+        "include_private": True,
+    }
+
+    packages = {}
+    package_search = tk.get_action("package_search")
+    for package in package_search({"ignore_auth": True}, search_dict)["results"]:
+        packages[package["id"]] = package
+        packages[package["name"]] = package
+
+    # The search does not return the deleted, draft and private datasets,
+    # which can also be accepted, so they are shown one by one
+    for package_id in package_ids:
+        if package_id not in packages:
+            packages.update(_show_package([package_id]))
+
+    return packages
+
+
+def _get_organizations(organization_ids):
+    """Returns a dict with the organizations whose ID (or name) is included in
+    organization_ids. The ones that are not cached are retrieved with one query
+    and they do not include their users, groups or datasets"""
+    return _get_cached(ORGANIZATIONS_CACHE, organization_ids, _query_organizations)
+
+
+def _get_packages(package_ids):
+    """Returns a dict with the datasets whose ID (or name) is included in
+    package_ids. The ones that are not cached are retrieved from the search
+    index with one query (the ones that are not returned by the search, with
+    package_show)"""
+    return _get_cached(PACKAGES_CACHE, package_ids, _search_packages)
+
+
+def _dictize_datarequest_basic(datarequest):
     open_time = str(datarequest.open_time)
     # Close time can be None and the transformation is only needed when the
     # fields contains a valid date
@@ -79,23 +339,274 @@ def _dictize_datarequest(datarequest):
         "accepted_dataset_id": datarequest.accepted_dataset_id,
         "close_time": close_time,
         "closed": datarequest.closed,
-        "user": _get_user(datarequest.user_id),
+        "user": None,
         "organization": None,
         "accepted_dataset": None,
-        "followers": 0,
+        "followers": datarequest.follower_count,
+        "comments": datarequest.comment_count,
     }
 
-    if datarequest.organization_id:
+    return data_dict
+
+
+def _get_list_param(data_dict, name, allowed):
+    """Returns the values of a parameter that can be a list or a comma
+    separated string, or None when it is not included"""
+    values = data_dict.get(name, None)
+    if values is None:
+        return None
+
+    if isinstance(values, str):
+        values = [value.strip() for value in values.split(",") if value.strip()]
+
+    for value in values:
+        if value not in allowed:
+            raise tk.ValidationError(
+                {
+                    tk._(name.capitalize()): [
+                        tk._("{value} is not a valid field").format(value=value)
+                    ]
+                }
+            )
+
+    return list(values)
+
+
+def _get_projection(data_dict):
+    """Returns the fields of the data requests requested by the caller (None
+    for all of them) and the ones that have to be expanded. Fields that are
+    not included are not expanded"""
+    fields = _get_list_param(data_dict, "fields", DATAREQUEST_FIELDS)
+    expand = _get_list_param(data_dict, "expand", EXPANDABLE_FIELDS)
+
+    if expand is None:
+        expand = EXPANDABLE_FIELDS
+
+    if fields is not None:
+        expand = [field for field in expand if field in fields]
+
+    return fields, tuple(expand)
+
+
+def _project_datarequest(data_dict, fields, expand):
+    """Removes the fields that were not requested or expanded"""
+    fields = DATAREQUEST_FIELDS if fields is None else fields
+    return {
+        key: value
+        for key, value in data_dict.items()
+        if key in fields and (key not in EXPANDABLE_FIELDS or key in expand)
+    }
+
+
+def _dictize_datarequest(datarequest, fields=None, expand=EXPANDABLE_FIELDS):
+    data_dict = _dictize_datarequest_basic(datarequest)
+
+    if "user" in expand:
+        data_dict["user"] = _get_user(datarequest.user_id)
+
+    if "organization" in expand and datarequest.organization_id:
         data_dict["organization"] = _get_organization(datarequest.organization_id)
 
-    if datarequest.accepted_dataset_id:
+    if "accepted_dataset" in expand and datarequest.accepted_dataset_id:
         data_dict["accepted_dataset"] = _get_package(datarequest.accepted_dataset_id)
 
-    data_dict["followers"] = db.DataRequestFollower.get_datarequest_followers_number(
-        datarequest_id=datarequest.id
-    )
+    return _project_datarequest(data_dict, fields, expand)
 
-    return data_dict
+
+def _dictize_datarequests(datarequests, fields=None, expand=EXPANDABLE_FIELDS):
+    """Dictizes a list of data requests. Users, organizations and accepted
+    datasets are retrieved once for the whole list, so the number of queries
+    does not depend on its length. Only the expanded ones are retrieved"""
+    users = {}
+    organizations = {}
+    packages = {}
+
+    if "user" in expand:
+        users = _get_users({data_req.user_id for data_req in datarequests})
+
+    if "organization" in expand:
+        organizations = _get_organizations(
+            {data_req.organization_id for data_req in datarequests} - {None, ""}
+        )
+
+    if "accepted_dataset" in expand:
+        packages = _get_packages(
+            {data_req.accepted_dataset_id for data_req in datarequests} - {None, ""}
+        )
+
+    result = []
+    for data_req in datarequests:
+        data_dict = _dictize_datarequest_basic(data_req)
+        data_dict["user"] = users.get(data_req.user_id)
+        data_dict["organization"] = organizations.get(data_req.organization_id)
+        data_dict["accepted_dataset"] = packages.get(data_req.accepted_dataset_id)
+        result.append(_project_datarequest(data_dict, fields, expand))
+
+    return result
+
+
+def _dump_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def _load_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+
+
+def _invalid_cursor():
+    return tk.ValidationError({tk._("Cursor"): [tk._("Cursor is not valid")]})
+
+
+def _encode_cursor(datarequest, backwards=False):
+    key = [
+        datarequest.open_time.strftime(CURSOR_TIME_FORMAT),
+        datarequest.id,
+        backwards,
+    ]
+    return _dump_cursor(key)
+
+
+def _encode_comment_cursor(comment, backwards=False):
+    key = [comment.time.strftime(CURSOR_TIME_FORMAT), comment.id, backwards]
+    return _dump_cursor(key)
+
+
+def _decode_cursor(cursor):
+    try:
+        open_time, datarequest_id, backwards = _load_cursor(cursor)
+        open_time = datetime.datetime.strptime(open_time, CURSOR_TIME_FORMAT)
+        return open_time, datarequest_id, bool(backwards)
+    except Exception:
+        raise _invalid_cursor()
+
+
+# Results sorted by relevance have no stable key, so their cursors contain the
+# offset of the page
+def _encode_offset_cursor(offset):
+    return _dump_cursor({"offset": offset})
+
+
+def _decode_offset_cursor(cursor):
+    try:
+        offset = _load_cursor(cursor)["offset"]
+    except Exception:
+        raise _invalid_cursor()
+
+    if not isinstance(offset, int) or offset < 0:
+        raise _invalid_cursor()
+
+    return offset
+
+
+# The changes are logged in order, so their cursors contain the ID of the last
+# change returned
+def _encode_change_cursor(change_id):
+    return _dump_cursor({"change": change_id})
+
+
+def _decode_change_cursor(cursor):
+    try:
+        change_id = _load_cursor(cursor)["change"]
+    except Exception:
+        raise _invalid_cursor()
+
+    if not isinstance(change_id, int) or change_id < 0:
+        raise _invalid_cursor()
+
+    return change_id
+
+
+def _get_int(data_dict, field, default, min_value=0, max_value=None):
+    """Returns the value of field as an integer (GET requests send it as a
+    string). Values greater than max_value are reduced to it"""
+    try:
+        value = int(data_dict.get(field, default))
+    except (TypeError, ValueError):
+        value = None
+
+    if value is None or value < min_value:
+        raise tk.ValidationError(
+            {
+                field: [
+                    tk._(
+                        "It must be an integer greater than or equal to {min_value}"
+                    ).format(min_value=min_value)
+                ]
+            }
+        )
+
+    if max_value is not None:
+        value = min(value, max_value)
+
+    return value
+
+
+def _parse_since(since):
+    # Python versions older than 3.11 do not accept the Z suffix
+    if isinstance(since, str) and since.endswith("Z"):
+        since = since[:-1] + "+00:00"
+
+    try:
+        since = datetime.datetime.fromisoformat(since)
+    except (TypeError, ValueError):
+        raise tk.ValidationError(
+            {"since": [tk._("It must be a date in ISO 8601 format")]}
+        )
+
+    # Times are stored in UTC
+    if since.tzinfo is not None:
+        since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return since
+
+
+def _dictize_change(change):
+    return {
+        "id": change.id,
+        "datarequest_id": change.datarequest_id,
+        "change_type": change.change_type,
+        "user_id": change.user_id,
+        "object_id": change.object_id,
+        "time": str(change.time),
+    }
+
+
+def _get_datarequest(context, datarequest_id):
+    # The data request is remembered until the request ends: the views, the
+    # validators and the auth functions read it several times
+    entry = cache.get_request_entry(context, "DataRequest", datarequest_id)
+
+    if "datarequest" not in entry:
+        result = db.DataRequest.get(id=datarequest_id)
+        if not result:
+            raise tk.ObjectNotFound(
+                tk._("Data Request {datarequest_id} not found in the data base").format(
+                    datarequest_id=datarequest_id
+                )
+            )
+
+        entry["datarequest"] = result[0]
+
+    return entry["datarequest"]
+
+
+def _save_datarequest(session, data_req):
+    # Titles are unique (case insensitive). The database enforces it, so they
+    # do not have to be looked up before storing the data request. It's only
+    # flushed: callers commit the transaction
+    session.add(data_req)
+
+    try:
+        session.flush()
+    except IntegrityError as e:
+        session.rollback()
+
+        if db.is_title_in_use_error(e):
+            raise tk.ValidationError(
+                {tk._("Title"): [tk._("That title is already in use")]}
+            )
+
+        raise
 
 
 def _undictize_datarequest_basic(data_request, data_dict):
@@ -105,47 +616,44 @@ def _undictize_datarequest_basic(data_request, data_dict):
     data_request.organization_id = organization if organization else None
 
 
-def _dictize_comment(comment):
+def _dictize_comment_basic(comment):
     return {
         "id": comment.id,
         "datarequest_id": comment.datarequest_id,
         "user_id": comment.user_id,
         "comment": comment.comment,
         "time": str(comment.time),
-        "user": _get_user(comment.user_id),
     }
 
 
+def _dictize_comment(comment):
+    data_dict = _dictize_comment_basic(comment)
+    data_dict["user"] = _get_user(comment.user_id)
+    return data_dict
+
+
+def _dictize_comments(comments):
+    """Dictizes a list of comments. Their authors are retrieved once for the
+    whole list"""
+    users = _get_users({comment.user_id for comment in comments})
+
+    result = []
+    for comment in comments:
+        data_dict = _dictize_comment_basic(comment)
+        data_dict["user"] = users.get(comment.user_id)
+        result.append(data_dict)
+
+    return result
+
+
 def _undictize_comment_basic(comment, data_dict):
     comment.comment = html.escape(data_dict.get("comment", ""))
     comment.datarequest_id = data_dict.get("datarequest_id", "")
 
 
 def _get_datarequest_involved_users(context, datarequest_dict):
-
-    datarequest_id = datarequest_dict["id"]
-    new_context = {"ignore_auth": True, "model": context["model"]}
-
     # Creator + Followers + People who has commented + Organization Staff
-    users = set()
-    users.add(datarequest_dict["user_id"])
-    users.update(
-        [
-            follower.user_id
-            for follower in db.DataRequestFollower.get(datarequest_id=datarequest_id)
-        ]
-    )
-    users.update(
-        [
-            comment["user_id"]
-            for comment in list_datarequest_comments(
-                new_context, {"datarequest_id": datarequest_id}
-            )
-        ]
-    )
-
-    if datarequest_dict["organization"]:
-        users.update([user["id"] for user in datarequest_dict["organization"]["users"]])
+    users = db.Participant.get_user_ids(datarequest_dict["id"])
 
     # Notifications are not sent to the user that performs the action
     users.discard(context["auth_user_obj"].id)
@@ -153,29 +661,6 @@ def _get_datarequest_involved_users(context, datarequest_dict):
     return users
 
 
-def _send_mail(user_ids, action_type, datarequest):
-
-    for user_id in user_ids:
-        try:
-            user_data = model.User.get(user_id)
-            extra_vars = {
-                "datarequest": datarequest,
-                "user": user_data,
-                "site_title": config.get("ckan.site_title"),
-                "site_url": config.get("ckan.site_url"),
-            }
-
-            subject = base.render_jinja2(
-                f"emails/subjects/{action_type}.txt", extra_vars
-            )
-            body = base.render_jinja2(f"emails/bodies/{action_type}.txt", extra_vars)
-
-            mailer.mail_user(user_data, subject, body)
-
-        except Exception:
-            logging.exception(f"Error sending notification to {user_id}")
-
-
 def create_datarequest(context, data_dict):
     """
     Action to create a new data request. The function checks the access rights
@@ -198,7 +683,7 @@ def create_datarequest(context, data_dict):
 
     :returns: A dict with the data request (id, user_id, title, description,
         organization_id, open_time, accepted_dataset, close_time, closed,
-        followers)
+        followers, comments)
     :rtype: dict
     """
 
@@ -220,15 +705,26 @@ def create_datarequest(context, data_dict):
     data_req.user_id = context["auth_user_obj"].id
     data_req.open_time = datetime.datetime.utcnow()
 
-    session.add(data_req)
-    session.commit()
+    _save_datarequest(session, data_req)
+    db.Participant.add(data_req.id, data_req.user_id, constants.PARTICIPANT_CREATOR)
+    db.Change.add(data_req.id, constants.CHANGE_CREATED, data_req.user_id)
 
     datarequest_dict = _dictize_datarequest(data_req)
 
+    # The notification is stored with the data request
+    notify = False
     if datarequest_dict["organization"]:
-        users = set([user["id"] for user in datarequest_dict["organization"]["users"]])
+        users = _get_organization_members(datarequest_dict["organization"]["id"])
         users.discard(context["auth_user_obj"].id)
-        _send_mail(users, "new_datarequest", datarequest_dict)
+        notify = notifications.add_notification(
+            session, users, "new_datarequest", datarequest_dict
+        )
+
+    session.commit()
+    OPEN_DATAREQUESTS_CACHE.clear()
+
+    if notify:
+        notifications.enqueue_notifications()
 
     return datarequest_dict
 
@@ -245,9 +741,19 @@ def show_datarequest(context, data_dict):
     :param id: The id of the data request to be shown
     :type id: string
 
+    :param fields: This parameter is optional and allows users to choose the
+        fields of the data request to be returned (all of them by default)
+    :type fields: list or comma separated string
+
+    :param expand: This parameter is optional and allows users to choose
+        which of the user, organization and accepted_dataset fields contain
+        the dict of that entity (all of them by default). The rest are not
+        returned
+    :type expand: list or comma separated string
+
     :returns: A dict with the data request (id, user_id, title, description,
         organization_id, open_time, accepted_dataset, close_time, closed,
-        followers)
+        followers, comments)
     :rtype: dict
     """
 
@@ -257,25 +763,24 @@ def show_datarequest(context, data_dict):
     if not datarequest_id:
         raise tk.ValidationError(tk._("Data Request ID has not been included"))
 
+    fields, expand = _get_projection(data_dict)
+
     # Init the data base
     db.init_db(model)
 
     # Check access
     tk.check_access(constants.SHOW_DATAREQUEST, context, data_dict)
 
-    # Get the data request
-    result = db.DataRequest.get(id=datarequest_id)
-    if not result:
-        raise tk.ObjectNotFound(
-            tk._("Data Request {datarequest_id} not found in the data base").format(
-                datarequest_id=datarequest_id
-            )
-        )
+    # The same data request is usually shown several times while a page is
+    # rendered. Copies are returned, so callers can modify them
+    entry = cache.get_request_entry(context, "DataRequest", datarequest_id)
+    key = ("show", tuple(fields or ()), expand)
 
-    data_req = result[0]
-    data_dict = _dictize_datarequest(data_req)
+    if key not in entry:
+        data_req = _get_datarequest(context, datarequest_id)
+        entry[key] = _dictize_datarequest(data_req, fields, expand)
 
-    return data_dict
+    return dict(entry[key])
 
 
 def update_datarequest(context, data_dict):
@@ -303,7 +808,7 @@ def update_datarequest(context, data_dict):
 
     :returns: A dict with the data request (id, user_id, title, description,
         organization_id, open_time, accepted_dataset, close_time, closed,
-        followers)
+        followers, comments)
     :rtype: dict
     """
 
@@ -321,18 +826,7 @@ def update_datarequest(context, data_dict):
     tk.check_access(constants.UPDATE_DATAREQUEST, context, data_dict)
 
     # Get the initial data
-    result = db.DataRequest.get(id=datarequest_id)
-    if not result:
-        raise tk.ObjectNotFound(
-            tk._("Data Request {datarequest_id} not found in the data base").format(
-                datarequest_id=datarequest_id
-            )
-        )
-
-    data_req = result[0]
-
-    # Avoid the validator to return an error when the user does not change the title
-    context["avoid_existing_title_check"] = data_req.title == data_dict["title"]
+    data_req = _get_datarequest(context, datarequest_id)
 
     # Validate data
     validator.validate_datarequest(context, data_dict)
@@ -340,12 +834,65 @@ def update_datarequest(context, data_dict):
     # Set the data provided by the user in the data_red
     _undictize_datarequest_basic(data_req, data_dict)
 
-    session.add(data_req)
+    _save_datarequest(session, data_req)
+    db.Change.add(datarequest_id, constants.CHANGE_UPDATED, context["auth_user_obj"].id)
     session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", datarequest_id)
 
     return _dictize_datarequest(data_req)
 
 
+def _get_list_facets(filters):
+    """Returns the organization and state facets of the data requests that
+    match the filters, and the number of data requests"""
+    # They are computed by the database, which returns the number of data
+    # requests of each (organization, state) pair
+    no_processed_organization_facet = {}
+    CLOSED = "Closed"
+    OPEN = "Open"
+    no_processed_state_facet = {CLOSED: 0, OPEN: 0}
+    for facet_organization_id, facet_closed, facet_count in db.DataRequest.get_facets(
+        **filters
+    ):
+        if facet_organization_id:
+            no_processed_organization_facet[facet_organization_id] = (
+                no_processed_organization_facet.get(facet_organization_id, 0)
+                + facet_count
+            )
+
+        no_processed_state_facet[CLOSED if facet_closed else OPEN] += facet_count
+
+    # Every data request has a state, so the state facet includes all of them
+    count = sum(no_processed_state_facet.values())
+
+    # Format facets
+    organization_facet = []
+    organizations = _get_organizations(set(no_processed_organization_facet))
+    for organization_id in no_processed_organization_facet:
+        organization = organizations.get(organization_id)
+        if organization:
+            organization_facet.append(
+                {
+                    "name": organization.get("name"),
+                    "display_name": organization.get("display_name"),
+                    "count": no_processed_organization_facet[organization_id],
+                }
+            )
+
+    state_facet = []
+    for state in no_processed_state_facet:
+        if no_processed_state_facet[state]:
+            state_facet.append(
+                {
+                    "name": state.lower(),
+                    "display_name": tk._(state),
+                    "count": no_processed_state_facet[state],
+                }
+            )
+
+    return organization_facet, state_facet, count
+
+
 def list_datarequests(context, data_dict):
     """
     Returns a list with the existing data requests. Rights access will be
@@ -372,19 +919,48 @@ def list_datarequests(context, data_dict):
         data requests. You can choose 'desc' for retrieving data requests
         in descending order or 'asc' for retrieving data requests in
         ascending order. Data Requests are returned in ascending order
-        by default.
+        by default. When q is included, you can also choose 'relevance'
+        to retrieve the data requests that match it best first.
     :type sort: string
 
     :param offset: The first element to be returned (0 by default)
     :type offset: int
 
     :param limit: The max number of data requests to be returned (10 by
-        default)
+        default and 1000 at most)
     :type limit: int
 
-    :returns: A dict with three fields: result (a list of data requests),
-        facets (a list of the facets that can be used) and count (the total
-        number of existing data requests)
+    :param cursor: This parameter is optional and allows users to retrieve
+        the page next to (or previous to) a page already retrieved. Its value
+        must be the next_cursor or the previous_cursor returned in that page.
+        When it's included, offset is ignored.
+    :type cursor: string
+
+    :param fields: This parameter is optional and allows users to choose the
+        fields of the data requests to be returned (all of them by default)
+    :type fields: list or comma separated string
+
+    :param expand: This parameter is optional and allows users to choose
+        which of the user, organization and accepted_dataset fields contain
+        the dict of that entity (all of them by default). The rest are not
+        returned
+    :type expand: list or comma separated string
+
+    :param facets: This parameter is optional and allows users to skip the
+        computation of the facets (True by default)
+    :type facets: bool
+
+    :param count_only: This parameter is optional. When it's True, only the
+        number of data requests that match the filters is returned (False by
+        default)
+    :type count_only: bool
+
+    :returns: A dict with five fields: result (a list of data requests),
+        facets (a list of the facets that can be used), count (the total
+        number of existing data requests), next_cursor and previous_cursor
+        (the cursors to retrieve the next and the previous pages or None if
+        there are no more pages). When count_only is True, the dict only
+        contains the count field
     :rtype: dict
     """
 
@@ -392,6 +968,10 @@ def list_datarequests(context, data_dict):
     organization_show = tk.get_action("organization_show")
     user_show = tk.get_action("user_show")
 
+    fields, expand = _get_projection(data_dict)
+    include_facets = asbool(data_dict.get("facets", True))
+    count_only = asbool(data_dict.get("count_only", False))
+
     # Init the data base
     db.init_db(model)
 
@@ -420,66 +1000,103 @@ def list_datarequests(context, data_dict):
     # Sort. By default, data requests are returned in the order they are created
     # This is something new in version 0.3.0. In previous versions, requests were
     # returned in inverse order
+    sort = data_dict.get("sort", None)
     desc = False
-    if data_dict.get("sort", None) == "desc":
+    if sort == "desc":
         desc = True
 
-    # Call the function
-    db_datarequests = db.DataRequest.get_ordered_by_date(
-        organization_id=organization_id, user_id=user_id, closed=closed, q=q, desc=desc
+    # Results can only be sorted by relevance when there is a free text filter
+    relevance = sort == "relevance" and bool(q)
+
+    filters = {
+        "organization_id": organization_id,
+        "user_id": user_id,
+        "closed": closed,
+        "q": q,
+    }
+
+    if count_only:
+        return {"count": db.DataRequest.get_datarequests_number(**filters)}
+
+    # Call the function. Only the requested page is retrieved from the database.
+    # A cursor takes precedence over the offset: the page is located with the
+    # (open_time, id) key of the previous one so no rows have to be skipped
+    offset = _get_int(data_dict, "offset", 0)
+    limit = _get_int(
+        data_dict,
+        "limit",
+        constants.DATAREQUESTS_PER_PAGE,
+        min_value=1,
+        max_value=constants.MAX_DATAREQUESTS_PER_PAGE,
     )
+    cursor = data_dict.get("cursor", None)
+
+    if cursor and relevance:
+        offset = _decode_offset_cursor(cursor)
+        cursor = None
+
+    if cursor:
+        open_time, datarequest_id, backwards = _decode_cursor(cursor)
+        # Previous pages are retrieved by walking the list in the opposite order.
+        # One more element is requested to know if there are more pages
+        db_datarequests = db.DataRequest.get_ordered_by_date(
+            desc=desc != backwards,
+            limit=limit + 1,
+            after=(open_time, datarequest_id),
+            **filters,
+        )
+        more_pages = len(db_datarequests) > limit
+        db_datarequests = db_datarequests[:limit]
 
-    # Dictize the results
-    datarequests = []
-    offset = data_dict.get("offset", 0)
-    limit = data_dict.get("limit", constants.DATAREQUESTS_PER_PAGE)
-    for data_req in db_datarequests[offset : (offset + limit)]:
-        datarequests.append(_dictize_datarequest(data_req))
+        if backwards:
+            db_datarequests.reverse()
 
-    # Facets
-    no_processed_organization_facet = {}
-    CLOSED = "Closed"
-    OPEN = "Open"
-    no_processed_state_facet = {CLOSED: 0, OPEN: 0}
-    for data_req in db_datarequests:
-        if data_req.organization_id:
-            # Facets
-            if data_req.organization_id in no_processed_organization_facet:
-                no_processed_organization_facet[data_req.organization_id] += 1
-            else:
-                no_processed_organization_facet[data_req.organization_id] = 1
+        has_previous = more_pages if backwards else True
+        has_next = True if backwards else more_pages
+    else:
+        db_datarequests = db.DataRequest.get_ordered_by_date(
+            desc=desc, offset=offset, limit=limit, relevance=relevance, **filters
+        )
+        has_previous = offset > 0
+        has_next = None
 
-        no_processed_state_facet[CLOSED if data_req.closed else OPEN] += 1
+    # Dictize the results
+    datarequests = _dictize_datarequests(db_datarequests, fields, expand)
 
-    # Format facets
     organization_facet = []
-    for organization_id in no_processed_organization_facet:
-        try:
-            organization = organization_show(
-                {"ignore_auth": True}, {"id": organization_id}
-            )
-            organization_facet.append(
-                {
-                    "name": organization.get("name"),
-                    "display_name": organization.get("display_name"),
-                    "count": no_processed_organization_facet[organization_id],
-                }
-            )
-        except Exception:
-            pass
-
     state_facet = []
-    for state in no_processed_state_facet:
-        if no_processed_state_facet[state]:
-            state_facet.append(
-                {
-                    "name": state.lower(),
-                    "display_name": tk._(state),
-                    "count": no_processed_state_facet[state],
-                }
-            )
 
-    result = {"count": len(db_datarequests), "facets": {}, "result": datarequests}
+    if include_facets:
+        organization_facet, state_facet, count = _get_list_facets(filters)
+    else:
+        count = db.DataRequest.get_datarequests_number(**filters)
+
+    if has_next is None:
+        has_next = offset + len(db_datarequests) < count
+
+    next_cursor = None
+    previous_cursor = None
+
+    if relevance:
+        if has_next:
+            next_cursor = _encode_offset_cursor(offset + len(db_datarequests))
+
+        if has_previous:
+            previous_cursor = _encode_offset_cursor(max(offset - limit, 0))
+    elif db_datarequests:
+        if has_next:
+            next_cursor = _encode_cursor(db_datarequests[-1])
+
+        if has_previous:
+            previous_cursor = _encode_cursor(db_datarequests[0], backwards=True)
+
+    result = {
+        "count": count,
+        "facets": {},
+        "result": datarequests,
+        "next_cursor": next_cursor,
+        "previous_cursor": previous_cursor,
+    }
 
     # Facets can only be included if they contain something
     if organization_facet:
@@ -495,14 +1112,15 @@ def delete_datarequest(context, data_dict):
     """
     Action to delete a new data request. The function checks the access rights
     of the user before deleting the data request. If the user is not allowed
-    a NotAuthorized exception will be risen.
+    a NotAuthorized exception will be risen. The comments and the followers of
+    the data request are deleted by the database too.
 
     :param id: The ID of the data request to be deleted
     :type id: string
 
     :returns: A dict with the data request (id, user_id, title, description,
         organization_id, open_time, accepted_dataset, close_time, closed,
-        followers)
+        followers, comments)
     :rtype: dict
     """
 
@@ -521,17 +1139,13 @@ def delete_datarequest(context, data_dict):
     tk.check_access(constants.DELETE_DATAREQUEST, context, data_dict)
 
     # Get the data request
-    result = db.DataRequest.get(id=datarequest_id)
-    if not result:
-        raise tk.ObjectNotFound(
-            tk._("Data Request {datarequest_id} not found in the data base").format(
-                datarequest_id=datarequest_id
-            )
-        )
-
-    data_req = result[0]
+    data_req = _get_datarequest(context, datarequest_id)
     session.delete(data_req)
+    # The change is kept when the data request is deleted
+    db.Change.add(datarequest_id, constants.CHANGE_DELETED, context["auth_user_obj"].id)
     session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", datarequest_id)
+    OPEN_DATAREQUESTS_CACHE.clear()
 
     return _dictize_datarequest(data_req)
 
@@ -551,7 +1165,7 @@ def close_datarequest(context, data_dict):
 
     :returns: A dict with the data request (id, user_id, title, description,
         organization_id, open_time, accepted_dataset, close_time, closed,
-        followers)
+        followers, comments)
     :rtype: dict
 
     """
@@ -571,19 +1185,11 @@ def close_datarequest(context, data_dict):
     tk.check_access(constants.CLOSE_DATAREQUEST, context, data_dict)
 
     # Get the data request
-    result = db.DataRequest.get(id=datarequest_id)
-    if not result:
-        raise tk.ObjectNotFound(
-            tk._("Data Request {datarequest_id} not found in the data base").format(
-                datarequest_id=datarequest_id
-            )
-        )
+    data_req = _get_datarequest(context, datarequest_id)
 
     # Validate data
     validator.validate_datarequest_closing(context, data_dict)
 
-    data_req = result[0]
-
     # Was the data request previously closed?
     if data_req.closed:
         raise tk.ValidationError([tk._("This Data Request is already closed")])
@@ -593,13 +1199,22 @@ def close_datarequest(context, data_dict):
     data_req.close_time = datetime.datetime.utcnow()
 
     session.add(data_req)
-    session.commit()
+    db.Change.add(datarequest_id, constants.CHANGE_CLOSED, context["auth_user_obj"].id)
 
     datarequest_dict = _dictize_datarequest(data_req)
 
-    # Mailing
+    # Mailing. The notification is stored with the data request
     users = _get_datarequest_involved_users(context, datarequest_dict)
-    _send_mail(users, "close_datarequest", datarequest_dict)
+    notify = notifications.add_notification(
+        session, users, "close_datarequest", datarequest_dict
+    )
+
+    session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", datarequest_id)
+    OPEN_DATAREQUESTS_CACHE.clear()
+
+    if notify:
+        notifications.enqueue_notifications()
 
     return datarequest_dict
 
@@ -646,11 +1261,25 @@ def comment_datarequest(context, data_dict):
     comment.time = datetime.datetime.utcnow()
 
     session.add(comment)
-    session.commit()
+    # The ID of the comment is generated when it's flushed
+    session.flush()
+    db.DataRequest.update_counters(datarequest_id, comments=1)
+    db.Participant.add(datarequest_id, comment.user_id, constants.PARTICIPANT_COMMENTER)
+    db.Change.add(
+        datarequest_id, constants.CHANGE_COMMENTED, comment.user_id, comment.id
+    )
 
-    # Mailing
+    # Mailing. The notification is stored with the comment
     users = _get_datarequest_involved_users(context, datarequest_dict)
-    _send_mail(users, "new_comment", datarequest_dict)
+    notify = notifications.add_notification(
+        session, users, "new_comment", datarequest_dict
+    )
+
+    session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", datarequest_id)
+
+    if notify:
+        notifications.enqueue_notifications()
 
     return _dictize_comment(comment)
 
@@ -710,13 +1339,28 @@ def list_datarequest_comments(context, data_dict):
         order. Comments are returned in ascending order by default.
     :type sort: string
 
-    :param sort: The ID of the datarequest whose comments want to be retrieved
-    :type sort: string
+    :param offset: This parameter is optional. The first comment to be
+        returned (0 by default)
+    :type offset: int
+
+    :param limit: This parameter is optional. The max number of comments to
+        be returned (20 by default and 1000 at most)
+    :type limit: int
+
+    :param cursor: This parameter is optional and allows users to retrieve
+        the page next to (or previous to) a page already retrieved. Its value
+        must be the next_cursor or the previous_cursor returned in that page.
+        When it's included, offset is ignored.
+    :type cursor: string
 
     :returns: A list with all the comments of a data request. Every comment is
         a dict with the following fields: id, user_id, datarequest_id, time and
-        comment
-    :rtype: list
+        comment. When offset, limit or cursor are included, only one page is
+        returned in a dict with four fields: result (the list of comments),
+        count (the total number of comments of the data request), next_cursor
+        and previous_cursor (the cursors to retrieve the next and the previous
+        pages or None if there are no more pages)
+    :rtype: list or dict
     """
 
     model = context["model"]
@@ -732,23 +1376,80 @@ def list_datarequest_comments(context, data_dict):
     # Sort. By default, comments are returned in the order they are created
     # This is something new in version 0.3.0. In previous versions, comments
     # were returned in inverse order
+    sort = data_dict.get("sort", None)
     desc = False
-    if data_dict.get("sort", None) == "desc":
+    if sort == "desc":
         desc = True
 
     # Check access
     tk.check_access(constants.LIST_DATAREQUEST_COMMENTS, context, data_dict)
 
-    # Get comments
-    comments_db = db.Comment.get_ordered_by_date(
-        datarequest_id=datarequest_id, desc=desc
+    # All the comments are returned when no page is requested
+    if not any(key in data_dict for key in ("offset", "limit", "cursor")):
+        comments_db = db.Comment.get_ordered_by_date(
+            datarequest_id=datarequest_id, desc=desc
+        )
+        return _dictize_comments(comments_db)
+
+    # Only the requested page is retrieved from the database. A cursor takes
+    # precedence over the offset: the page is located with the (time, id) key
+    # of the previous one so no rows have to be skipped
+    offset = _get_int(data_dict, "offset", 0)
+    limit = _get_int(
+        data_dict,
+        "limit",
+        constants.COMMENTS_PER_PAGE,
+        min_value=1,
+        max_value=constants.MAX_COMMENTS_PER_PAGE,
     )
+    cursor = data_dict.get("cursor", None)
+
+    if cursor:
+        time, comment_id, backwards = _decode_cursor(cursor)
+        # Previous pages are retrieved by walking the list in the opposite order.
+        # One more element is requested to know if there are more pages
+        comments_db = db.Comment.get_ordered_by_date(
+            datarequest_id=datarequest_id,
+            desc=desc != backwards,
+            limit=limit + 1,
+            after=(time, comment_id),
+        )
+        more_pages = len(comments_db) > limit
+        comments_db = comments_db[:limit]
+
+        if backwards:
+            comments_db.reverse()
+
+        has_previous = more_pages if backwards else True
+        has_next = True if backwards else more_pages
+    else:
+        comments_db = db.Comment.get_ordered_by_date(
+            datarequest_id=datarequest_id, desc=desc, offset=offset, limit=limit
+        )
+        has_previous = offset > 0
+        has_next = None
+
+    count = db.Comment.get_comment_datarequests_number(datarequest_id=datarequest_id)
+
+    if has_next is None:
+        has_next = offset + len(comments_db) < count
+
+    next_cursor = None
+    previous_cursor = None
 
-    comments_list = []
-    for comment in comments_db:
-        comments_list.append(_dictize_comment(comment))
+    if comments_db:
+        if has_next:
+            next_cursor = _encode_comment_cursor(comments_db[-1])
 
-    return comments_list
+        if has_previous:
+            previous_cursor = _encode_comment_cursor(comments_db[0], backwards=True)
+
+    return {
+        "count": count,
+        "result": _dictize_comments(comments_db),
+        "next_cursor": next_cursor,
+        "previous_cursor": previous_cursor,
+    }
 
 
 def update_datarequest_comment(context, data_dict):
@@ -799,7 +1500,14 @@ def update_datarequest_comment(context, data_dict):
     _undictize_comment_basic(comment, data_dict)
 
     session.add(comment)
+    db.Change.add(
+        comment.datarequest_id,
+        constants.CHANGE_COMMENT_UPDATED,
+        context["auth_user_obj"].id,
+        comment.id,
+    )
     session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", comment.datarequest_id)
 
     return _dictize_comment(comment)
 
@@ -843,7 +1551,19 @@ def delete_datarequest_comment(context, data_dict):
     comment = result[0]
 
     session.delete(comment)
+    db.DataRequest.update_counters(comment.datarequest_id, comments=-1)
+    # The comment must be deleted before checking if the user has other ones
+    session.flush()
+    db.Participant.remove_commenter(comment.datarequest_id, comment.user_id)
+    db.Change.add(
+        comment.datarequest_id,
+        constants.CHANGE_COMMENT_DELETED,
+        context["auth_user_obj"].id,
+        comment.id,
+    )
     session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", comment.datarequest_id)
+    cache.invalidate_request_entry(context, "Comment", comment_id)
 
     return _dictize_comment(comment)
 
@@ -878,21 +1598,16 @@ def follow_datarequest(context, data_dict):
     tk.check_access(constants.FOLLOW_DATAREQUEST, context, data_dict)
 
     # Get the data request
-    result = db.DataRequest.get(id=datarequest_id)
-    if not result:
-        raise tk.ObjectNotFound(
-            tk._("Data Request {datarequest_id} not found in the data base").format(
-                datarequest_id=datarequest_id
-            )
-        )
+    _get_datarequest(context, datarequest_id)
 
     # Is already following?
+    already_following_error = tk.ValidationError(
+        [tk._("The user is already following the given Data Request")]
+    )
     user_id = context["auth_user_obj"].id
     result = db.DataRequestFollower.get(datarequest_id=datarequest_id, user_id=user_id)
     if result:
-        raise tk.ValidationError(
-            [tk._("The user is already following the given Data Request")]
-        )
+        raise already_following_error
 
     # Store the data
     follower = db.DataRequestFollower()
@@ -901,7 +1616,24 @@ def follow_datarequest(context, data_dict):
     follower.time = datetime.datetime.now()
 
     session.add(follower)
+
+    # Concurrent requests may pass the previous check. Only one of them can
+    # store the follower, since the user can only follow it once
+    try:
+        session.flush()
+    except IntegrityError as e:
+        session.rollback()
+
+        if db.is_already_following_error(e):
+            raise already_following_error
+
+        raise
+
+    db.DataRequest.update_counters(datarequest_id, followers=1)
+    db.Participant.add(datarequest_id, user_id, constants.PARTICIPANT_FOLLOWER)
+    db.Change.add(datarequest_id, constants.CHANGE_FOLLOWED, user_id)
     session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", datarequest_id)
 
     return True
 
@@ -946,6 +1678,100 @@ def unfollow_datarequest(context, data_dict):
     follower = result[0]
 
     session.delete(follower)
+    db.DataRequest.update_counters(datarequest_id, followers=-1)
+    db.Participant.remove(datarequest_id, user_id, constants.PARTICIPANT_FOLLOWER)
+    db.Change.add(datarequest_id, constants.CHANGE_UNFOLLOWED, user_id)
     session.commit()
+    cache.invalidate_request_entry(context, "DataRequest", datarequest_id)
 
     return True
+
+
+def datarequest_changes(context, data_dict):
+    """
+    Action to retrieve the changes of the data requests in the order they
+    were made, so they can be synchronized incrementally. Access rights will
+    be checked before returning the changes and a NotAuthorized exception will
+    be risen if the user is not allowed to list them.
+
+    :param cursor: This parameter is optional. Only the changes made after the
+        page that returned it are retrieved. Its value must be the next_cursor
+        returned in that page.
+    :type cursor: string
+
+    :param since: This parameter is optional. Only the changes made at or
+        after this date (ISO 8601, UTC by default) are retrieved. When cursor
+        is included, it's also applied.
+    :type since: string
+
+    :param limit: The max number of changes to be returned (100 by default and
+        1000 at most)
+    :type limit: int
+
+    :returns: A dict with three fields: result (a list of changes), next_cursor
+        (the cursor to retrieve the changes made after them, even when there
+        are no changes yet) and has_more (True if there are more changes to be
+        retrieved). Every change is a dict with the following fields: id,
+        datarequest_id, change_type (created, updated, closed, deleted,
+        commented, comment_updated, comment_deleted, followed or unfollowed),
+        user_id (the user that made it), object_id (the ID of the comment) and
+        time
+    :rtype: dict
+
+    Changes are numbered when they are made, but they are visible once they
+    are committed, so a change could be visible before an earlier one. To
+    avoid skipping changes, they are only returned when they are older than
+    a few seconds (constants.CHANGES_SAFETY_LAG). Every change is returned
+    once as long as the transaction that made it lasts less than that.
+    """
+
+    model = context["model"]
+
+    # Init the data base
+    db.init_db(model)
+
+    # Check access
+    tk.check_access(constants.DATAREQUEST_CHANGES, context, data_dict)
+
+    cursor = data_dict.get("cursor", None)
+    change_id = _decode_change_cursor(cursor) if cursor else 0
+
+    since = data_dict.get("since", None)
+    if since:
+        since = _parse_since(since)
+
+    limit = _get_int(
+        data_dict,
+        "limit",
+        constants.CHANGES_PER_PAGE,
+        min_value=1,
+        max_value=constants.MAX_CHANGES_PER_PAGE,
+    )
+
+    # Recent changes are left for the next page, since older ones may not
+    # have been committed yet
+    before = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=constants.CHANGES_SAFETY_LAG
+    )
+
+    # The first page may be empty. Then, the next changes are the ones logged
+    # after the last one
+    last_id = None if cursor else db.Change.get_last_id(before=before)
+
+    # One more element is requested to know if there are more changes
+    changes = db.Change.get_after(
+        change_id=change_id, since=since, before=before, limit=limit + 1
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    if changes:
+        change_id = changes[-1].id
+    elif last_id is not None:
+        change_id = last_id
+
+    return {
+        "result": [_dictize_change(change) for change in changes],
+        "next_cursor": _encode_change_cursor(change_id),
+        "has_more": has_more,
+    }
@@ -15,9 +15,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
 
+from ckan import model
 from ckan.plugins import toolkit as tk
 
-from . import constants
+from . import cache, db
 
 
 def create_datarequest(context, data_dict):
@@ -29,17 +30,42 @@ def show_datarequest(context, data_dict):
     return {"success": True}
 
 
-def auth_if_creator(context, data_dict, show_function):
-    # Sometimes data_dict only contains the 'id'
-    if "user_id" not in data_dict:
-        func = tk.get_action(show_function)
-        data_dict = func({"ignore_auth": True}, {"id": data_dict.get("id")})
+def _get_owner_id(context, entity, entity_id):
+    """Returns the ID of the user that created a data request or a comment
+    (entity is "DataRequest" or "Comment"). It's remembered until the request
+    ends: pages check several actions of the same data request. ObjectNotFound
+    is raised if it does not exist, so it's not found instead of forbidden"""
+    entry = cache.get_request_entry(context, entity, entity_id)
 
-    return {"success": data_dict["user_id"] == context.get("auth_user_obj").id}
+    if "owner_id" not in entry:
+        db.init_db(model)
+        entry["owner_id"] = getattr(db, entity).get_owner_id(entity_id)
+
+    if entry["owner_id"] is None:
+        if entity == "Comment":
+            message = tk._("Comment {comment_id} not found in the data base").format(
+                comment_id=entity_id
+            )
+        else:
+            message = tk._(
+                "Data Request {datarequest_id} not found in the data base"
+            ).format(datarequest_id=entity_id)
+        raise tk.ObjectNotFound(message)
+
+    return entry["owner_id"]
+
+
+def auth_if_creator(context, data_dict, entity):
+    # The owner is always read from the database: the user_id included in
+    # data_dict is set by the caller
+    owner_id = _get_owner_id(context, entity, data_dict.get("id"))
+    user = context.get("auth_user_obj")
+
+    return {"success": bool(user) and owner_id == user.id}
 
 
 def update_datarequest(context, data_dict):
-    return auth_if_creator(context, data_dict, constants.SHOW_DATAREQUEST)
+    return auth_if_creator(context, data_dict, "DataRequest")
 
 
 @tk.auth_allow_anonymous_access
@@ -48,11 +74,11 @@ def list_datarequests(context, data_dict):
 
 
 def delete_datarequest(context, data_dict):
-    return auth_if_creator(context, data_dict, constants.SHOW_DATAREQUEST)
+    return auth_if_creator(context, data_dict, "DataRequest")
 
 
 def close_datarequest(context, data_dict):
-    return auth_if_creator(context, data_dict, constants.SHOW_DATAREQUEST)
+    return auth_if_creator(context, data_dict, "DataRequest")
 
 
 def comment_datarequest(context, data_dict):
@@ -71,11 +97,11 @@ def show_datarequest_comment(context, data_dict):
 
 
 def update_datarequest_comment(context, data_dict):
-    return auth_if_creator(context, data_dict, constants.SHOW_DATAREQUEST_COMMENT)
+    return auth_if_creator(context, data_dict, "Comment")
 
 
 def delete_datarequest_comment(context, data_dict):
-    return auth_if_creator(context, data_dict, constants.SHOW_DATAREQUEST_COMMENT)
+    return auth_if_creator(context, data_dict, "Comment")
 
 
 def follow_datarequest(context, data_dict):
@@ -84,3 +110,8 @@ def follow_datarequest(context, data_dict):
 
 def unfollow_datarequest(context, data_dict):
     return {"success": True}
+
+
+@tk.auth_allow_anonymous_access
+def datarequest_changes(context, data_dict):
+    return {"success": True}
@@ -0,0 +1,132 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context
+
+DEFAULT_MAX_SIZE = 1000
+DEFAULT_TTL = 300
+
+# The number of open data requests is displayed on every page, so it's cached
+# too, but only for a few seconds because it changes often
+DEFAULT_OPEN_DATAREQUESTS_TTL = 30
+
+# Default value of get, so cached None values can be told apart from the
+# values that are not cached
+MISSING = object()
+
+# Attribute of flask.g (or key of the action context) that holds the values
+# read while the current request is served
+REQUEST_CACHE_KEY = "datarequests_cache"
+
+
+class LRUCache(object):
+    """In-process cache that keeps up to max_size entries for ttl seconds.
+    When it is full, the least recently used entry is evicted. It can be
+    shared by the threads of the same worker"""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.configure(max_size, ttl)
+
+    def configure(self, max_size, ttl):
+        if max_size < 1:
+            raise ValueError("max_size must be greater than 0")
+
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+
+            self._misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+def get_request_cache(context=None):
+    """Returns the dict that holds the values read while the current request
+    is served. It's attached to flask.g, so it's shared by the actions, the
+    auth functions and the helpers run by the request and it's discarded when
+    the request ends. Outside requests (commands, jobs...) it's attached to the
+    action context if there is one"""
+    if has_request_context():
+        return g.setdefault(REQUEST_CACHE_KEY, {})
+
+    if context is not None:
+        return context.setdefault(REQUEST_CACHE_KEY, {})
+
+    return {}
+
+
+def get_request_entry(context, entity, entity_id):
+    """Returns the dict with the values of a data request or a comment (entity
+    is "DataRequest" or "Comment") read while the current request is served"""
+    return get_request_cache(context).setdefault((entity, entity_id), {})
+
+
+def invalidate_request_entry(context, entity, entity_id):
+    """Forgets the values of a data request or a comment read while the current
+    request is served. It must be called when they are modified"""
+    get_request_cache(context).pop((entity, entity_id), None)
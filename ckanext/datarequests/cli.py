@@ -0,0 +1,121 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import click
+from ckan import model
+from ckan.plugins import toolkit as tk
+
+from . import db, export, notifications
+
+
+@click.group(short_help="Data requests management commands")
+def datarequests():
+    pass
+
+
+@datarequests.command("init-db")
+def init_db():
+    """Creates the tables of the extension that do not exist. The migrations
+    (ckan db upgrade -p datarequests) create them too, along with the objects
+    used by the full text search. They skip what this command has created, so
+    they can be applied afterwards"""
+    db.create_tables(model)
+    click.secho("Data requests tables created", fg="green")
+
+
+@datarequests.command()
+def recount():
+    """Computes the comments and followers counters of all the data requests"""
+    db.init_db(model)
+    updated = db.DataRequest.recount()
+    model.Session.commit()
+    click.secho(f"Counters of {updated} data requests updated", fg="green")
+
+
+@datarequests.command("rebuild-participants")
+def rebuild_participants():
+    """Computes the participants of all the data requests (their creators,
+    followers and commenters), which are used to find the users to be
+    notified"""
+    db.init_db(model)
+    stored = db.Participant.rebuild()
+    model.Session.commit()
+    click.secho(f"{stored} participants stored", fg="green")
+
+
+@datarequests.command("send-notifications")
+@click.option(
+    "--batch-size",
+    default=notifications.DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Number of notifications claimed at once",
+)
+def send_notifications(batch_size):
+    """Sends the pending notifications. Notifications are sent in the
+    background when they are generated. This command sends the ones that could
+    not be sent (for example, if the process was stopped), so it can be run
+    periodically"""
+    sent = notifications.send_pending_notifications(batch_size)
+    click.secho(f"{sent} notifications sent", fg="green")
+
+
+@datarequests.command("export")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(export.FORMATS),
+    default=export.CSV,
+    show_default=True,
+    help="Format of the exported data requests",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.File("w", encoding="utf-8"),
+    default="-",
+    help="File where the data requests are written (standard output by default)",
+)
+@click.option("--organization-id", help="Organization (name or ID)")
+@click.option("--user-id", help="User that created the data requests (name or ID)")
+@click.option(
+    "--closed/--open",
+    default=None,
+    help="Export only the closed (or open) data requests",
+)
+@click.option("--q", help="Free text filter")
+@click.option(
+    "--batch-size",
+    default=export.DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Number of data requests fetched from the database at once",
+)
+def export_datarequests(fmt, output, organization_id, user_id, closed, q, batch_size):
+    """Exports the data requests in CSV or JSON lines, in the order they were
+    created. They can be filtered as in list_datarequests. The data requests
+    are written while they are read, so all of them can be exported using a
+    constant amount of memory"""
+    try:
+        filters = export.get_filters(organization_id, user_id, closed, q)
+    except tk.ObjectNotFound:
+        raise click.ClickException("Organization or user not found")
+
+    for chunk in export.export_datarequests(fmt, filters, batch_size):
+        output.write(chunk)
+
+
+def get_commands():
+    return [datarequests]
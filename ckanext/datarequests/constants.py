@@ -29,7 +29,34 @@ UPDATE_DATAREQUEST_COMMENT = "update_datarequest_comment"
 DELETE_DATAREQUEST_COMMENT = "delete_datarequest_comment"
 FOLLOW_DATAREQUEST = "follow_datarequest"
 UNFOLLOW_DATAREQUEST = "unfollow_datarequest"
+DATAREQUEST_CHANGES = "datarequest_changes"
 NAME_MAX_LENGTH = 100
 DESCRIPTION_MAX_LENGTH = 1000
 COMMENT_MAX_LENGTH = DESCRIPTION_MAX_LENGTH
 DATAREQUESTS_PER_PAGE = 10
+MAX_DATAREQUESTS_PER_PAGE = 1000
+COMMENTS_PER_PAGE = 20
+MAX_COMMENTS_PER_PAGE = 1000
+CHANGES_PER_PAGE = 100
+MAX_CHANGES_PER_PAGE = 1000
+
+# Seconds that must pass before a change is returned by datarequest_changes.
+# Changes become visible when their transactions are committed, which may not
+# be in the order they were logged
+CHANGES_SAFETY_LAG = 5
+
+# Roles of the participants of a data request
+PARTICIPANT_CREATOR = "creator"
+PARTICIPANT_FOLLOWER = "follower"
+PARTICIPANT_COMMENTER = "commenter"
+
+# Types of the changes logged for each data request
+CHANGE_CREATED = "created"
+CHANGE_UPDATED = "updated"
+CHANGE_CLOSED = "closed"
+CHANGE_DELETED = "deleted"
+CHANGE_COMMENTED = "commented"
+CHANGE_COMMENT_UPDATED = "comment_updated"
+CHANGE_COMMENT_DELETED = "comment_deleted"
+CHANGE_FOLLOWED = "followed"
+CHANGE_UNFOLLOWED = "unfollowed"
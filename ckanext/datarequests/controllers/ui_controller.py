@@ -26,8 +26,9 @@ from ckan.plugins import toolkit as tk
 from ckan.plugins.toolkit import g, request
 from ckan.views.group import _setup_template_variables
 import ckan.lib.helpers as h
+from flask import Response, stream_with_context
 
-from .. import constants
+from .. import constants, export
 
 _link = re.compile(
     r'(?:(https?://)|(www\.))(\S+\b/?)([!"#$%&\'()*+,\-./:;<=>?@[\\\]^_`{|}~]*)(\s|$)',
@@ -63,10 +64,19 @@ def search_url(params):
     return url_with_params(url, params)
 
 
+def comment_url(params, id):
+    url = helpers.url_for(
+        controller="datarequests",
+        action="comment",
+        id=id,
+    )
+    return url_with_params(url, params)
+
+
 def org_datarequest_url(params, id):
     url = helpers.url_for(
         controller="datarequests",
-        action="organization_datarequests",
+        action="organization",
         id=id,
     )
     return url_with_params(url, params)
@@ -75,7 +85,7 @@ def org_datarequest_url(params, id):
 def user_datarequest_url(params, id):
     url = helpers.url_for(
         controller="datarequests",
-        action="user_datarequests",
+        action="user",
         id=id,
     )
     return url_with_params(url, params)
@@ -93,7 +103,7 @@ def _get_context():
 def _show_index(
     user_id, organization_id, include_organization_facet, url_func, file_to_render
 ):
-    def pager_url(state=None, sort=None, q=None, page=None):
+    def pager_url(state=None, sort=None, q=None, cursor=None):
         params = list()
 
         if q:
@@ -102,8 +112,11 @@ def _show_index(
         if state is not None:
             params.append(("state", state))
 
+        if include_organization_facet and organization_id:
+            params.append(("organization", organization_id))
+
         params.append(("sort", sort))
-        params.append(("page", page))
+        params.append(("cursor", cursor))
 
         return url_func(params)
 
@@ -114,6 +127,12 @@ def _show_index(
         offset = (page - 1) * constants.DATAREQUESTS_PER_PAGE
         data_dict = {"offset": offset, "limit": limit}
 
+        # Pages are navigated using cursors, so deep pages are as cheap as the
+        # first one. "page" is still accepted to support old links
+        cursor = request.args.get("cursor", None)
+        if cursor:
+            data_dict["cursor"] = cursor
+
         state = request.args.get("state", None)
         if state:
             data_dict["closed"] = True if state == "closed" else False
@@ -128,10 +147,12 @@ def _show_index(
         if user_id:
             data_dict["user_id"] = user_id
 
+        # Results can only be sorted by relevance when there is a free text, so
+        # the default order is used otherwise
         sort = request.args.get("sort", "desc")
-        sort = sort if sort in ["asc", "desc"] else "desc"
-        if sort is not None:
-            data_dict["sort"] = sort
+        valid_sorts = ["asc", "desc", "relevance"] if q else ["asc", "desc"]
+        sort = sort if sort in valid_sorts else "desc"
+        data_dict["sort"] = sort
 
         tk.check_access(constants.LIST_DATAREQUESTS, context, data_dict)
         datarequests_list = tk.get_action(constants.LIST_DATAREQUESTS)(
@@ -139,6 +160,8 @@ def _show_index(
         )
 
         g.filters = [(tk._("Newest"), "desc"), (tk._("Oldest"), "asc")]
+        if q:
+            g.filters.insert(0, (tk._("Relevance"), "relevance"))
         g.sort = sort
         g.q = q
         g.organization = organization_id
@@ -146,13 +169,17 @@ def _show_index(
         g.datarequest_count = datarequests_list["count"]
         g.datarequests = datarequests_list["result"]
         g.search_facets = datarequests_list["facets"]
-        g.page = helpers.Page(
-            collection=datarequests_list["result"],
-            page=page,
-            url=functools.partial(pager_url, state, sort),
-            item_count=datarequests_list["count"],
-            items_per_page=limit,
-        )
+        g.next_url = None
+        g.previous_url = None
+
+        if datarequests_list["next_cursor"]:
+            g.next_url = pager_url(state, sort, q, datarequests_list["next_cursor"])
+
+        if datarequests_list["previous_cursor"]:
+            g.previous_url = pager_url(
+                state, sort, q, datarequests_list["previous_cursor"]
+            )
+
         g.facet_titles = {
             "state": tk._("State"),
         }
@@ -173,6 +200,53 @@ def _show_index(
         # This exception should only occur if the page value is not valid
         log.warn(e)
         tk.abort(400, tk._('"page" parameter must be an integer'))
+    except tk.ValidationError as e:
+        # This exception should only occur if the cursor value is not valid
+        log.warn(e)
+        tk.abort(400, tk._('"cursor" parameter is not valid'))
+    except tk.NotAuthorized as e:
+        log.warn(e)
+        tk.abort(403, tk._("Unauthorized to list Data Requests"))
+
+
+def export_datarequests():
+    try:
+        context = _get_context()
+        fmt = request.args.get("format", export.CSV)
+        if fmt not in export.FORMATS:
+            tk.abort(
+                400,
+                tk._('"format" parameter must be one of: {formats}').format(
+                    formats=", ".join(export.FORMATS)
+                ),
+            )
+
+        closed = request.args.get("closed", None)
+        data_dict = {
+            "organization_id": request.args.get("organization_id", None),
+            "user_id": request.args.get("user_id", None),
+            "closed": tk.asbool(closed) if closed else None,
+            "q": request.args.get("q", None),
+        }
+
+        tk.check_access(constants.LIST_DATAREQUESTS, context, data_dict)
+        filters = export.get_filters(**data_dict)
+
+        # The data requests are sent while they are read from the database
+        return Response(
+            stream_with_context(export.export_datarequests(fmt, filters)),
+            mimetype=export.CONTENT_TYPES[fmt],
+            headers={
+                "Content-Disposition": f'attachment; filename="datarequests.{fmt}"'
+            },
+        )
+    except ValueError as e:
+        # This exception should only occur if the closed value is not valid
+        log.warn(e)
+        tk.abort(400, tk._('"closed" parameter must be a boolean'))
+    except tk.ObjectNotFound as e:
+        log.warn(e)
+        tk.abort(404, tk._("Organization or user not found"))
     except tk.NotAuthorized as e:
         log.warn(e)
         tk.abort(403, tk._("Unauthorized to list Data Requests"))
@@ -227,11 +301,9 @@ def new():
         tk.check_access(constants.CREATE_DATAREQUEST, context, None)
         if request.method == "POST":
             id = _process_post(constants.CREATE_DATAREQUEST, context)
-            try:
-                return h.redirect_to(h.url_for('datarequests_show', id=id))  
-            except:
-                eturn tk.render("datarequests/new.html")
-        # The form is always rendered
+            # The form is rendered again with the errors when it's not valid
+            if id:
+                return h.redirect_to(h.url_for('datarequests_show', id=id))
         return tk.render("datarequests/new.html")
 
     except tk.NotAuthorized as e:
@@ -279,8 +351,10 @@ def update(id):
         g.datarequest = tk.get_action(constants.SHOW_DATAREQUEST)(context, data_dict)
         g.original_title = g.datarequest.get("title")
         if request.method == "POST":
-            id = _process_post(constants.CREATE_DATAREQUEST, context)
-            return h.redirect_to(h.url_for('datarequests_show', id=id))
+            id = _process_post(constants.UPDATE_DATAREQUEST, context)
+            # The form is rendered again with the errors when it's not valid
+            if id:
+                return h.redirect_to(h.url_for('datarequests_show', id=id))
         return tk.render("datarequests/edit.html")
     except tk.ObjectNotFound as e:
         log.warn(e)
@@ -473,14 +547,39 @@ def comment(id):
             else:
                 g.updated_comment = {"id": comment_id, "comment": comment_text}
 
-        # Comments should be retrieved once that the comment has been created
-        get_comments_data_dict = {"datarequest_id": id}
-        g.comments = tk.get_action(constants.LIST_DATAREQUEST_COMMENTS)(
+        # Comments should be retrieved once that the comment has been created.
+        # They are paginated: the latest ones are shown by default, so the
+        # older pages are retrieved by walking the list in inverse order
+        get_comments_data_dict = {
+            "datarequest_id": id,
+            "sort": "desc",
+            "limit": constants.COMMENTS_PER_PAGE,
+        }
+
+        cursor = request.args.get("cursor", None)
+        if cursor:
+            get_comments_data_dict["cursor"] = cursor
+
+        comments_list = tk.get_action(constants.LIST_DATAREQUEST_COMMENTS)(
             context, get_comments_data_dict
         )
+        g.comments = list(reversed(comments_list["result"]))
+        g.next_url = None
+        g.previous_url = None
+
+        if comments_list["next_cursor"]:
+            g.previous_url = comment_url([("cursor", comments_list["next_cursor"])], id)
+
+        if comments_list["previous_cursor"]:
+            g.next_url = comment_url([("cursor", comments_list["previous_cursor"])], id)
 
         return tk.render("datarequests/comment.html")
 
+    except tk.ValidationError as e:
+        # This exception should only occur if the cursor value is not valid
+        log.warn(e)
+        tk.abort(400, tk._('"cursor" parameter is not valid'))
+
     except tk.ObjectNotFound as e:
         log.warn(e)
         tk.abort(404, tk._("Data Request {id} not found").format(id=id))
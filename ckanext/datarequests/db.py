@@ -15,10 +15,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
+import re
 import uuid
 
 import sqlalchemy as sa
 from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.sql.expression import or_
 
 from . import constants
@@ -26,17 +29,119 @@ from . import constants
 DataRequest = None
 Comment = None
 DataRequestFollower = None
+Notification = None
+Participant = None
+Change = None
+
+# Full text search engines. Their objects are created by the migrations, so
+# the ILIKE search is used when they have not been run
+POSTGRESQL_SEARCH = "postgresql"
+SQLITE_SEARCH = "sqlite"
+ILIKE_SEARCH = "ilike"
+
+# Text search configuration used by PostgreSQL to build the search vector
+SEARCH_CONFIG = "english"
+
+# The engine is detected when data requests are searched. It's remembered
+# once the full text search objects are found
+search_backend = None
+
+# Index of the search vectors. It's created after computing them
+SEARCH_VECTOR_INDEX = "idx_datarequests_search_vector"
+
+# Unique index of the titles (case insensitive)
+TITLE_INDEX = "idx_datarequests_title"
+
+# Unique constraint of the followers. SQLite names its columns in the errors
+FOLLOWER_CONSTRAINT = "uq_datarequests_followers_datarequest_id_user_id"
+SQLITE_FOLLOWER_CONSTRAINT = (
+    "datarequests_followers.datarequest_id, datarequests_followers.user_id"
+)
+
+# Tables of the extension, in the order they have to be created
+TABLES = (
+    "datarequests",
+    "datarequests_comments",
+    "datarequests_followers",
+    "datarequests_outbox",
+    "datarequests_participants",
+    "datarequests_changes",
+)
 
 
 def uuid4():
     return str(uuid.uuid4())
 
 
+def _get_search_backend(model):
+    global search_backend
+
+    if search_backend is not None:
+        return search_backend
+
+    bind = model.Session.get_bind()
+    dialect = bind.dialect.name
+    backend = ILIKE_SEARCH
+
+    if dialect == "postgresql":
+        # The search vectors of the existing data requests are computed before
+        # creating the index, so they are searched once it's valid
+        index_is_valid = model.Session.execute(
+            sa.text(
+                "SELECT pg_index.indisvalid FROM pg_index JOIN pg_class ON "
+                "pg_class.oid = pg_index.indexrelid WHERE pg_class.relname = :name"
+            ),
+            {"name": SEARCH_VECTOR_INDEX},
+        ).scalar()
+        if index_is_valid:
+            backend = POSTGRESQL_SEARCH
+    elif dialect == "sqlite":
+        if sa.inspect(bind).has_table("datarequests_search"):
+            backend = SQLITE_SEARCH
+
+    # The migrations may add the full text search while CKAN is running, so
+    # it's looked for again until it's found. Other databases cannot use it
+    if backend != ILIKE_SEARCH or dialect not in ("postgresql", "sqlite"):
+        search_backend = backend
+
+    return backend
+
+
+def is_title_in_use_error(error):
+    """Returns True if the IntegrityError has been raised because there is
+    another data request with the same title"""
+    return TITLE_INDEX in str(error.orig)
+
+
+def is_already_following_error(error):
+    """Returns True if the IntegrityError has been raised because the user
+    already follows the data request"""
+    message = str(error.orig)
+    return FOLLOWER_CONSTRAINT in message or SQLITE_FOLLOWER_CONSTRAINT in message
+
+
+def _get_search_terms(q):
+    # Only words are used to build the full text queries, so users cannot
+    # inject the operators of the search engines
+    return re.findall(r"\w+", q)
+
+
 def init_db(model):
+    """Maps the classes of the extension to their tables. It's called by the
+    plugin when CKAN starts, so it does nothing when it's called by the actions
+    and the helpers. Tables are not created: they are created by the
+    migrations (ckan db upgrade -p datarequests) or by create_tables"""
 
     global DataRequest
     global Comment
     global DataRequestFollower
+    global Notification
+    global Participant
+    global Change
+
+    if Change is not None:
+        # Already initialized
+        return
 
     if DataRequest is None:
 
@@ -48,20 +153,58 @@ def init_db(model):
                 return query.filter_by(**kw).all()
 
             @classmethod
-            def datarequest_exists(cls, title):
-                """Returns true if there is a Data Request with the same title (case insensitive)"""
-                query = model.Session.query(cls).autoflush(False)
-                return (
-                    query.filter(func.lower(cls.title) == func.lower(title)).first()
-                    is not None
+            def get_owner_id(cls, datarequest_id):
+                """Returns the ID of the user that created the data request or
+                None if it does not exist. Only that column is read"""
+                query = model.Session.query(cls.user_id).autoflush(False)
+                return query.filter_by(id=datarequest_id).scalar()
+
+            @classmethod
+            def _search(cls, query, q):
+                """Filters the query by the free text q. Returns the filtered
+                query and the order to sort it by relevance"""
+                backend = _get_search_backend(model)
+                terms = _get_search_terms(q)
+
+                # All the terms must be found. The last one is a prefix so
+                # results are found while the user is typing
+                if backend == POSTGRESQL_SEARCH and terms:
+                    search_vector = sa.literal_column("datarequests.search_vector")
+                    ts_query = func.to_tsquery(SEARCH_CONFIG, " & ".join(terms) + ":*")
+                    query = query.filter(search_vector.op("@@")(ts_query))
+                    return query, func.ts_rank_cd(search_vector, ts_query).desc()
+
+                if backend == SQLITE_SEARCH and terms:
+                    search_table = sa.table(
+                        "datarequests_search", sa.column("rowid"), sa.column("rank")
+                    )
+                    fts_query = " ".join(f'"{term}"' for term in terms) + "*"
+                    query = query.join(
+                        search_table,
+                        search_table.c.rowid
+                        == sa.literal_column("datarequests.search_rowid"),
+                    ).filter(
+                        sa.literal_column("datarequests_search").op("MATCH")(fts_query)
+                    )
+                    return query, search_table.c.rank.asc()
+
+                search_expr = f"%{q}%"
+                title_match = cls.title.ilike(search_expr)
+                query = query.filter(
+                    or_(title_match, cls.description.ilike(search_expr))
                 )
+                # Data requests whose title matches go first
+                return query, sa.case((title_match, 0), else_=1)
 
             @classmethod
-            def get_ordered_by_date(
-                cls, organization_id=None, user_id=None, closed=None, q=None, desc=False
+            def _get_filtered_query(
+                cls, organization_id=None, user_id=None, closed=None, q=None
             ):
-                """Personalized query"""
+                """Returns a query with the filters of the data requests list
+                and the order to sort it by relevance (None when there is no
+                free text filter)"""
                 query = model.Session.query(cls).autoflush(False)
+                relevance_order = None
 
                 params = {}
 
@@ -75,17 +218,129 @@ def init_db(model):
                     params["closed"] = closed
 
                 if q is not None:
-                    search_expr = f"%{q}%"
-                    query = query.filter(
-                        or_(
-                            cls.title.ilike(search_expr),
-                            cls.description.ilike(search_expr),
-                        )
+                    query, relevance_order = cls._search(query, q)
+
+                return query.filter_by(**params), relevance_order
+
+            @classmethod
+            def get_ordered_by_date(
+                cls,
+                organization_id=None,
+                user_id=None,
+                closed=None,
+                q=None,
+                desc=False,
+                offset=0,
+                limit=None,
+                after=None,
+                relevance=False,
+            ):
+                """Personalized query. offset and limit are applied in the
+                database so only the requested page is loaded. after is an
+                (open_time, id) key: only the data requests placed after it
+                (in the requested order) are returned. When relevance is True
+                and there is a free text filter, the best matches go first"""
+                query, relevance_order = cls._get_filtered_query(
+                    organization_id, user_id, closed, q
+                )
+
+                if after is not None:
+                    key = sa.tuple_(cls.open_time, cls.id)
+                    query = query.filter(key < after if desc else key > after)
+
+                # The id is used to break ties so the order is deterministic
+                order = (
+                    [cls.open_time.desc(), cls.id.desc()]
+                    if desc
+                    else [cls.open_time.asc(), cls.id.asc()]
+                )
+
+                if relevance and relevance_order is not None:
+                    order.insert(0, relevance_order)
+
+                query = query.order_by(*order)
+
+                if offset:
+                    query = query.offset(offset)
+
+                if limit is not None:
+                    query = query.limit(limit)
+
+                return query.all()
+
+            @classmethod
+            def iter_ordered_by_date(
+                cls,
+                organization_id=None,
+                user_id=None,
+                closed=None,
+                q=None,
+                batch_size=1000,
+            ):
+                """Returns an iterator over all the data requests that match
+                the filters in the order they were created. They are fetched
+                in batches of batch_size (with a server-side cursor when the
+                database supports it), so the memory used does not depend on
+                the number of data requests"""
+                query, _ = cls._get_filtered_query(organization_id, user_id, closed, q)
+                query = query.order_by(cls.open_time.asc(), cls.id.asc())
+                return query.yield_per(batch_size)
+
+            @classmethod
+            def get_datarequests_number(
+                cls, organization_id=None, user_id=None, closed=None, q=None
+            ):
+                """Returns the number of data requests that match the filters"""
+                query, _ = cls._get_filtered_query(organization_id, user_id, closed, q)
+                return query.with_entities(func.count(cls.id)).scalar()
+
+            @classmethod
+            def get_facets(
+                cls, organization_id=None, user_id=None, closed=None, q=None
+            ):
+                """Returns the number of data requests that match the filters
+                grouped by organization and state as (organization_id, closed,
+                count) tuples"""
+                query, _ = cls._get_filtered_query(organization_id, user_id, closed, q)
+                return (
+                    query.with_entities(
+                        cls.organization_id, cls.closed, func.count(cls.id)
                     )
+                    .group_by(cls.organization_id, cls.closed)
+                    .all()
+                )
 
-                order_by_filter = cls.open_time.desc() if desc else cls.open_time.asc()
+            @classmethod
+            def update_counters(cls, datarequest_id, comments=0, followers=0):
+                """Adds the given values to the comments and followers counters
+                of a data request. The update is done by the database, so it
+                is safe when other requests update them at the same time"""
+                model.Session.query(cls).filter_by(id=datarequest_id).update(
+                    {
+                        cls.comment_count: cls.comment_count + comments,
+                        cls.follower_count: cls.follower_count + followers,
+                    },
+                    synchronize_session=False,
+                )
 
-                return query.filter_by(**params).order_by(order_by_filter).all()
+            @classmethod
+            def recount(cls):
+                """Computes the comments and followers counters of all the data
+                requests from scratch"""
+                comments = (
+                    model.Session.query(func.count(Comment.id))
+                    .filter(Comment.datarequest_id == cls.id)
+                    .scalar_subquery()
+                )
+                followers = (
+                    model.Session.query(func.count(DataRequestFollower.id))
+                    .filter(DataRequestFollower.datarequest_id == cls.id)
+                    .scalar_subquery()
+                )
+                return model.Session.query(cls).update(
+                    {cls.comment_count: comments, cls.follower_count: followers},
+                    synchronize_session=False,
+                )
 
             @classmethod
             def get_open_datarequests_number(cls):
@@ -107,7 +362,7 @@ def init_db(model):
             sa.Column(
                 "title",
                 sa.types.Unicode(constants.NAME_MAX_LENGTH),
-                primary_key=True,
+                primary_key=False,
                 default="",
             ),
             sa.Column(
@@ -128,10 +383,33 @@ def init_db(model):
             ),
             sa.Column("close_time", sa.types.DateTime, primary_key=False, default=None),
             sa.Column("closed", sa.types.Boolean, primary_key=False, default=False),
+            # Counters are updated by the actions that create and delete comments
+            # and followers, so they do not have to be counted when listing
+            sa.Column(
+                "comment_count",
+                sa.types.Integer,
+                nullable=False,
+                default=0,
+                server_default="0",
+            ),
+            sa.Column(
+                "follower_count",
+                sa.types.Integer,
+                nullable=False,
+                default=0,
+                server_default="0",
+            ),
+            # Indexes are also created by the migrations for existing tables
+            sa.Index("idx_datarequests_open_time", "open_time", "id"),
+            sa.Index(
+                "idx_datarequests_organization_id", "organization_id", "open_time", "id"
+            ),
+            sa.Index("idx_datarequests_user_id", "user_id", "open_time", "id"),
+            sa.Index("idx_datarequests_closed", "closed", "open_time", "id"),
         )
 
-        # Create the table only if it does not exist
-        datarequests_table.create(checkfirst=True)
+        # Titles are unique (case insensitive)
+        sa.Index(TITLE_INDEX, func.lower(datarequests_table.c.title), unique=True)
 
         model.meta.mapper(
             DataRequest,
@@ -148,15 +426,42 @@ def init_db(model):
                 return query.filter_by(**kw).all()
 
             @classmethod
-            def get_ordered_by_date(cls, datarequest_id, desc=False):
-                """Personalized query"""
+            def get_owner_id(cls, comment_id):
+                """Returns the ID of the user that wrote the comment or None if
+                it does not exist. Only that column is read"""
+                query = model.Session.query(cls.user_id).autoflush(False)
+                return query.filter_by(id=comment_id).scalar()
+
+            @classmethod
+            def get_ordered_by_date(
+                cls, datarequest_id, desc=False, offset=0, limit=None, after=None
+            ):
+                """Personalized query. offset and limit are applied in the
+                database so only the requested page is loaded. after is a
+                (time, id) key: only the comments placed after it (in the
+                requested order) are returned"""
                 query = model.Session.query(cls).autoflush(False)
-                order_by_filter = cls.time.desc() if desc else cls.time.asc()
-                return (
-                    query.filter_by(datarequest_id=datarequest_id)
-                    .order_by(order_by_filter)
-                    .all()
+                query = query.filter_by(datarequest_id=datarequest_id)
+
+                if after is not None:
+                    key = sa.tuple_(cls.time, cls.id)
+                    query = query.filter(key < after if desc else key > after)
+
+                # The id is used to break ties so the order is deterministic
+                order = (
+                    [cls.time.desc(), cls.id.desc()]
+                    if desc
+                    else [cls.time.asc(), cls.id.asc()]
                 )
+                query = query.order_by(*order)
+
+                if offset:
+                    query = query.offset(offset)
+
+                if limit is not None:
+                    query = query.limit(limit)
+
+                return query.all()
 
             @classmethod
             def get_comment_datarequests_number(cls, **kw):
@@ -167,27 +472,32 @@ def init_db(model):
 
         Comment = _Comment
 
-        # FIXME: References to the other tables...
         comments_table = sa.Table(
             "datarequests_comments",
             model.meta.metadata,
             sa.Column("id", sa.types.UnicodeText, primary_key=True, default=uuid4),
             sa.Column("user_id", sa.types.UnicodeText, primary_key=False, default=""),
             sa.Column(
-                "datarequest_id", sa.types.UnicodeText, primary_key=True, default=uuid4
+                "datarequest_id",
+                sa.types.UnicodeText,
+                sa.ForeignKey("datarequests.id", ondelete="CASCADE"),
+                primary_key=False,
             ),
-            sa.Column("time", sa.types.DateTime, primary_key=True, default=""),
+            sa.Column("time", sa.types.DateTime, primary_key=False, default=""),
             sa.Column(
                 "comment",
                 sa.types.Unicode(constants.COMMENT_MAX_LENGTH),
                 primary_key=False,
                 default="",
             ),
+            sa.Index(
+                "idx_datarequests_comments_datarequest_id",
+                "datarequest_id",
+                "time",
+                "id",
+            ),
         )
 
-        # Create the table only if it does not exist
-        comments_table.create(checkfirst=True)
-
         model.meta.mapper(
             Comment,
             comments_table,
@@ -202,31 +512,316 @@ def init_db(model):
                 query = model.Session.query(cls).autoflush(False)
                 return query.filter_by(**kw).all()
 
-            @classmethod
-            def get_datarequest_followers_number(cls, **kw):
-                """
-                Returned the number of followers of a data request
-                """
-                return model.Session.query(func.count(cls.id)).filter_by(**kw).scalar()
-
         DataRequestFollower = _DataRequestFollower
 
-        # FIXME: References to the other tables...
         followers_table = sa.Table(
             "datarequests_followers",
             model.meta.metadata,
             sa.Column("id", sa.types.UnicodeText, primary_key=True, default=uuid4),
             sa.Column("user_id", sa.types.UnicodeText, primary_key=False, default=""),
             sa.Column(
-                "datarequest_id", sa.types.UnicodeText, primary_key=True, default=uuid4
+                "datarequest_id",
+                sa.types.UnicodeText,
+                sa.ForeignKey("datarequests.id", ondelete="CASCADE"),
+                primary_key=False,
+            ),
+            sa.Column("time", sa.types.DateTime, primary_key=False, default=""),
+            sa.UniqueConstraint(
+                "datarequest_id",
+                "user_id",
+                name=FOLLOWER_CONSTRAINT,
             ),
-            sa.Column("time", sa.types.DateTime, primary_key=True, default=""),
         )
 
-        # Create the table only if it does not exist
-        followers_table.create(checkfirst=True)
-
         model.meta.mapper(
             DataRequestFollower,
             followers_table,
         )
+
+    if Notification is None:
+
+        class _Notification(model.DomainObject):
+            @classmethod
+            def claim(cls, limit, lease):
+                """Claims up to limit pending notifications (the oldest ones) for
+                lease (a timedelta) with a token and returns them. The claim is
+                not committed: the caller must commit it before sending them, so
+                they are not locked while they are sent. The notifications
+                claimed by other drainers are not claimed again until their
+                lease expires, and neither are the ones that could not be sent
+                until then"""
+                now = datetime.datetime.utcnow()
+                pending = (
+                    model.Session.query(cls.id)
+                    .filter(
+                        cls.delivered.is_(None),
+                        cls.failed.is_(None),
+                        or_(cls.claimed_until.is_(None), cls.claimed_until < now),
+                    )
+                    .order_by(cls.created)
+                    .limit(limit)
+                )
+
+                # PostgreSQL skips the notifications that other drainers are
+                # claiming instead of waiting for them
+                if model.Session.get_bind().dialect.name == "postgresql":
+                    pending = pending.with_for_update(skip_locked=True)
+
+                # The pending notifications are selected by the UPDATE itself, so
+                # two drainers cannot claim the same notification
+                token = str(uuid4())
+                pending = pending.subquery()
+                model.Session.query(cls).filter(
+                    cls.id.in_(sa.select(pending.c.id))
+                ).update(
+                    {cls.claim_token: token, cls.claimed_until: now + lease},
+                    synchronize_session=False,
+                )
+
+                return (
+                    model.Session.query(cls)
+                    .filter_by(claim_token=token)
+                    .order_by(cls.created)
+                    .all()
+                )
+
+        Notification = _Notification
+
+        # Notifications are stored in the same transaction as the changes that
+        # generate them and sent later, so they are not lost if the process
+        # fails before sending them
+        outbox_table = sa.Table(
+            "datarequests_outbox",
+            model.meta.metadata,
+            sa.Column("id", sa.types.UnicodeText, primary_key=True, default=uuid4),
+            sa.Column("action_type", sa.types.UnicodeText, nullable=False),
+            # JSON list of the IDs of the users to be notified
+            sa.Column("user_ids", sa.types.UnicodeText, nullable=False),
+            # JSON dict of the data request when the notification was generated
+            sa.Column("datarequest", sa.types.UnicodeText, nullable=False),
+            sa.Column("created", sa.types.DateTime, nullable=False),
+            sa.Column("claim_token", sa.types.UnicodeText, nullable=True),
+            sa.Column("claimed_until", sa.types.DateTime, nullable=True),
+            sa.Column("delivered", sa.types.DateTime, nullable=True),
+            # Number of times the notification could not be sent to everybody.
+            # It's not sent again once it fails too many times
+            sa.Column(
+                "attempts",
+                sa.types.Integer,
+                nullable=False,
+                default=0,
+                server_default="0",
+            ),
+            sa.Column("failed", sa.types.DateTime, nullable=True),
+            sa.Index("idx_datarequests_outbox_pending", "delivered", "created"),
+        )
+
+        model.meta.mapper(
+            Notification,
+            outbox_table,
+        )
+
+    if Participant is None:
+
+        class _Participant(model.DomainObject):
+            @classmethod
+            def add(cls, datarequest_id, user_id, role):
+                """Adds a participant to a data request. Nothing is done if
+                the user already participates with the same role"""
+                values = {
+                    "datarequest_id": datarequest_id,
+                    "user_id": user_id,
+                    "role": role,
+                }
+                dialect = model.Session.get_bind().dialect.name
+
+                if dialect in ("postgresql", "sqlite"):
+                    insert = (
+                        postgresql.insert if dialect == "postgresql" else sqlite.insert
+                    )
+                    model.Session.execute(
+                        insert(cls).values(**values).on_conflict_do_nothing()
+                    )
+                elif not model.Session.query(cls).filter_by(**values).count():
+                    model.Session.execute(sa.insert(cls).values(**values))
+
+            @classmethod
+            def remove(cls, datarequest_id, user_id, role):
+                model.Session.query(cls).filter_by(
+                    datarequest_id=datarequest_id, user_id=user_id, role=role
+                ).delete(synchronize_session=False)
+
+            @classmethod
+            def remove_commenter(cls, datarequest_id, user_id):
+                """Removes the commenter role of a user unless the user has
+                other comments in the data request"""
+                comments = model.Session.query(Comment.id).filter(
+                    Comment.datarequest_id == datarequest_id,
+                    Comment.user_id == user_id,
+                )
+                model.Session.query(cls).filter(
+                    cls.datarequest_id == datarequest_id,
+                    cls.user_id == user_id,
+                    cls.role == constants.PARTICIPANT_COMMENTER,
+                    ~comments.exists(),
+                ).delete(synchronize_session=False)
+
+            @classmethod
+            def get_user_ids(cls, datarequest_id):
+                """Returns the IDs of the users involved in a data request: its
+                creator, its followers, the users that have commented it and
+                the members of its organization. Organization members are
+                managed by CKAN, so they are not stored as participants but
+                read in the same query"""
+                participants = model.Session.query(cls.user_id).filter(
+                    cls.datarequest_id == datarequest_id
+                )
+                members = model.Session.query(model.Member.table_id).filter(
+                    model.Member.group_id == DataRequest.organization_id,
+                    model.Member.table_name == "user",
+                    model.Member.state == "active",
+                    DataRequest.id == datarequest_id,
+                )
+                # UNION removes the duplicated users
+                return {user_id for (user_id,) in participants.union(members)}
+
+            @classmethod
+            def rebuild(cls):
+                """Computes the participants of all the data requests from
+                scratch and returns how many have been stored"""
+                participants = sa.union(
+                    sa.select(
+                        DataRequest.id,
+                        DataRequest.user_id,
+                        sa.literal(constants.PARTICIPANT_CREATOR),
+                    ),
+                    sa.select(
+                        DataRequestFollower.datarequest_id,
+                        DataRequestFollower.user_id,
+                        sa.literal(constants.PARTICIPANT_FOLLOWER),
+                    ),
+                    sa.select(
+                        Comment.datarequest_id,
+                        Comment.user_id,
+                        sa.literal(constants.PARTICIPANT_COMMENTER),
+                    ),
+                )
+                model.Session.query(cls).delete(synchronize_session=False)
+                result = model.Session.execute(
+                    sa.insert(cls).from_select(
+                        ["datarequest_id", "user_id", "role"], participants
+                    )
+                )
+                return result.rowcount
+
+        Participant = _Participant
+
+        # The users that take part in each data request, so the users to be
+        # notified are read with one query
+        participants_table = sa.Table(
+            "datarequests_participants",
+            model.meta.metadata,
+            sa.Column(
+                "datarequest_id",
+                sa.types.UnicodeText,
+                sa.ForeignKey("datarequests.id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column("user_id", sa.types.UnicodeText, primary_key=True),
+            sa.Column("role", sa.types.UnicodeText, primary_key=True),
+        )
+
+        model.meta.mapper(
+            Participant,
+            participants_table,
+        )
+
+    if Change is None:
+
+        class _Change(model.DomainObject):
+            @classmethod
+            def add(cls, datarequest_id, change_type, user_id, object_id=None):
+                """Appends a change to the log. It's stored in the same
+                transaction as the change itself"""
+                model.Session.execute(
+                    sa.insert(cls).values(
+                        datarequest_id=datarequest_id,
+                        change_type=change_type,
+                        user_id=user_id,
+                        object_id=object_id,
+                        time=datetime.datetime.utcnow(),
+                    )
+                )
+
+            @classmethod
+            def get_after(cls, change_id=0, since=None, before=None, limit=None):
+                """Returns the changes logged after the change_id one (and at
+                or after since, when it's included) in the order they were
+                logged. When before is included, they are returned up to the
+                first one logged at or after it"""
+                query = model.Session.query(cls).autoflush(False)
+                query = query.filter(cls.id > change_id)
+
+                if since is not None:
+                    query = query.filter(cls.time >= since)
+
+                query = query.order_by(cls.id.asc())
+
+                if limit is not None:
+                    query = query.limit(limit)
+
+                changes = query.all()
+
+                # Recent changes are not filtered out in the query, since an
+                # older one would be returned after them if the clocks of the
+                # servers that logged them are not in sync
+                if before is not None:
+                    for i, change in enumerate(changes):
+                        if change.time >= before:
+                            return changes[:i]
+
+                return changes
+
+            @classmethod
+            def get_last_id(cls, before=None):
+                """Returns the ID of the last change logged (before the given
+                time, when it's included) or 0 if there is none"""
+                query = model.Session.query(func.max(cls.id))
+
+                if before is not None:
+                    query = query.filter(cls.time < before)
+
+                return query.scalar() or 0
+
+        Change = _Change
+
+        # Append-only log of the changes of the data requests, so they can be
+        # synchronized incrementally. Changes of deleted data requests are kept
+        changes_table = sa.Table(
+            "datarequests_changes",
+            model.meta.metadata,
+            sa.Column("id", sa.types.Integer, primary_key=True, autoincrement=True),
+            sa.Column("datarequest_id", sa.types.UnicodeText, nullable=False),
+            sa.Column("change_type", sa.types.UnicodeText, nullable=False),
+            # The user that made the change
+            sa.Column("user_id", sa.types.UnicodeText, nullable=True),
+            # The ID of the changed comment
+            sa.Column("object_id", sa.types.UnicodeText, nullable=True),
+            sa.Column("time", sa.types.DateTime, nullable=False),
+            sa.Index("idx_datarequests_changes_time", "time"),
+        )
+
+        model.meta.mapper(
+            Change,
+            changes_table,
+        )
+
+
+def create_tables(model):
+    """Creates the tables of the extension that do not exist. It needs the
+    rights to change the schema of the database, so it's only run by the
+    init-db command"""
+    init_db(model)
+
+    for name in TABLES:
+        model.meta.metadata.tables[name].create(bind=model.meta.engine, checkfirst=True)
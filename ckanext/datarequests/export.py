@@ -0,0 +1,117 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import csv
+import io
+import json
+
+from ckan import model
+from ckan.plugins import toolkit as tk
+
+from . import actions, db
+
+CSV = "csv"
+JSONL = "jsonl"
+FORMATS = (CSV, JSONL)
+
+CONTENT_TYPES = {
+    CSV: "text/csv",
+    JSONL: "application/x-ndjson",
+}
+
+# Fields of the exported data requests. Users, organizations and datasets are
+# identified by their IDs, so they do not have to be retrieved
+FIELDS = (
+    "id",
+    "user_id",
+    "title",
+    "description",
+    "organization_id",
+    "open_time",
+    "accepted_dataset_id",
+    "close_time",
+    "closed",
+    "followers",
+    "comments",
+)
+
+# Number of data requests fetched from the database and written at once
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_filters(organization_id=None, user_id=None, closed=None, q=None):
+    """Returns the filters of the data requests to be exported. As in
+    list_datarequests, organizations and users can be given by their name or
+    their ID. ObjectNotFound is risen if they do not exist"""
+    if organization_id:
+        organization_id = tk.get_action("organization_show")(
+            {"ignore_auth": True}, {"id": organization_id}
+        ).get("id")
+
+    if user_id:
+        user_id = tk.get_action("user_show")(
+            {"ignore_auth": True}, {"id": user_id}
+        ).get("id")
+
+    return {
+        "organization_id": organization_id or None,
+        "user_id": user_id or None,
+        "closed": closed,
+        "q": q or None,
+    }
+
+
+def _export_datarequest(datarequest):
+    # Dictized as in the API, without the users, organizations and datasets
+    data_dict = actions._dictize_datarequest_basic(datarequest)
+    return {field: data_dict[field] for field in FIELDS}
+
+
+def export_datarequests(fmt, filters, batch_size=DEFAULT_BATCH_SIZE):
+    """Generator that returns the data requests that match the filters in CSV
+    or JSON lines, in the order they were created. The text is returned in
+    chunks of batch_size data requests, so it can be written while the rest
+    are read and the memory used does not depend on the number of data
+    requests"""
+    db.init_db(model)
+
+    buffer = io.StringIO()
+
+    if fmt == CSV:
+        writer = csv.DictWriter(buffer, FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+
+        def write(row):
+            buffer.write(json.dumps(row) + "\n")
+
+    pending = 0
+    for datarequest in db.DataRequest.iter_ordered_by_date(
+        batch_size=batch_size, **filters
+    ):
+        write(_export_datarequest(datarequest))
+        pending += 1
+
+        if pending == batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -19,43 +19,67 @@ from ckan import model
 from ckan.common import c
 from ckan.plugins import toolkit as tk
 
-from . import db
+from . import actions, cache, db
+
+# Rendered badges by number. The badge of the open data requests is displayed
+# on every page, so it's not rendered again while the number does not change
+BADGES_CACHE = cache.LRUCache(max_size=100)
 
 
 def get_comments_number(datarequest_id):
-    # DB should be intialized
-    db.init_db(model)
-    return db.Comment.get_comment_datarequests_number(datarequest_id=datarequest_id)
+    # The number is remembered until the request ends
+    entry = cache.get_request_entry(None, "DataRequest", datarequest_id)
+
+    if "comments_number" not in entry:
+        # DB should be intialized
+        db.init_db(model)
+        entry["comments_number"] = db.Comment.get_comment_datarequests_number(
+            datarequest_id=datarequest_id
+        )
+
+    return entry["comments_number"]
+
+
+def _render_badge(number):
+    badge = BADGES_CACHE.get(number)
+
+    if badge is None:
+        badge = tk.render_snippet(
+            "datarequests/snippets/badge.html", {"comments_count": number}
+        )
+        BADGES_CACHE.set(number, badge)
+
+    return badge
 
 
 def get_comments_badge(datarequest_id):
-    return tk.render_snippet(
-        "datarequests/snippets/badge.html",
-        {"comments_count": get_comments_number(datarequest_id)},
-    )
+    return _render_badge(get_comments_number(datarequest_id))
 
 
 def get_open_datarequests_number():
-    # DB should be initialized
-    db.init_db(model)
-    return db.DataRequest.get_open_datarequests_number()
+    # The number is cached for a few seconds
+    return actions.get_open_datarequests_number()
 
 
 def is_following_datarequest(datarequest_id):
-    # DB should be intialized
-    db.init_db(model)
-    records = db.DataRequestFollower.get(
-        datarequest_id=datarequest_id, user_id=c.userobj.id
-    )
-    return bool(len(records))
+    # The result is remembered until the request ends
+    entry = cache.get_request_entry(None, "DataRequest", datarequest_id)
+    key = ("following", c.userobj.id)
+
+    if key not in entry:
+        # DB should be intialized
+        db.init_db(model)
+        records = db.DataRequestFollower.get(
+            datarequest_id=datarequest_id, user_id=c.userobj.id
+        )
+        entry[key] = bool(len(records))
+
+    return entry[key]
 
 
 def get_open_datarequests_badge(show_badge):
     """The snippet is only returned when show_badge == True"""
     if show_badge:
-        return tk.render_snippet(
-            "datarequests/snippets/badge.html",
-            {"comments_count": get_open_datarequests_number()},
-        )
+        return _render_badge(get_open_datarequests_number())
     else:
         return ""
@@ -0,0 +1,153 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import smtplib
+import time
+from email import utils
+from email.message import EmailMessage
+
+import ckan
+from ckan.common import asbool, config
+from ckan.plugins import toolkit as tk
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_MESSAGES = 100
+
+# Reply code of the servers that are closing the connection
+SERVICE_NOT_AVAILABLE = 421
+
+
+def _is_connection_error(error):
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == SERVICE_NOT_AVAILABLE
+
+    # SMTP errors are OSErrors too, but only socket errors close the connection
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPSender(object):
+    """Sends several messages over the same SMTP connection, so it's not opened
+    and authenticated once per message as ckan.lib.mailer does. The connection
+    is opened when the first message is sent and it's opened again after
+    max_messages messages or when it's lost. It must be closed when all the
+    messages have been sent (it can be used as a context manager)"""
+
+    def __init__(self, max_messages=None):
+        if max_messages is None:
+            max_messages = tk.asint(
+                config.get(
+                    "ckan.datarequests.notifications.messages_per_connection",
+                    DEFAULT_MAX_MESSAGES,
+                )
+            )
+
+        self.max_messages = max_messages
+        self._connection = None
+        self._sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connect(self):
+        connection = smtplib.SMTP(config.get("smtp.server") or "localhost")
+
+        try:
+            connection.ehlo()
+
+            if asbool(config.get("smtp.starttls")):
+                if not connection.has_extn("STARTTLS"):
+                    raise smtplib.SMTPNotSupportedError(
+                        "SMTP server does not support STARTTLS"
+                    )
+                connection.starttls()
+                connection.ehlo()
+
+            user = config.get("smtp.user")
+            if user:
+                connection.login(user, config.get("smtp.password"))
+        except Exception:
+            connection.close()
+            raise
+
+        self._connection = connection
+        self._sent = 0
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (smtplib.SMTPException, OSError):
+                # The connection was already lost
+                self._connection.close()
+
+            self._connection = None
+
+    def _build_message(self, recipient_name, recipient_email, subject, body):
+        # The same headers as ckan.lib.mailer
+        message = EmailMessage()
+        message.set_content(body, cte="base64")
+        message["Subject"] = subject
+        message["From"] = utils.formataddr(
+            (config.get("ckan.site_title"), config.get("smtp.mail_from"))
+        )
+        message["To"] = utils.formataddr((recipient_name, recipient_email))
+        message["Date"] = utils.formatdate(time.time())
+
+        if not asbool(config.get("ckan.hide_version")):
+            message["X-Mailer"] = f"CKAN {ckan.__version__}"
+
+        reply_to = config.get("smtp.reply_to")
+        if reply_to:
+            message["Reply-to"] = reply_to
+
+        return message
+
+    def send(self, recipient_name, recipient_email, subject, body):
+        message = self._build_message(recipient_name, recipient_email, subject, body)
+
+        if self._sent >= self.max_messages:
+            self.close()
+
+        # A lost connection is opened again once. Other errors (such as
+        # rejected recipients) do not affect the connection
+        for attempt in range(2):
+            if self._connection is None:
+                self._connect()
+
+            try:
+                self._connection.sendmail(
+                    config.get("smtp.mail_from"),
+                    [recipient_email],
+                    message.as_string(),
+                )
+                self._sent += 1
+                log.info(f"Sent email to {recipient_email}")
+                return
+            except Exception as e:
+                if attempt or not _is_connection_error(e):
+                    raise
+
+                log.warning(f"SMTP connection lost ({e!r}). Connecting again")
+                self.close()
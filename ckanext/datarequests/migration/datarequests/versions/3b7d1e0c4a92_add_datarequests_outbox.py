@@ -0,0 +1,42 @@
+"""Add the datarequests_outbox table
+
+Revision ID: 3b7d1e0c4a92
+Revises: f80d834ebb4d
+Create Date: 2026-10-18 21:02:41.305118
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3b7d1e0c4a92"
+down_revision = "f80d834ebb4d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The table may have been created by init_db
+    if sa.inspect(op.get_bind()).has_table("datarequests_outbox"):
+        return
+
+    op.create_table(
+        "datarequests_outbox",
+        sa.Column("id", sa.UnicodeText, primary_key=True),
+        sa.Column("action_type", sa.UnicodeText, nullable=False),
+        sa.Column("user_ids", sa.UnicodeText, nullable=False),
+        sa.Column("datarequest", sa.UnicodeText, nullable=False),
+        sa.Column("created", sa.DateTime, nullable=False),
+        sa.Column("claim_token", sa.UnicodeText, nullable=True),
+        sa.Column("claimed_until", sa.DateTime, nullable=True),
+        sa.Column("delivered", sa.DateTime, nullable=True),
+    )
+    op.create_index(
+        "idx_datarequests_outbox_pending",
+        "datarequests_outbox",
+        ["delivered", "created"],
+    )
+
+
+def downgrade():
+    op.drop_table("datarequests_outbox")
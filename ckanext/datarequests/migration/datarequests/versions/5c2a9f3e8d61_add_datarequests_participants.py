@@ -0,0 +1,53 @@
+"""Add the datarequests_participants table
+
+Revision ID: 5c2a9f3e8d61
+Revises: 3b7d1e0c4a92
+Create Date: 2026-10-18 21:48:12.503318
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c2a9f3e8d61"
+down_revision = "3b7d1e0c4a92"
+branch_labels = None
+depends_on = None
+
+# (table, column with the ID of the data request, role)
+PARTICIPANTS = [
+    ("datarequests", "id", "creator"),
+    ("datarequests_followers", "datarequest_id", "follower"),
+    ("datarequests_comments", "datarequest_id", "commenter"),
+]
+
+
+def upgrade():
+    # The table may have been created by init_db
+    if not sa.inspect(op.get_bind()).has_table("datarequests_participants"):
+        op.create_table(
+            "datarequests_participants",
+            sa.Column(
+                "datarequest_id",
+                sa.UnicodeText,
+                sa.ForeignKey("datarequests.id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column("user_id", sa.UnicodeText, primary_key=True),
+            sa.Column("role", sa.UnicodeText, primary_key=True),
+        )
+
+    # Participants that may have been stored since the table was created are
+    # not duplicated
+    for table, column, role in PARTICIPANTS:
+        op.execute(
+            "INSERT INTO datarequests_participants (datarequest_id, user_id, role) "
+            f"SELECT DISTINCT t.{column}, t.user_id, '{role}' FROM {table} t "
+            "WHERE NOT EXISTS (SELECT 1 FROM datarequests_participants p "
+            f"WHERE p.datarequest_id = t.{column} AND p.user_id = t.user_id "
+            f"AND p.role = '{role}')"
+        )
+
+
+def downgrade():
+    op.drop_table("datarequests_participants")
@@ -0,0 +1,51 @@
+"""Add the id to the index of the datarequests_comments table
+
+Revision ID: 7d4e1b2a9c30
+Revises: 5c2a9f3e8d61
+Create Date: 2026-10-18 22:35:40.118903
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7d4e1b2a9c30"
+down_revision = "5c2a9f3e8d61"
+branch_labels = None
+depends_on = None
+
+INDEX = "idx_datarequests_comments_datarequest_id"
+TABLE = "datarequests_comments"
+
+
+def _replace_index(columns):
+    is_postgresql = op.get_bind().dialect.name == "postgresql"
+    indexes = {
+        index["name"]: index["column_names"]
+        for index in sa.inspect(op.get_bind()).get_indexes(TABLE)
+    }
+
+    if indexes.get(INDEX) == columns:
+        return
+
+    if is_postgresql:
+        # Concurrent operations do not lock the table against writes, so
+        # existing deployments can be upgraded in place. They cannot be run
+        # inside a transaction
+        with op.get_context().autocommit_block():
+            if INDEX in indexes:
+                op.drop_index(INDEX, table_name=TABLE, postgresql_concurrently=True)
+            op.create_index(INDEX, TABLE, columns, postgresql_concurrently=True)
+    else:
+        if INDEX in indexes:
+            op.drop_index(INDEX, table_name=TABLE)
+        op.create_index(INDEX, TABLE, columns)
+
+
+def upgrade():
+    # Comments are paginated by (time, id)
+    _replace_index(["datarequest_id", "time", "id"])
+
+
+def downgrade():
+    _replace_index(["datarequest_id", "time"])
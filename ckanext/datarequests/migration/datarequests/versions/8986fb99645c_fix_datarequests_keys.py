@@ -0,0 +1,158 @@
+"""Fix primary keys and add unique constraints and foreign keys
+
+Revision ID: 8986fb99645c
+Revises: 8e4a38fa0669
+Create Date: 2026-10-18 10:02:47.120593
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8986fb99645c"
+down_revision = "8e4a38fa0669"
+branch_labels = None
+depends_on = None
+
+TITLE_MAX_LENGTH = 100
+
+
+def _set_primary_key(table, columns):
+    # Tables created by init_db already have the right key
+    primary_key = sa.inspect(op.get_bind()).get_pk_constraint(table)
+    if primary_key["constrained_columns"] == columns:
+        return
+
+    # SQLite does not support altering constraints, so batch mode is used to
+    # recreate the table there. Other databases alter it in place
+    name = primary_key["name"]
+    with op.batch_alter_table(table, recreate="auto") as batch_op:
+        if name:
+            batch_op.drop_constraint(name, type_="primary")
+        batch_op.create_primary_key(f"{table}_pkey", columns)
+
+
+def _rename_duplicated_titles():
+    # The title is checked case insensitively, but nothing prevented duplicates
+    # from being stored. The oldest data request keeps the title and the id is
+    # appended to the other ones so the unique index can be created
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.text(
+            "SELECT id, title FROM datarequests WHERE lower(title) IN ("
+            "SELECT lower(title) FROM datarequests GROUP BY lower(title) "
+            "HAVING count(*) > 1) ORDER BY open_time, id"
+        )
+    ).fetchall()
+
+    seen = set()
+    for datarequest_id, title in rows:
+        if title.lower() not in seen:
+            seen.add(title.lower())
+            continue
+
+        suffix = f" ({datarequest_id[:8]})"
+        new_title = title[: TITLE_MAX_LENGTH - len(suffix)] + suffix
+        connection.execute(
+            sa.text("UPDATE datarequests SET title = :title WHERE id = :id"),
+            {"title": new_title, "id": datarequest_id},
+        )
+
+
+def _has_foreign_key(table):
+    # The foreign keys of the tables created by init_db are not named
+    return any(
+        foreign_key["referred_table"] == "datarequests"
+        for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys(table)
+    )
+
+
+def _add_foreign_key(table):
+    if _has_foreign_key(table):
+        return
+
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.create_foreign_key(
+            f"fk_{table}_datarequest_id",
+            "datarequests",
+            ["datarequest_id"],
+            ["id"],
+            ondelete="CASCADE",
+        )
+
+
+def upgrade():
+    # Data requests are identified by their id. The title is not part of the
+    # key anymore, but it must be unique (case insensitive)
+    _set_primary_key("datarequests", ["id"])
+    _rename_duplicated_titles()
+    # Expression indexes are not reflected in SQLite, so the database checks
+    # whether it exists (it's created by init_db too)
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_datarequests_title "
+        "ON datarequests (lower(title))"
+    )
+
+    # Orphaned comments and followers (whose data request was deleted) are
+    # removed before creating the foreign keys
+    for table in ("datarequests_comments", "datarequests_followers"):
+        op.execute(
+            f"DELETE FROM {table} WHERE datarequest_id NOT IN "
+            "(SELECT id FROM datarequests)"
+        )
+
+    # A user can only follow a data request once. The oldest row is kept
+    op.execute(
+        "DELETE FROM datarequests_followers WHERE EXISTS ("
+        "SELECT 1 FROM datarequests_followers f "
+        "WHERE f.datarequest_id = datarequests_followers.datarequest_id "
+        "AND f.user_id = datarequests_followers.user_id "
+        "AND (f.time < datarequests_followers.time OR "
+        "(f.time = datarequests_followers.time AND f.id < datarequests_followers.id)))"
+    )
+
+    _set_primary_key("datarequests_comments", ["id"])
+    _add_foreign_key("datarequests_comments")
+
+    _set_primary_key("datarequests_followers", ["id"])
+    _add_foreign_key("datarequests_followers")
+    inspector = sa.inspect(op.get_bind())
+    unique_constraints = {
+        constraint["name"]
+        for constraint in inspector.get_unique_constraints("datarequests_followers")
+    }
+    indexes = {
+        index["name"] for index in inspector.get_indexes("datarequests_followers")
+    }
+    with op.batch_alter_table("datarequests_followers") as batch_op:
+        # The unique constraint is also an index on (datarequest_id, user_id)
+        if "uq_datarequests_followers_datarequest_id_user_id" not in unique_constraints:
+            batch_op.create_unique_constraint(
+                "uq_datarequests_followers_datarequest_id_user_id",
+                ["datarequest_id", "user_id"],
+            )
+        if "idx_datarequests_followers_datarequest_id" in indexes:
+            batch_op.drop_index("idx_datarequests_followers_datarequest_id")
+
+
+def downgrade():
+    with op.batch_alter_table("datarequests_followers") as batch_op:
+        batch_op.create_index(
+            "idx_datarequests_followers_datarequest_id", ["datarequest_id", "user_id"]
+        )
+        batch_op.drop_constraint(
+            "uq_datarequests_followers_datarequest_id_user_id", type_="unique"
+        )
+        batch_op.drop_constraint(
+            "fk_datarequests_followers_datarequest_id", type_="foreignkey"
+        )
+    _set_primary_key("datarequests_followers", ["id", "datarequest_id", "time"])
+
+    with op.batch_alter_table("datarequests_comments") as batch_op:
+        batch_op.drop_constraint(
+            "fk_datarequests_comments_datarequest_id", type_="foreignkey"
+        )
+    _set_primary_key("datarequests_comments", ["id", "datarequest_id", "time"])
+
+    op.drop_index("idx_datarequests_title", table_name="datarequests")
+    _set_primary_key("datarequests", ["id", "title"])
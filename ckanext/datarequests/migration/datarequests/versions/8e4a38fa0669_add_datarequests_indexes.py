@@ -0,0 +1,67 @@
+"""Add indexes to the datarequests tables
+
+Revision ID: 8e4a38fa0669
+Revises: e2be1cd3e2c7
+Create Date: 2026-10-18 09:20:05.718264
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8e4a38fa0669"
+down_revision = "e2be1cd3e2c7"
+branch_labels = None
+depends_on = None
+
+# (name, table, columns). They match the queries of the db module: data
+# requests are listed by (open_time, id) and filtered by organization, user
+# and state, comments are listed by data request and time and followers are
+# looked up by data request and user
+INDEXES = [
+    ("idx_datarequests_open_time", "datarequests", ["open_time", "id"]),
+    (
+        "idx_datarequests_organization_id",
+        "datarequests",
+        ["organization_id", "open_time", "id"],
+    ),
+    ("idx_datarequests_user_id", "datarequests", ["user_id", "open_time", "id"]),
+    ("idx_datarequests_closed", "datarequests", ["closed", "open_time", "id"]),
+    (
+        "idx_datarequests_comments_datarequest_id",
+        "datarequests_comments",
+        ["datarequest_id", "time"],
+    ),
+    (
+        "idx_datarequests_followers_datarequest_id",
+        "datarequests_followers",
+        ["datarequest_id", "user_id"],
+    ),
+]
+
+
+def _get_existing_indexes(table):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    is_postgresql = op.get_bind().dialect.name == "postgresql"
+
+    for name, table, columns in INDEXES:
+        if name in _get_existing_indexes(table):
+            continue
+
+        if is_postgresql:
+            # Concurrent creation does not lock the table against writes, so
+            # existing deployments can be upgraded in place. It cannot be run
+            # inside a transaction
+            with op.get_context().autocommit_block():
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        if name in _get_existing_indexes(table):
+            op.drop_index(name, table_name=table)
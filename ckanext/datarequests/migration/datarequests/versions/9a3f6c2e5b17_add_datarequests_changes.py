@@ -0,0 +1,65 @@
+"""Add the datarequests_changes table
+
+Revision ID: 9a3f6c2e5b17
+Revises: 7d4e1b2a9c30
+Create Date: 2026-10-18 23:04:19.527631
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9a3f6c2e5b17"
+down_revision = "7d4e1b2a9c30"
+branch_labels = None
+depends_on = None
+
+# The changes that can be recovered from the existing data. Who closed the
+# data requests is not stored, so their user is unknown. Changes made at the
+# same time are sorted by rank: data requests are created before being
+# commented or followed and closed after that
+HISTORY = (
+    "SELECT id AS datarequest_id, 'created' AS change_type, user_id, "
+    "NULL AS object_id, open_time AS time, 0 AS rank FROM datarequests "
+    "WHERE open_time IS NOT NULL "
+    "UNION ALL SELECT datarequest_id, 'commented', user_id, id, time, 1 "
+    "FROM datarequests_comments WHERE time IS NOT NULL "
+    "UNION ALL SELECT datarequest_id, 'followed', user_id, NULL, time, 1 "
+    "FROM datarequests_followers WHERE time IS NOT NULL "
+    "UNION ALL SELECT id, 'closed', NULL, NULL, close_time, 2 FROM datarequests "
+    "WHERE close_time IS NOT NULL"
+)
+
+
+def upgrade():
+    # The table may have been created by the init-db command. Then, the
+    # history is not added, since it would be logged after newer changes
+    if sa.inspect(op.get_bind()).has_table("datarequests_changes"):
+        return
+
+    op.create_table(
+        "datarequests_changes",
+        sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("datarequest_id", sa.UnicodeText, nullable=False),
+        sa.Column("change_type", sa.UnicodeText, nullable=False),
+        sa.Column("user_id", sa.UnicodeText, nullable=True),
+        sa.Column("object_id", sa.UnicodeText, nullable=True),
+        sa.Column("time", sa.DateTime, nullable=False),
+    )
+    op.create_index(
+        "idx_datarequests_changes_time",
+        "datarequests_changes",
+        ["time"],
+    )
+
+    # The history is logged in the order it happened
+    op.execute(
+        "INSERT INTO datarequests_changes "
+        "(datarequest_id, change_type, user_id, object_id, time) "
+        "SELECT datarequest_id, change_type, user_id, object_id, time "
+        f"FROM ({HISTORY}) AS history ORDER BY time, rank"
+    )
+
+
+def downgrade():
+    op.drop_table("datarequests_changes")
@@ -0,0 +1,37 @@
+"""Add the attempts and failed columns to the datarequests_outbox table
+
+Revision ID: c4b8e2f17a35
+Revises: 9a3f6c2e5b17
+Create Date: 2026-10-19 10:14:52.618304
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c4b8e2f17a35"
+down_revision = "9a3f6c2e5b17"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+    sa.Column("failed", sa.DateTime, nullable=True),
+]
+
+
+def upgrade():
+    # The columns may have been created by init_db
+    existing_columns = {
+        column["name"]
+        for column in sa.inspect(op.get_bind()).get_columns("datarequests_outbox")
+    }
+
+    for column in COLUMNS:
+        if column.name not in existing_columns:
+            op.add_column("datarequests_outbox", column)
+
+
+def downgrade():
+    for column in reversed(COLUMNS):
+        op.drop_column("datarequests_outbox", column.name)
@@ -0,0 +1,190 @@
+"""Add full text search to the datarequests table
+
+Revision ID: e1dd88874811
+Revises: 8986fb99645c
+Create Date: 2026-10-18 11:14:36.502817
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e1dd88874811"
+down_revision = "8986fb99645c"
+branch_labels = None
+depends_on = None
+
+# It must match db.SEARCH_CONFIG, which is used to parse the queries
+SEARCH_CONFIG = "english"
+
+# Number of data requests whose search vector is computed in each transaction
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _search_vector(row):
+    # Matches in the title are ranked higher than matches in the description
+    title = f"to_tsvector('{SEARCH_CONFIG}', coalesce({row}title, ''))"
+    description = f"to_tsvector('{SEARCH_CONFIG}', coalesce({row}description, ''))"
+    return f"setweight({title}, 'A') || setweight({description}, 'B')"
+
+
+POSTGRESQL_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION datarequests_search_vector_update() "
+    "RETURNS trigger AS $$ BEGIN "
+    f"NEW.search_vector := {_search_vector('NEW.')}; "
+    "RETURN NEW; END $$ LANGUAGE plpgsql"
+)
+
+POSTGRESQL_TRIGGER = (
+    "CREATE TRIGGER datarequests_search_vector_update "
+    "BEFORE INSERT OR UPDATE OF title, description ON datarequests "
+    "FOR EACH ROW EXECUTE PROCEDURE datarequests_search_vector_update()"
+)
+
+SQLITE_TRIGGERS = {
+    # New data requests are numbered after the last one
+    "datarequests_search_insert": (
+        "AFTER INSERT ON datarequests BEGIN "
+        "UPDATE datarequests SET search_rowid = (SELECT coalesce(max(search_rowid), "
+        "0) + 1 FROM datarequests) WHERE id = new.id; "
+        "INSERT INTO datarequests_search(rowid, title, description) "
+        "SELECT search_rowid, title, description FROM datarequests "
+        "WHERE id = new.id; END"
+    ),
+    "datarequests_search_delete": (
+        "AFTER DELETE ON datarequests BEGIN "
+        "INSERT INTO datarequests_search(datarequests_search, rowid, title, "
+        "description) VALUES ('delete', old.search_rowid, old.title, "
+        "old.description); END"
+    ),
+    "datarequests_search_update": (
+        "AFTER UPDATE OF title, description ON datarequests BEGIN "
+        "INSERT INTO datarequests_search(datarequests_search, rowid, title, "
+        "description) VALUES ('delete', old.search_rowid, old.title, "
+        "old.description); "
+        "INSERT INTO datarequests_search(rowid, title, description) "
+        "VALUES (new.search_rowid, new.title, new.description); END"
+    ),
+}
+
+
+def _sqlite_has_fts5():
+    options = op.get_bind().execute(sa.text("PRAGMA compile_options")).fetchall()
+    return "ENABLE_FTS5" in {option for (option,) in options}
+
+
+def _is_index_invalid(name):
+    return bool(
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = "
+                "pg_index.indexrelid WHERE pg_class.relname = :name "
+                "AND NOT pg_index.indisvalid"
+            ),
+            {"name": name},
+        )
+        .scalar()
+    )
+
+
+def _upgrade_postgresql():
+    # Existing deployments are upgraded in place, so the table is not
+    # rewritten: the column is added without a default and it is kept up to
+    # date by a trigger. Every step can be run again if the migration fails
+    op.execute(
+        "ALTER TABLE datarequests ADD COLUMN IF NOT EXISTS search_vector tsvector"
+    )
+    op.execute(POSTGRESQL_FUNCTION)
+    op.execute(
+        "DROP TRIGGER IF EXISTS datarequests_search_vector_update ON datarequests"
+    )
+    op.execute(POSTGRESQL_TRIGGER)
+
+    backfill = sa.text(
+        f"UPDATE datarequests SET search_vector = {_search_vector('')} "
+        "WHERE id IN (SELECT id FROM datarequests "
+        "WHERE search_vector IS NULL LIMIT :limit)"
+    )
+
+    # The existing data requests are updated in small transactions, so only
+    # a few rows are locked at once. Concurrent creation of the index does not
+    # lock the table against writes. None of them can be run inside a
+    # transaction. The search engine is used once the index is valid
+    with op.get_context().autocommit_block():
+        while True:
+            result = op.get_bind().execute(backfill, {"limit": BACKFILL_BATCH_SIZE})
+            if not result.rowcount:
+                break
+
+        # A failed concurrent creation leaves an invalid index behind
+        if _is_index_invalid("idx_datarequests_search_vector"):
+            op.execute("DROP INDEX CONCURRENTLY idx_datarequests_search_vector")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_datarequests_search_vector "
+            "ON datarequests USING gin (search_vector)"
+        )
+
+
+def _upgrade_sqlite():
+    # The index only stores the tokens (external content table) and it is
+    # kept in sync with the data requests table by triggers. Its entries are
+    # identified by an integer column of their own: the primary key of the
+    # data requests is a text, so their rowids may be changed by VACUUM
+    op.execute("ALTER TABLE datarequests ADD COLUMN search_rowid INTEGER")
+    op.execute("UPDATE datarequests SET search_rowid = rowid")
+    op.execute(
+        "CREATE UNIQUE INDEX idx_datarequests_search_rowid "
+        "ON datarequests (search_rowid)"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE datarequests_search USING fts5("
+        "title, description, content='datarequests', content_rowid='search_rowid')"
+    )
+    # Matches in the title are ranked higher than matches in the description
+    op.execute(
+        "INSERT INTO datarequests_search(datarequests_search, rank) "
+        "VALUES ('rank', 'bm25(10.0, 1.0)')"
+    )
+    op.execute(
+        "INSERT INTO datarequests_search(datarequests_search) VALUES ('rebuild')"
+    )
+    for name, definition in SQLITE_TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {definition}")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    inspector = sa.inspect(op.get_bind())
+
+    # The tables created by init_db do not include the objects used by the
+    # full text search, but they may have been created by a previous run
+    if dialect == "postgresql":
+        _upgrade_postgresql()
+    elif (
+        dialect == "sqlite"
+        and _sqlite_has_fts5()
+        and not inspector.has_table("datarequests_search")
+    ):
+        _upgrade_sqlite()
+
+    # Other databases keep searching data requests with ILIKE
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if "search_vector" in {c["name"] for c in inspector.get_columns("datarequests")}:
+        op.execute("DROP INDEX IF EXISTS idx_datarequests_search_vector")
+        op.execute(
+            "DROP TRIGGER IF EXISTS datarequests_search_vector_update ON datarequests"
+        )
+        op.execute("DROP FUNCTION IF EXISTS datarequests_search_vector_update()")
+        op.drop_column("datarequests", "search_vector")
+
+    if inspector.has_table("datarequests_search"):
+        for name in SQLITE_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE datarequests_search")
+        op.execute("DROP INDEX IF EXISTS idx_datarequests_search_rowid")
+        op.drop_column("datarequests", "search_rowid")
@@ -0,0 +1,60 @@
+"""Create datarequests tables
+
+Revision ID: e2be1cd3e2c7
+Revises:
+Create Date: 2026-10-18 09:12:31.402115
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e2be1cd3e2c7"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Deployments created before migrations were introduced already have the
+    # tables (they were created by db.init_db), so only missing ones are created
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if "datarequests" not in existing_tables:
+        op.create_table(
+            "datarequests",
+            sa.Column("user_id", sa.types.UnicodeText),
+            sa.Column("id", sa.types.UnicodeText, primary_key=True),
+            sa.Column("title", sa.types.Unicode(100), primary_key=True),
+            sa.Column("description", sa.types.Unicode(1000)),
+            sa.Column("organization_id", sa.types.UnicodeText),
+            sa.Column("open_time", sa.types.DateTime),
+            sa.Column("accepted_dataset_id", sa.types.UnicodeText),
+            sa.Column("close_time", sa.types.DateTime),
+            sa.Column("closed", sa.types.Boolean),
+        )
+
+    if "datarequests_comments" not in existing_tables:
+        op.create_table(
+            "datarequests_comments",
+            sa.Column("id", sa.types.UnicodeText, primary_key=True),
+            sa.Column("user_id", sa.types.UnicodeText),
+            sa.Column("datarequest_id", sa.types.UnicodeText, primary_key=True),
+            sa.Column("time", sa.types.DateTime, primary_key=True),
+            sa.Column("comment", sa.types.Unicode(1000)),
+        )
+
+    if "datarequests_followers" not in existing_tables:
+        op.create_table(
+            "datarequests_followers",
+            sa.Column("id", sa.types.UnicodeText, primary_key=True),
+            sa.Column("user_id", sa.types.UnicodeText),
+            sa.Column("datarequest_id", sa.types.UnicodeText, primary_key=True),
+            sa.Column("time", sa.types.DateTime, primary_key=True),
+        )
+
+
+def downgrade():
+    op.drop_table("datarequests_followers")
+    op.drop_table("datarequests_comments")
+    op.drop_table("datarequests")
@@ -0,0 +1,50 @@
+"""Add the comments and followers counters to the datarequests table
+
+Revision ID: f80d834ebb4d
+Revises: e1dd88874811
+Create Date: 2026-10-18 12:31:09.847215
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f80d834ebb4d"
+down_revision = "e1dd88874811"
+branch_labels = None
+depends_on = None
+
+# (column, table whose rows are counted)
+COUNTERS = [
+    ("comment_count", "datarequests_comments"),
+    ("follower_count", "datarequests_followers"),
+]
+
+
+def upgrade():
+    # The columns may have been created by init_db. Then, they are already
+    # kept up to date
+    existing_columns = {
+        column["name"]
+        for column in sa.inspect(op.get_bind()).get_columns("datarequests")
+    }
+
+    # The columns are added one by one, so SQLite does not need to recreate
+    # the table (which would drop the full text search triggers)
+    for column, table in COUNTERS:
+        if column in existing_columns:
+            continue
+
+        op.add_column(
+            "datarequests",
+            sa.Column(column, sa.Integer, nullable=False, server_default="0"),
+        )
+        op.execute(
+            f"UPDATE datarequests SET {column} = (SELECT count(*) FROM {table} "
+            f"WHERE {table}.datarequest_id = datarequests.id)"
+        )
+
+
+def downgrade():
+    for column, _ in reversed(COUNTERS):
+        op.drop_column("datarequests", column)
@@ -0,0 +1,323 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from ckan import model
+from ckan.common import config
+from ckan.lib import base
+from ckan.plugins import toolkit as tk
+from flask import current_app, has_app_context
+from jinja2 import nodes
+
+from . import db, mail
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 2
+
+# Number of notifications claimed from the outbox at once
+DEFAULT_BATCH_SIZE = 100
+
+# Number of times a notification is sent before giving up
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Time after which the notifications claimed by a drainer can be claimed by
+# another one and after which the notifications that could not be sent are
+# sent again
+LEASE = datetime.timedelta(minutes=10)
+
+# Seconds to wait before sending a notification again. It's doubled after
+# each attempt
+RETRY_DELAY = 1
+
+# Delimits the places of the rendered templates where the attributes of the
+# recipients go
+RECIPIENT_MARK = "\x00"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Results of _only_prints_recipient by template name, with the function that
+# tells whether the template has not changed since it was parsed
+_recipient_uses = {}
+
+
+def _get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            workers = tk.asint(
+                config.get("ckan.datarequests.notifications.workers", DEFAULT_WORKERS)
+            )
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="datarequests-notifications"
+            )
+
+    return _executor
+
+
+class _Recipient(object):
+    """Stands for the recipient when the templates that only print its
+    attributes are rendered. They are rendered as marks, so those templates
+    are rendered once per notification and the marks are replaced with the
+    attributes of each recipient"""
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        return f"{RECIPIENT_MARK}{name}{RECIPIENT_MARK}"
+
+    __getitem__ = __getattr__
+
+
+def _only_prints_recipient(template_name):
+    """Returns True if the template only uses the recipient to print its
+    attributes ({{ user.name }} or {{ user['name'] }}). Other uses (such as
+    conditions or filters) depend on the actual recipient. So do the templates
+    that extend or include others, since they share the recipient with them.
+    Templates are parsed once, unless they change and templates are reloaded
+    (auto_reload)"""
+    env = current_app.jinja_env
+
+    if template_name in _recipient_uses:
+        only_prints, uptodate = _recipient_uses[template_name]
+        if not env.auto_reload or uptodate is None or uptodate():
+            return only_prints
+
+    source, _, uptodate = env.loader.get_source(env, template_name)
+    only_prints = _parse_recipient_uses(env.parse(source))
+    _recipient_uses[template_name] = (only_prints, uptodate)
+
+    return only_prints
+
+
+def _parse_recipient_uses(ast):
+    if next(ast.find_all((nodes.Extends, nodes.Include, nodes.Import)), None):
+        return False
+
+    printed = set()
+    for output in ast.find_all(nodes.Output):
+        for node in output.nodes:
+            is_attribute = isinstance(node, nodes.Getattr) or (
+                isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const)
+            )
+            if is_attribute and isinstance(node.node, nodes.Name):
+                printed.add(id(node.node))
+
+    return all(
+        id(name) in printed for name in ast.find_all(nodes.Name) if name.name == "user"
+    )
+
+
+def _fill_template(template, user):
+    return "".join(
+        str(getattr(user, item, "")) if i % 2 else item
+        for i, item in enumerate(template)
+    )
+
+
+def _render_template(template_name, extra_vars, user):
+    return base.render_jinja2(template_name, dict(extra_vars, user=user))
+
+
+def _render_templates(action_type, datarequest):
+    """Returns the functions that render the subject and the body of a
+    notification for a recipient. The templates that only print attributes of
+    the recipient are rendered once, with marks where the attributes go, and
+    the marks are replaced for each recipient. The others are rendered for
+    each recipient"""
+    extra_vars = {
+        "datarequest": datarequest,
+        "site_title": config.get("ckan.site_title"),
+        "site_url": config.get("ckan.site_url"),
+    }
+
+    renderers = []
+    for part in ("subjects", "bodies"):
+        template_name = f"emails/{part}/{action_type}.txt"
+        if _only_prints_recipient(template_name):
+            template = _render_template(template_name, extra_vars, _Recipient())
+            renderers.append(partial(_fill_template, template.split(RECIPIENT_MARK)))
+        else:
+            renderers.append(partial(_render_template, template_name, extra_vars))
+
+    return renderers
+
+
+def _get_recipients(user_ids):
+    """Returns the users that can be notified, in the order of user_ids. They
+    are read with one query"""
+    users = model.Session.query(model.User).filter(model.User.id.in_(user_ids))
+    users = {user.id: user for user in users}
+
+    recipients = []
+    for user_id in user_ids:
+        user = users.get(user_id)
+        if user is None or not user.email:
+            log.warning(f"User {user_id} cannot be notified: there is no email address")
+        else:
+            recipients.append(user)
+
+    return recipients
+
+
+def _send_mail(sender, user, renderers):
+    subject, body = (render(user=user) for render in renderers)
+    sender.send(user.display_name, user.email, subject, body)
+
+
+def send_notifications(sender, user_ids, action_type, datarequest):
+    """Notifies the given users through sender (a mail.SMTPSender).
+    Notifications that cannot be sent are tried again a few times. Returns the
+    IDs of the users that could not be notified"""
+    retries = tk.asint(
+        config.get("ckan.datarequests.notifications.retries", DEFAULT_RETRIES)
+    )
+
+    try:
+        renderers = _render_templates(action_type, datarequest)
+    except Exception:
+        log.exception(f"Error rendering the {action_type} notification")
+        return list(user_ids)
+
+    failed = []
+    for user in _get_recipients(user_ids):
+        for attempt in range(retries + 1):
+            try:
+                _send_mail(sender, user, renderers)
+                break
+            except Exception:
+                if attempt == retries:
+                    log.exception(f"Error sending notification to {user.id}")
+                    failed.append(user.id)
+                else:
+                    time.sleep(RETRY_DELAY * 2**attempt)
+
+    return failed
+
+
+def add_notification(session, user_ids, action_type, datarequest):
+    """Stores a notification in the outbox. It's written in the transaction of
+    the session, so it's only sent if the changes that generate it are
+    committed. Returns False if there is nobody to notify"""
+    if not user_ids:
+        return False
+
+    notification = db.Notification()
+    notification.action_type = action_type
+    notification.user_ids = json.dumps(sorted(user_ids))
+    notification.datarequest = json.dumps(datarequest, default=str)
+    notification.created = datetime.datetime.utcnow()
+    session.add(notification)
+
+    return True
+
+
+def send_pending_notifications(batch_size=DEFAULT_BATCH_SIZE):
+    """Sends the notifications stored in the outbox and returns how many have
+    been delivered. They are claimed in batches, so several drainers can run
+    at the same time, and marked as delivered once they have been sent to
+    every recipient: if a drainer fails, they are sent again (at least once
+    delivery). The ones that some recipients have not received are left
+    pending for those recipients and sent again once the lease expires, up to
+    ckan.datarequests.notifications.max_attempts times. Then, they are marked
+    as failed. The messages of each batch are sent over the same SMTP
+    connection. The session is committed after claiming each batch, so the
+    notifications are not locked while they are sent, and after sending it"""
+    db.init_db(model)
+    max_attempts = tk.asint(
+        config.get("ckan.datarequests.notifications.max_attempts", DEFAULT_MAX_ATTEMPTS)
+    )
+    sent = 0
+
+    while True:
+        batch = db.Notification.claim(batch_size, LEASE)
+        model.Session.commit()
+        if not batch:
+            break
+
+        with mail.SMTPSender() as sender:
+            for notification in batch:
+                failed = send_notifications(
+                    sender,
+                    json.loads(notification.user_ids),
+                    notification.action_type,
+                    json.loads(notification.datarequest),
+                )
+                now = datetime.datetime.utcnow()
+                if not failed:
+                    notification.delivered = now
+                    sent += 1
+                    continue
+
+                notification.user_ids = json.dumps(failed)
+                notification.attempts += 1
+                if notification.attempts >= max_attempts:
+                    notification.failed = now
+                    log.error(
+                        f"Notification {notification.id} could not be sent to "
+                        f"{', '.join(failed)} after {notification.attempts} "
+                        "attempts. It will not be sent again"
+                    )
+                else:
+                    notification.claimed_until = now + LEASE
+
+        model.Session.commit()
+
+    return sent
+
+
+def _send_pending_notifications_in_thread(app):
+    try:
+        if app is not None:
+            with app.app_context():
+                send_pending_notifications()
+        else:
+            send_pending_notifications()
+    except Exception:
+        log.exception("Error sending the pending notifications")
+    finally:
+        # Each thread has its own session
+        model.Session.remove()
+
+
+def enqueue_notifications():
+    """Sends the pending notifications in the background, so actions do not
+    wait for the mail server. It must be called once the notifications have
+    been committed. They are sent by the CKAN background jobs workers. When
+    the jobs queue is not available, they are sent by a pool of threads of the
+    current process (ckan.datarequests.notifications.workers). The ones that
+    are not sent are sent by the send-notifications command"""
+    try:
+        tk.enqueue_job(send_pending_notifications, title="datarequests notifications")
+    except Exception:
+        log.warning(
+            "Notifications cannot be enqueued. They will be sent by this process",
+            exc_info=True,
+        )
+        app = current_app._get_current_object() if has_app_context() else None
+        _get_executor().submit(_send_pending_notifications_in_thread, app)
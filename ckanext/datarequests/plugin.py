@@ -19,12 +19,13 @@ import os
 import sys
 from functools import partial
 
+from ckan import model
 from ckan import plugins as p
 from ckan.common import config
 from ckan.plugins import toolkit as tk
 from flask import Blueprint
 
-from . import actions, auth, constants, helpers
+from . import actions, auth, cache, cli, constants, db, helpers
 from .controllers import ui_controller
 
 datarequests_bp = Blueprint("datarequests", __name__)
@@ -47,8 +48,12 @@ class DataRequestsPlugin(p.SingletonPlugin):
 
     p.implements(p.IActions)
     p.implements(p.IAuthFunctions)
+    p.implements(p.IConfigurable)
     p.implements(p.IConfigurer)
     p.implements(p.IBlueprint)
+    p.implements(p.IClick)
+    p.implements(p.IDomainObjectModification, inherit=True)
+    p.implements(p.ISignal)
     p.implements(p.ITemplateHelpers)
     p.implements(p.ITranslation)
 
@@ -77,6 +82,7 @@ class DataRequestsPlugin(p.SingletonPlugin):
             constants.CLOSE_DATAREQUEST: actions.close_datarequest,
             constants.FOLLOW_DATAREQUEST: actions.follow_datarequest,
             constants.UNFOLLOW_DATAREQUEST: actions.unfollow_datarequest,
+            constants.DATAREQUEST_CHANGES: actions.datarequest_changes,
         }
 
         if self.comments_enabled:
@@ -111,6 +117,7 @@ class DataRequestsPlugin(p.SingletonPlugin):
             constants.CLOSE_DATAREQUEST: auth.close_datarequest,
             constants.FOLLOW_DATAREQUEST: auth.follow_datarequest,
             constants.UNFOLLOW_DATAREQUEST: auth.unfollow_datarequest,
+            constants.DATAREQUEST_CHANGES: auth.datarequest_changes,
         }
 
         if self.comments_enabled:
@@ -130,6 +137,39 @@ class DataRequestsPlugin(p.SingletonPlugin):
 
         return auth_functions
 
+    def configure(self, config):
+        """
+        IConfigurable
+        """
+        # The classes are mapped once, when CKAN starts. The tables are not
+        # created here, so web workers do not need to change the schema
+        db.init_db(model)
+
+        # The caches are sized from the configuration here and not when the
+        # plugin is instantiated, since the plugin is instantiated while its
+        # modules are still being imported
+        cache_max_size = tk.asint(
+            config.get("ckan.datarequests.cache.max_size", cache.DEFAULT_MAX_SIZE)
+        )
+        cache_ttl = tk.asint(
+            config.get("ckan.datarequests.cache.ttl", cache.DEFAULT_TTL)
+        )
+        for lru in (
+            actions.USERS_CACHE,
+            actions.ORGANIZATIONS_CACHE,
+            actions.PACKAGES_CACHE,
+        ):
+            lru.configure(cache_max_size, cache_ttl)
+        actions.OPEN_DATAREQUESTS_CACHE.configure(
+            1,
+            tk.asint(
+                config.get(
+                    "ckan.datarequests.cache.open_datarequests_ttl",
+                    cache.DEFAULT_OPEN_DATAREQUESTS_TTL,
+                )
+            ),
+        )
+
     def update_config(self, config):
         """
         IConfigurer
@@ -159,6 +199,11 @@ class DataRequestsPlugin(p.SingletonPlugin):
                 "new",
                 ui_controller.new,
             ),
+            (
+                f"/{constants.DATAREQUESTS_MAIN_PATH}/export",
+                "export",
+                ui_controller.export_datarequests,
+            ),
             (
                 f"/{constants.DATAREQUESTS_MAIN_PATH}/<id>",
                 "show",
@@ -222,6 +267,41 @@ class DataRequestsPlugin(p.SingletonPlugin):
 
         return [datarequests_bp]
 
+    def get_commands(self):
+        """
+        IClick
+        """
+        return cli.get_commands()
+
+    def get_signal_subscriptions(self):
+        """
+        ISignal
+        """
+        user_actions = ("user_update", "user_delete")
+        organization_actions = (
+            "organization_create",
+            "organization_update",
+            "organization_delete",
+            "organization_purge",
+        )
+        return {
+            tk.signals.action_succeeded: [
+                {"sender": action, "receiver": actions.invalidate_cached_user}
+                for action in user_actions
+            ]
+            + [
+                {"sender": action, "receiver": actions.invalidate_cached_organization}
+                for action in organization_actions
+            ]
+        }
+
+    def notify(self, entity, operation):
+        """
+        IDomainObjectModification
+        """
+        if isinstance(entity, model.Package):
+            actions.invalidate_cached_package(entity)
+
     def get_helpers(self):
         """
         ITemplates helper
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import datetime
 import unittest
 
@@ -31,13 +32,15 @@ class ActionsTest(unittest.TestCase):
         # Mocks
         self._tk = actions.tk
         actions.tk = MagicMock()
-        actions.USERS_CACHE = {}
+        actions.USERS_CACHE.clear()
+        actions.ORGANIZATIONS_CACHE.clear()
+        actions.PACKAGES_CACHE.clear()
+        # The number of open data requests has to be removed by the actions
+        # that change it
+        actions.OPEN_DATAREQUESTS_CACHE.set(actions.OPEN_DATAREQUESTS_KEY, 10)
         actions.tk.ObjectNotFound = self._tk.ObjectNotFound
         actions.tk.ValidationError = self._tk.ValidationError
 
-        self._c = actions.c
-        actions.c = MagicMock()
-
         self._db = actions.db
         actions.db = MagicMock()
 
@@ -57,10 +60,10 @@ class ActionsTest(unittest.TestCase):
     def tearDown(self):
         # Unmock
         actions.tk = self._tk
-        actions.c = self._c
         actions.db = self._db
         actions.validator = self._validator
         actions.datetime = self._datetime
+        actions.OPEN_DATAREQUESTS_CACHE.clear()
 
     def _check_comment(self, comment, response, user):
         self.assertEquals(comment.id, response["id"])
@@ -84,6 +87,8 @@ class ActionsTest(unittest.TestCase):
         self.assertEquals(
             datarequest.accepted_dataset_id, response["accepted_dataset_id"]
         )
+        self.assertEquals(datarequest.follower_count, response["followers"])
+        self.assertEquals(datarequest.comment_count, response["comments"])
 
         if organization:
             self.assertEquals(organization, response["organization"])
@@ -100,6 +105,34 @@ class ActionsTest(unittest.TestCase):
     ################################# AUX ################################
     ######################################################################
 
+    def _mock_batch_lookups(self, user, organization_show, package):
+        def _get_organizations(organization_ids):
+            return {
+                organization_id: organization_show(None, {"id": organization_id})
+                for organization_id in organization_ids
+            }
+
+        get_users = patch.object(
+            actions,
+            "_get_users",
+            side_effect=lambda user_ids: {user_id: user for user_id in user_ids},
+        )
+        get_organizations = patch.object(
+            actions, "_get_organizations", side_effect=_get_organizations
+        )
+        get_packages = patch.object(
+            actions,
+            "_get_packages",
+            side_effect=lambda package_ids: {
+                package_id: package for package_id in package_ids
+            },
+        )
+
+        self.addCleanup(patch.stopall)
+        get_users.start()
+        get_packages.start()
+        return get_organizations.start()
+
     def _test_not_authorized(self, function, action, request_data):
         # Configure the mock
         actions.tk.check_access = MagicMock(side_effect=self._tk.NotAuthorized)
@@ -159,178 +192,25 @@ class ActionsTest(unittest.TestCase):
     ######################### GET INVOLVED USERS #########################
     ######################################################################
 
-    @patch("ckanext.datarequests.actions.list_datarequest_comments")
-    def test_get_involved_users_no_org_and_current_user_must_be_discarded(
-        self, list_comments_mock
-    ):
-
-        datarequest_id = "dr1"
-        follower1 = MagicMock()
-        follower2 = MagicMock()
-        follower1.user_id = "user-2"
-        follower2.user_id = "user-3"
-
-        list_comments_mock.return_value = [{"user_id": "user-1"}, {"user_id": "user-2"}]
-        actions.db.DataRequestFollower.get.return_value = [follower1, follower2]
-
-        self.context["auth_user_obj"].id = "user-1"
-        datarequest = {"id": datarequest_id, "user_id": "user-1", "organization": None}
-
-        result = actions._get_datarequest_involved_users(self.context, datarequest)
-
-        self.assertEquals(set(["user-2", "user-3"]), result)
-
-        actions.db.DataRequestFollower.get.assert_called_once_with(
-            datarequest_id=datarequest_id
-        )
-        list_comments_mock.assert_called_once_with(
-            {"ignore_auth": True, "model": self.context["model"]},
-            {"datarequest_id": datarequest_id},
-        )
-
-    @patch("ckanext.datarequests.actions.list_datarequest_comments")
-    def test_get_involved_users_no_org_and_current_user_must_not_be_discarded(
-        self, list_comments_mock
-    ):
-
+    @parameterized.expand(
+        [
+            ("user-1", {"user-2", "user-3"}),
+            ("user-7", {"user-1", "user-2", "user-3"}),
+        ]
+    )
+    def test_get_involved_users(self, current_user, expected_users):
         datarequest_id = "dr1"
-        follower1 = MagicMock()
-        follower2 = MagicMock()
-        follower1.user_id = "user-2"
-        follower2.user_id = "user-3"
-
-        list_comments_mock.return_value = [{"user_id": "user-1"}, {"user_id": "user-2"}]
-        actions.db.DataRequestFollower.get.return_value = [follower1, follower2]
+        get_participant_ids = actions.db.Participant.get_user_ids
+        get_participant_ids.return_value = {"user-1", "user-2", "user-3"}
 
-        self.context["auth_user_obj"].id = "user-7"
+        self.context["auth_user_obj"].id = current_user
         datarequest = {"id": datarequest_id, "user_id": "user-1", "organization": None}
 
         result = actions._get_datarequest_involved_users(self.context, datarequest)
 
-        self.assertEquals(set(["user-1", "user-2", "user-3"]), result)
-
-        actions.db.DataRequestFollower.get.assert_called_once_with(
-            datarequest_id=datarequest_id
-        )
-        list_comments_mock.assert_called_once_with(
-            {"ignore_auth": True, "model": self.context["model"]},
-            {"datarequest_id": datarequest_id},
-        )
-
-    @patch("ckanext.datarequests.actions.list_datarequest_comments")
-    def test_get_involved_users_org(self, list_comments_mock):
-
-        datarequest_id = "dr1"
-        follower1 = MagicMock()
-        follower2 = MagicMock()
-        follower1.user_id = "user-2"
-        follower2.user_id = "user-3"
-
-        list_comments_mock.return_value = [{"user_id": "user-1"}, {"user_id": "user-2"}]
-        actions.db.DataRequestFollower.get.return_value = [follower1, follower2]
-
-        self.context["auth_user_obj"].id = "user-7"
-        datarequest = {
-            "id": datarequest_id,
-            "user_id": "user-1",
-            "organization": {"users": [{"id": "user-3"}, {"id": "user-4"}]},
-        }
-
-        result = actions._get_datarequest_involved_users(self.context, datarequest)
-
-        self.assertEquals(set(["user-1", "user-2", "user-3", "user-4"]), result)
-
-        actions.db.DataRequestFollower.get.assert_called_once_with(
-            datarequest_id=datarequest_id
-        )
-        list_comments_mock.assert_called_once_with(
-            {"ignore_auth": True, "model": self.context["model"]},
-            {"datarequest_id": datarequest_id},
-        )
-
-    ######################################################################
-    ############################# SEND MAIL ##############################
-    ######################################################################
-
-    @patch("ckanext.datarequests.actions.config")
-    @patch("ckanext.datarequests.actions.mailer")
-    @patch("ckanext.datarequests.actions.base")
-    @patch("ckanext.datarequests.actions.model")
-    def test_send_mail_two_users(self, model_mock, base_mock, mailer_mock, config_mock):
-
-        subject = "SUBJECT"
-        body = "BODY"
-        user1 = MagicMock()
-        user2 = MagicMock()
-        get_users_side_effect = [user1, user2]
-        model_mock.User.get.side_effect = get_users_side_effect
-        config_mock.get.side_effect = lambda x: x
-        base_mock.render_jinja2.side_effect = (
-            lambda x, y: body if "bodies" in x else subject
-        )
-
-        users = ["user1", "user2"]
-        action_type = "new_datarequest"
-        datarequest = MagicMock()
-
-        actions._send_mail(users, action_type, datarequest)
-
-        for i, user in enumerate(users):
-            extra_args = {
-                "datarequest": datarequest,
-                "user": get_users_side_effect[i],
-                "site_title": "ckan.site_title",
-                "site_url": "ckan.site_url",
-            }
-            base_mock.render_jinja2.assert_any_call(
-                f"emails/subjects/{action_type}.txt", extra_args
-            )
-            base_mock.render_jinja2.assert_any_call(
-                f"emails/bodies/{action_type}.txt", extra_args
-            )
-
-            mailer_mock.mail_user.assert_any_call(
-                get_users_side_effect[i], subject, body
-            )
-
-    @patch("ckanext.datarequests.actions.config")
-    @patch("ckanext.datarequests.actions.mailer")
-    @patch("ckanext.datarequests.actions.base")
-    @patch("ckanext.datarequests.actions.model")
-    def test_send_mail_exception_no_risen(
-        self, model_mock, base_mock, mailer_mock, config_mock
-    ):
-
-        subject = "SUBJECT"
-        body = "BODY"
-        user = MagicMock()
-        model_mock.User.get.return_value = user
-        config_mock.get.side_effect = lambda x: x
-        base_mock.render_jinja2.side_effect = (
-            lambda x, y: body if "bodies" in x else subject
-        )
-        mailer_mock.mail_user.side_effect = Exception()
-
-        users = ["user1"]
-        action_type = "new_datarequest"
-        datarequest = MagicMock()
-
-        actions._send_mail(users, action_type, datarequest)
-
-        extra_args = {
-            "datarequest": datarequest,
-            "user": user,
-            "site_title": "ckan.site_title",
-            "site_url": "ckan.site_url",
-        }
-        base_mock.render_jinja2.assert_any_call(
-            f"emails/subjects/{action_type}.txt", extra_args
-        )
-        base_mock.render_jinja2.assert_any_call(
-            f"emails/bodies/{action_type}.txt", extra_args
-        )
-
-        mailer_mock.mail_user.assert_any_call(user, subject, body)
+        # The current user is not notified
+        self.assertEquals(expected_users, result)
+        get_participant_ids.assert_called_once_with(datarequest_id)
 
     ######################################################################
     ################################# NEW ################################
@@ -376,15 +256,17 @@ class ActionsTest(unittest.TestCase):
         self.assertEquals(0, self.context["session"].add.call_count)
         self.assertEquals(0, self.context["session"].commit.call_count)
 
-    @patch("ckanext.datarequests.actions._send_mail")
-    def test_create_datarequest_valid(self, send_mail_mock):
+    @patch("ckanext.datarequests.actions._get_organization_members")
+    @patch("ckanext.datarequests.actions.notifications")
+    def test_create_datarequest_valid(self, notifications_mock, get_members_mock):
         # Configure the mocks
         current_time = self._datetime.datetime.utcnow()
         actions.datetime.datetime.utcnow = MagicMock(return_value=current_time)
+        get_members_mock.return_value = {"user_1", "user_2"}
 
         # Mock actions
         default_user = {"user": 1}
-        default_org = {"org": 2, "users": [{"id": "user_1"}, {"id": "user_2"}]}
+        default_org = {"id": "org_id", "name": "org_name"}
         default_pkg = (
             None  # Accepted dataset cannot be different from None at this time
         )
@@ -409,9 +291,21 @@ class ActionsTest(unittest.TestCase):
 
         self.context["session"].add.assert_called_once_with(datarequest)
         self.context["session"].commit.assert_called_once()
-        send_mail_mock.assert_called_once_with(
-            set(["user_1", "user_2"]), "new_datarequest", result
+        self.assertEquals(0, len(actions.OPEN_DATAREQUESTS_CACHE))
+        actions.db.Participant.add.assert_called_once_with(
+            datarequest.id, self.context["auth_user_obj"].id, "creator"
+        )
+        actions.db.Change.add.assert_called_once_with(
+            datarequest.id, "created", datarequest.user_id
+        )
+        get_members_mock.assert_called_once_with("org_id")
+        notifications_mock.add_notification.assert_called_once_with(
+            self.context["session"],
+            set(["user_1", "user_2"]),
+            "new_datarequest",
+            result,
         )
+        notifications_mock.enqueue_notifications.assert_called_once_with()
 
         # Check the object stored in the database
         self.assertEquals(self.context["auth_user_obj"].id, datarequest.user_id)
@@ -430,6 +324,38 @@ class ActionsTest(unittest.TestCase):
             datarequest, result, default_user, default_org, default_pkg
         )
 
+    @parameterized.expand([(True,), (False,)])
+    @patch("ckanext.datarequests.actions.notifications")
+    def test_create_datarequest_integrity_error(self, title_in_use, notifications_mock):
+        # Configure the mocks
+        error = actions.IntegrityError("INSERT", {}, Exception())
+        self.context["session"].flush.side_effect = error
+        actions.db.is_title_in_use_error.return_value = title_in_use
+        actions.tk._ = lambda x: x
+
+        # Call the function
+        expected_exception = (
+            self._tk.ValidationError if title_in_use else actions.IntegrityError
+        )
+        with self.assertRaises(expected_exception) as c:
+            actions.create_datarequest(self.context, test_data.create_request_data)
+
+        # Assertions
+        self.context["session"].add.assert_called_once_with(
+            actions.db.DataRequest.return_value
+        )
+        self.context["session"].rollback.assert_called_once_with()
+        actions.db.is_title_in_use_error.assert_called_once_with(error)
+        self.assertEquals(0, notifications_mock.add_notification.call_count)
+        self.assertEquals(0, self.context["session"].commit.call_count)
+
+        if title_in_use:
+            self.assertEquals(
+                {"Title": ["That title is already in use"]}, c.exception.error_dict
+            )
+        else:
+            self.assertIs(error, c.exception)
+
     ######################################################################
     ################################ SHOW ################################
     ######################################################################
@@ -456,8 +382,8 @@ class ActionsTest(unittest.TestCase):
         actions.db.DataRequest.get.return_value = [datarequest]
 
         # Mock actions
-        default_pkg = {"pkg": 1}
-        default_org = {"org": 2}
+        default_pkg = {"id": "pkg_id", "name": "pkg_name"}
+        default_org = {"id": "org_id", "name": "org_name"}
         default_user = {"user": 3}
         test_data._initialize_basic_actions(
             actions, default_user, default_org, default_pkg
@@ -503,6 +429,30 @@ class ActionsTest(unittest.TestCase):
 
         self._test_show_datarequest_found(datarequest, org_checked, pkg_checked)
 
+    def test_show_datarequest_remembered_during_request(self):
+        datarequest = test_data._generate_basic_datarequest()
+        actions.db.DataRequest.get.return_value = [datarequest]
+        actions.db.DataRequestFollower.get.return_value = []
+        test_data._initialize_basic_actions(
+            actions, {"user": 3}, {"id": "org_id", "name": "org_name"}, None
+        )
+        data_dict = test_data.show_request_data
+
+        first = actions.show_datarequest(self.context, data_dict)
+        second = actions.show_datarequest(self.context, data_dict)
+
+        # Copies of the same data request are returned
+        self.assertEquals(first, second)
+        self.assertIsNot(first, second)
+        self.assertEquals(2, actions.tk.check_access.call_count)
+        actions.db.DataRequest.get.assert_called_once_with(id=data_dict["id"])
+
+        # Writes make it be read again
+        actions.follow_datarequest(self.context, data_dict)
+        actions.show_datarequest(self.context, data_dict)
+
+        self.assertEquals(2, actions.db.DataRequest.get.call_count)
+
     ######################################################################
     ############################### UPDATE ###############################
     ######################################################################
@@ -533,7 +483,7 @@ class ActionsTest(unittest.TestCase):
     @parameterized.expand(
         [
             (True,),
-            # Title checked does not depends on the organization and the dataset returned.
+            # Title changed does not depends on the organization and the dataset returned.
             # For this reason it is not necessary to execute the test with all the possible combinations
             (False,),
             (False, "org_id", None),
@@ -542,23 +492,22 @@ class ActionsTest(unittest.TestCase):
         ]
     )
     def test_update_datarequest(
-        self, title_checked, organization_id=None, accepted_dataset_id=None
+        self, title_changed, organization_id=None, accepted_dataset_id=None
     ):
         # Configure the mock
         datarequest = test_data._generate_basic_datarequest()
         datarequest.organization_id = organization_id
         datarequest.accepted_dataset_id = accepted_dataset_id
-        # Title should not be checked when it does not change
         datarequest.title = (
             test_data.create_request_data["title"] + "a"
-            if title_checked
+            if title_changed
             else test_data.create_request_data["title"]
         )
         actions.db.DataRequest.get.return_value = [datarequest]
 
         # Mock actions
-        default_pkg = {"pkg": 1}
-        default_org = {"org": 2}
+        default_pkg = {"id": "pkg_id", "name": "pkg_name"}
+        default_org = {"id": "org_id", "name": "org_name"}
         default_user = {"user": 3}
         test_data._initialize_basic_actions(
             actions, default_user, default_org, default_pkg
@@ -578,13 +527,16 @@ class ActionsTest(unittest.TestCase):
         actions.db.DataRequest.get.assert_called_once_with(
             id=test_data.update_request_data["id"]
         )
-        expected_context = self.context.copy()
-        expected_context["avoid_existing_title_check"] = not title_checked
         actions.validator.validate_datarequest.assert_called_once_with(
-            expected_context, test_data.update_request_data
+            self.context, test_data.update_request_data
         )
 
         self.context["session"].add.assert_called_once_with(datarequest)
+        actions.db.Change.add.assert_called_once_with(
+            test_data.update_request_data["id"],
+            "updated",
+            self.context["auth_user_obj"].id,
+        )
         self.context["session"].commit.assert_called_once()
 
         # Check the object stored in the database
@@ -603,6 +555,303 @@ class ActionsTest(unittest.TestCase):
         pkg = default_pkg if accepted_dataset_id else None
         self._check_basic_response(datarequest, result, default_user, org, pkg)
 
+    ######################################################################
+    ######################### BATCH DICTIZATION ##########################
+    ######################################################################
+
+    @patch("ckanext.datarequests.actions.model_dictize")
+    @patch("ckanext.datarequests.actions.model")
+    def test_get_users(self, model_mock, model_dictize_mock):
+        cached_user = {"id": "user_1"}
+        actions.USERS_CACHE.set("user_1", cached_user)
+        user_2 = MagicMock()
+        user_2.id = "user_2"
+        query = model_mock.Session.query.return_value.filter.return_value
+        query.__iter__.return_value = iter([user_2])
+
+        result = actions._get_users({"user_1", "user_2", "user_3"})
+
+        # Only the users that are not cached are retrieved, with one query
+        model_mock.User.id.in_.assert_called_once_with({"user_2", "user_3"})
+        model_dictize_mock.user_dictize.assert_called_once_with(
+            user_2,
+            {
+                "ignore_auth": True,
+                "model": model_mock,
+                "session": model_mock.Session,
+                "count_private_and_draft_datasets": False,
+            },
+        )
+        user_2_dict = model_dictize_mock.user_dictize.return_value
+        self.assertEquals({"user_1": cached_user, "user_2": user_2_dict}, result)
+        self.assertEquals(user_2_dict, actions.USERS_CACHE.get("user_2"))
+
+    @patch("ckanext.datarequests.actions.or_")
+    @patch("ckanext.datarequests.actions.model_dictize")
+    @patch("ckanext.datarequests.actions.model")
+    def test_get_organizations(self, model_mock, model_dictize_mock, or_mock):
+        group = MagicMock()
+        group.id = "org_id"
+        group.name = "org_name"
+        query = model_mock.Session.query.return_value.filter.return_value
+        query.__iter__.return_value = iter([group])
+
+        result = actions._get_organizations({"org_id", "missing"})
+
+        model_mock.Group.id.in_.assert_called_once_with({"org_id", "missing"})
+        model_mock.Group.name.in_.assert_called_once_with({"org_id", "missing"})
+        or_mock.assert_called_once_with(
+            model_mock.Group.id.in_.return_value,
+            model_mock.Group.name.in_.return_value,
+        )
+        model_dictize_mock.group_dictize.assert_called_once_with(
+            group,
+            {"ignore_auth": True, "model": model_mock, "session": model_mock.Session},
+            include_groups=False,
+            include_users=False,
+            packages_field=None,
+        )
+        organization = model_dictize_mock.group_dictize.return_value
+        self.assertEquals({"org_id": organization}, result)
+
+        # Found organizations are cached by ID and name and missing ones as None
+        self.assertEquals(organization, actions.ORGANIZATIONS_CACHE.get("org_name"))
+        self.assertIsNone(actions.ORGANIZATIONS_CACHE.get("missing", "not cached"))
+        self.assertEquals(
+            {"org_name": organization}, actions._get_organizations(["org_name"])
+        )
+        self.assertEquals({}, actions._get_organizations(["missing"]))
+        self.assertEquals(1, model_mock.Session.query.call_count)
+
+    @patch("ckanext.datarequests.actions.model")
+    def test_get_organizations_empty(self, model_mock):
+        self.assertEquals({}, actions._get_organizations(set()))
+        self.assertEquals(0, model_mock.Session.query.call_count)
+
+    def test_get_packages(self):
+        package = {"id": "pkg_id", "name": "pkg_name"}
+        package_search = actions.tk.get_action.return_value
+        package_search.return_value = {"results": [package]}
+
+        result = actions._get_packages(["pkg_name"])
+
+        actions.tk.get_action.assert_called_once_with("package_search")
+        package_search.assert_called_once_with(
+            {"ignore_auth": True},
+            {
+                "fq": '+(id:("pkg_name") OR name:("pkg_name"))',
+                "rows": 1,
+                "include_private": True,
+            },
+        )
+        self.assertEquals({"pkg_name": package}, result)
+        self.assertEquals(package, actions.PACKAGES_CACHE.get("pkg_id"))
+
+    def test_get_packages_not_returned_by_search(self):
+        deleted_package = {"id": "deleted_id", "name": "deleted_name"}
+        package_search = MagicMock(return_value={"results": []})
+
+        def package_show(context, data_dict):
+            if data_dict["id"] == "missing":
+                raise self._tk.ObjectNotFound()
+            return deleted_package
+
+        actions.tk.get_action.side_effect = lambda action: (
+            package_search if action == "package_search" else package_show
+        )
+
+        result = actions._get_packages(["deleted_id", "missing"])
+
+        # Deleted, draft and private datasets are shown one by one
+        self.assertEquals({"deleted_id": deleted_package}, result)
+        self.assertEquals(1, package_search.call_count)
+        self.assertEquals(deleted_package, actions.PACKAGES_CACHE.get("deleted_name"))
+        self.assertIsNone(actions.PACKAGES_CACHE.get("missing", "not cached"))
+
+    def test_get_packages_error_not_cached(self):
+        package_search = actions.tk.get_action.return_value
+        package_search.side_effect = Exception("Search index not available")
+
+        self.assertEquals({}, actions._get_packages(["pkg_id"]))
+        self.assertEquals({}, actions._get_packages(["pkg_id"]))
+
+        # Errors are not cached, so the search is repeated
+        self.assertEquals(2, package_search.call_count)
+
+    def test_get_packages_empty(self):
+        self.assertEquals({}, actions._get_packages(set()))
+        self.assertEquals(0, actions.tk.get_action.call_count)
+
+    def test_dictize_datarequests(self):
+        datarequests = test_data._generate_basic_ddbb_response(
+            3, organizations=["org_1", None, "org_1"]
+        )
+        datarequests[1].accepted_dataset_id = "pkg_1"
+        user = {"user": 1}
+        package = {"pkg": 1}
+        get_organizations = self._mock_batch_lookups(
+            user, test_data._organization_show, package
+        )
+
+        result = actions._dictize_datarequests(datarequests)
+
+        # One lookup per entity type for the whole list
+        actions._get_users.assert_called_once_with({datarequests[0].user_id})
+        get_organizations.assert_called_once_with({"org_1"})
+        actions._get_packages.assert_called_once_with({"pkg_1"})
+        self.assertEquals(0, actions.tk.get_action.call_count)
+
+        for datarequest, datarequest_dict in zip(datarequests, result):
+            self.assertEquals(datarequest.id, datarequest_dict["id"])
+            self.assertEquals(user, datarequest_dict["user"])
+
+        organization = test_data._organization_show(None, {"id": "org_1"})
+        self.assertEquals(organization, result[0]["organization"])
+        self.assertIsNone(result[1]["organization"])
+        self.assertIsNone(result[0]["accepted_dataset"])
+        self.assertEquals(package, result[1]["accepted_dataset"])
+
+    def test_get_organization(self):
+        organization = {"id": "org_id", "name": "org_name"}
+        organization_show = actions.tk.get_action.return_value
+        organization_show.return_value = organization
+
+        self.assertEquals(organization, actions._get_organization("org_name"))
+        self.assertEquals(organization, actions._get_organization("org_id"))
+
+        actions.tk.get_action.assert_called_once_with("organization_show")
+        organization_show.assert_called_once_with(
+            {"ignore_auth": True},
+            {
+                "id": "org_name",
+                "include_dataset_count": False,
+                "include_groups": False,
+                "include_users": False,
+                "include_followers": False,
+            },
+        )
+
+    def test_get_organization_not_found(self):
+        organization_show = actions.tk.get_action.return_value
+        organization_show.side_effect = self._tk.ObjectNotFound
+
+        self.assertIsNone(actions._get_organization("org_id"))
+        self.assertIsNone(actions._get_organization("org_id"))
+
+        # Missing organizations are not retrieved again
+        organization_show.assert_called_once()
+
+    def test_get_package(self):
+        package = {"id": "pkg_id", "name": "pkg_name"}
+        package_show = actions.tk.get_action.return_value
+        package_show.return_value = package
+
+        self.assertEquals(package, actions._get_package("pkg_id"))
+        self.assertEquals(package, actions._get_package("pkg_name"))
+
+        actions.tk.get_action.assert_called_once_with("package_show")
+        package_show.assert_called_once_with({"ignore_auth": True}, {"id": "pkg_id"})
+
+    def test_get_package_not_found(self):
+        package_show = actions.tk.get_action.return_value
+        package_show.side_effect = self._tk.ObjectNotFound
+
+        self.assertIsNone(actions._get_package("pkg_id"))
+        self.assertIsNone(actions._get_package("pkg_id"))
+
+        package_show.assert_called_once()
+
+    @patch("ckanext.datarequests.actions.model")
+    def test_get_open_datarequests_number(self, model_mock):
+        actions.OPEN_DATAREQUESTS_CACHE.clear()
+        actions.db.DataRequest.get_open_datarequests_number.return_value = 7
+
+        # The number is read once while it's cached
+        self.assertEquals(7, actions.get_open_datarequests_number())
+        self.assertEquals(7, actions.get_open_datarequests_number())
+
+        actions.db.init_db.assert_called_once_with(model_mock)
+        actions.db.DataRequest.get_open_datarequests_number.assert_called_once_with()
+
+    @patch("ckanext.datarequests.actions.model")
+    def test_get_organization_members(self, model_mock):
+        query = model_mock.Session.query.return_value.filter.return_value
+        query.__iter__.return_value = iter([("user_1",), ("user_2",)])
+
+        result = actions._get_organization_members("org_id")
+
+        self.assertEquals({"user_1", "user_2"}, result)
+        model_mock.Session.query.assert_called_once_with(model_mock.Member.table_id)
+
+    ######################################################################
+    ############################ USERS CACHE #############################
+    ######################################################################
+
+    def test_invalidate_cached_user_updated(self):
+        actions.USERS_CACHE.set("user_id", {"id": "user_id"})
+        actions.USERS_CACHE.set("other_id", {"id": "other_id"})
+
+        actions.invalidate_cached_user(
+            "user_update", data_dict={"id": "user_name"}, result={"id": "user_id"}
+        )
+
+        self.assertIsNone(actions.USERS_CACHE.get("user_id"))
+        self.assertEquals({"id": "other_id"}, actions.USERS_CACHE.get("other_id"))
+
+    @patch("ckanext.datarequests.actions.model")
+    def test_invalidate_cached_user_deleted(self, model_mock):
+        model_mock.User.get.return_value.id = "user_id"
+        actions.USERS_CACHE.set("user_id", {"id": "user_id"})
+
+        actions.invalidate_cached_user(
+            "user_delete", data_dict={"id": "user_name"}, result=None
+        )
+
+        model_mock.User.get.assert_called_once_with("user_name")
+        self.assertIsNone(actions.USERS_CACHE.get("user_id"))
+
+    def test_invalidate_cached_organization_updated(self):
+        for key in ("org_id", "old_name", "new_name", "other_id"):
+            actions.ORGANIZATIONS_CACHE.set(key, {"id": key})
+
+        actions.invalidate_cached_organization(
+            "organization_update",
+            data_dict={"id": "old_name"},
+            result={"id": "org_id", "name": "new_name"},
+        )
+
+        for key in ("org_id", "old_name", "new_name"):
+            self.assertIsNone(actions.ORGANIZATIONS_CACHE.get(key))
+        self.assertEquals(
+            {"id": "other_id"}, actions.ORGANIZATIONS_CACHE.get("other_id")
+        )
+
+    @patch("ckanext.datarequests.actions.model")
+    def test_invalidate_cached_organization_deleted(self, model_mock):
+        model_mock.Group.get.return_value.id = "org_id"
+        model_mock.Group.get.return_value.name = "org_name"
+        actions.ORGANIZATIONS_CACHE.set("org_id", {"id": "org_id"})
+        actions.ORGANIZATIONS_CACHE.set("org_name", {"id": "org_id"})
+
+        actions.invalidate_cached_organization(
+            "organization_delete", data_dict={"id": "org_name"}, result=None
+        )
+
+        model_mock.Group.get.assert_called_once_with("org_name")
+        self.assertIsNone(actions.ORGANIZATIONS_CACHE.get("org_id"))
+        self.assertIsNone(actions.ORGANIZATIONS_CACHE.get("org_name"))
+
+    def test_invalidate_cached_package(self):
+        package = MagicMock()
+        package.id = "pkg_id"
+        package.name = "pkg_name"
+        actions.PACKAGES_CACHE.set("pkg_id", None)
+        actions.PACKAGES_CACHE.set("pkg_name", None)
+
+        actions.invalidate_cached_package(package)
+
+        self.assertEquals(0, len(actions.PACKAGES_CACHE))
+
     ######################################################################
     ################################ LIST ################################
     ######################################################################
@@ -642,13 +891,22 @@ class ActionsTest(unittest.TestCase):
         _organization_show = test_case["organization_show_func"]
         _user_show = test_case.get("user_show_func", None)
 
-        # Set the mocks
-        actions.db.DataRequest.get_ordered_by_date.return_value = ddbb_response
-        actions.db.DataRequestFollower.get_datarequest_followers_number.return_value = (
-            test_data.DEFAULT_FOLLOWERS
+        offset = content.get("offset", 0)
+        limit = content.get("limit", constants.DATAREQUESTS_PER_PAGE)
+
+        # Set the mocks (the database returns only the requested page)
+        actions.db.DataRequest.get_ordered_by_date.return_value = ddbb_response[
+            offset : offset + limit
+        ]
+        facets = collections.Counter(
+            (data_req.organization_id, data_req.closed) for data_req in ddbb_response
         )
-        default_pkg = {"pkg": 1}
-        default_org = {"org": 2}
+        actions.db.DataRequest.get_facets.return_value = [
+            (organization_id, closed, count)
+            for (organization_id, closed), count in facets.items()
+        ]
+        default_pkg = {"id": "pkg_id", "name": "pkg_name"}
+        default_org = {"id": "org_id", "name": "org_name"}
         default_user = {"user": 3, "id": test_data.user_default_id}
         test_data._initialize_basic_actions(
             actions, default_user, default_org, default_pkg
@@ -659,6 +917,11 @@ class ActionsTest(unittest.TestCase):
         organization_show = actions.tk.get_action("organization_show")
         organization_show.side_effect = _organization_show
 
+        # Users, organizations and datasets are retrieved in batches
+        get_organizations = self._mock_batch_lookups(
+            default_user, _organization_show, default_pkg
+        )
+
         # Call the function
         response = actions.list_datarequests(self.context, content)
 
@@ -668,47 +931,39 @@ class ActionsTest(unittest.TestCase):
             constants.LIST_DATAREQUESTS, self.context, content
         )
         actions.db.DataRequest.get_ordered_by_date.assert_called_once_with(
-            **expected_ddbb_params
+            offset=offset, limit=limit, relevance=False, **expected_ddbb_params
         )
+        expected_filters = expected_ddbb_params.copy()
+        expected_filters.pop("desc")
+        actions.db.DataRequest.get_facets.assert_called_once_with(**expected_filters)
 
-        # Expected organizations_show  calls
-        expected_organization_show_calls = 0
-
-        # The initial one to get the real ID and not the name
+        # organization_show is only called to get the real ID and not the name
         if "organization_id" in content:
-            organization_show.assert_any_call(
+            organization_show.assert_called_once_with(
                 {"ignore_auth": True}, {"id": content["organization_id"]}
             )
-            expected_organization_show_calls += 1
-
-        # The reamining ones to include the display name into the facets
-        if "organization" in expected_response["facets"]:
-            expected_organization_show_calls += len(
-                expected_response["facets"]["organization"]["items"]
-            )
-            for organization_facet in expected_response["facets"]["organization"][
-                "items"
-            ]:
-                organization_show.assert_any_call(
-                    {"ignore_auth": True}, {"id": organization_facet["name"]}
-                )
-
-        # We have to substract the number of times that the function is called to parse
-        # the datarequest that will be returned
-        count = 0
-        datarequests = expected_response["result"]
-        for datarequest in datarequests:
-            if datarequest["organization_id"]:
-                count += 1
-            datarequest["user"] = default_user
-
-        # Assert that organization_show has been called the appropriate number of times
-        self.assertEquals(
-            organization_show.call_count - count, expected_organization_show_calls
-        )
+        else:
+            self.assertEquals(0, organization_show.call_count)
+
+        # One batch for the organizations of the page and another one for the
+        # organizations of the facet
+        page_organizations = {
+            data_req.organization_id
+            for data_req in ddbb_response[offset : offset + limit]
+            if data_req.organization_id
+        }
+        facet_organizations = {
+            data_req.organization_id
+            for data_req in ddbb_response
+            if data_req.organization_id
+        }
+        get_organizations.assert_any_call(page_organizations)
+        get_organizations.assert_any_call(facet_organizations)
+        self.assertEquals(2, get_organizations.call_count)
 
         # user, organization and accepted_dataset are None by default. The value of these fields
         # must be set based on the value returned by the defined actions
+        datarequests = expected_response["result"]
         for datarequest in datarequests:
             datarequest["user"] = default_user
             datarequest["accepted_dataset"] = None
@@ -737,6 +992,317 @@ class ActionsTest(unittest.TestCase):
             for item in items:
                 self.assertIn(item, response["facets"][facet]["items"])
 
+    def _test_list_datarequests_cursor(self, backwards, ddbb_response):
+        actions.datetime = self._datetime
+        test_data._initialize_basic_actions(actions, {}, {}, {})
+        self._mock_batch_lookups({}, test_data._organization_show, {})
+        limit = 3
+        cursor_datarequest = test_data._generate_basic_datarequest(id="cursor_id")
+        cursor = actions._encode_cursor(cursor_datarequest, backwards)
+
+        actions.db.DataRequest.get_ordered_by_date.return_value = list(ddbb_response)
+        actions.db.DataRequest.get_facets.return_value = [(None, False, 10)]
+
+        # Call the function
+        response = actions.list_datarequests(
+            self.context, {"cursor": cursor, "limit": limit, "sort": "desc"}
+        )
+
+        # Assertions
+        actions.db.DataRequest.get_ordered_by_date.assert_called_once_with(
+            desc=not backwards,
+            limit=limit + 1,
+            after=(cursor_datarequest.open_time, "cursor_id"),
+            organization_id=None,
+            user_id=None,
+            closed=None,
+            q=None,
+        )
+
+        return response
+
+    @parameterized.expand([(True,), (False,)])
+    def test_list_datarequests_next_cursor(self, more_pages):
+        ddbb_response = test_data._generate_basic_ddbb_response(4 if more_pages else 3)
+        response = self._test_list_datarequests_cursor(False, ddbb_response)
+
+        self.assertEquals(
+            [datarequest.id for datarequest in ddbb_response[:3]],
+            [datarequest["id"] for datarequest in response["result"]],
+        )
+        self.assertEquals(
+            actions._encode_cursor(ddbb_response[0], backwards=True),
+            response["previous_cursor"],
+        )
+        expected_next_cursor = (
+            actions._encode_cursor(ddbb_response[2]) if more_pages else None
+        )
+        self.assertEquals(expected_next_cursor, response["next_cursor"])
+
+    @parameterized.expand([(True,), (False,)])
+    def test_list_datarequests_previous_cursor(self, more_pages):
+        ddbb_response = [
+            test_data._generate_basic_datarequest(id=f"id_{n}") for n in range(4)
+        ]
+        ddbb_response = ddbb_response if more_pages else ddbb_response[:3]
+        response = self._test_list_datarequests_cursor(True, ddbb_response)
+
+        # Results are retrieved in the opposite order
+        self.assertEquals(
+            ["id_2", "id_1", "id_0"],
+            [datarequest["id"] for datarequest in response["result"]],
+        )
+        self.assertEquals(
+            actions._encode_cursor(ddbb_response[0]), response["next_cursor"]
+        )
+        expected_previous_cursor = (
+            actions._encode_cursor(ddbb_response[2], backwards=True)
+            if more_pages
+            else None
+        )
+        self.assertEquals(expected_previous_cursor, response["previous_cursor"])
+
+    def test_list_datarequests_invalid_cursor(self):
+        actions.datetime = self._datetime
+        with self.assertRaises(self._tk.ValidationError):
+            actions.list_datarequests(self.context, {"cursor": "invalid"})
+
+        self.assertEquals(0, actions.db.DataRequest.get_ordered_by_date.call_count)
+
+    def test_list_datarequests_cursor_limit_string(self):
+        actions.datetime = self._datetime
+        actions.db.DataRequest.get_ordered_by_date.return_value = []
+        actions.db.DataRequest.get_facets.return_value = []
+        cursor_datarequest = test_data._generate_basic_datarequest(id="cursor_id")
+        cursor = actions._encode_cursor(cursor_datarequest)
+
+        # Call the function
+        actions.list_datarequests(self.context, {"cursor": cursor, "limit": "3"})
+
+        # GET requests send the limit as a string
+        actions.db.DataRequest.get_ordered_by_date.assert_called_once_with(
+            desc=False,
+            limit=4,
+            after=(cursor_datarequest.open_time, "cursor_id"),
+            organization_id=None,
+            user_id=None,
+            closed=None,
+            q=None,
+        )
+
+    @parameterized.expand(
+        [
+            ({"offset": "5", "limit": "2"}, 5, 2),
+            ({"limit": 5000}, 0, constants.MAX_DATAREQUESTS_PER_PAGE),
+        ]
+    )
+    def test_list_datarequests_page_strings(
+        self, page, expected_offset, expected_limit
+    ):
+        actions.db.DataRequest.get_ordered_by_date.return_value = []
+        actions.db.DataRequest.get_facets.return_value = []
+
+        # Call the function
+        actions.list_datarequests(self.context, page)
+
+        # The limit cannot be too high
+        actions.db.DataRequest.get_ordered_by_date.assert_called_once_with(
+            desc=False,
+            offset=expected_offset,
+            limit=expected_limit,
+            relevance=False,
+            organization_id=None,
+            user_id=None,
+            closed=None,
+            q=None,
+        )
+
+    @parameterized.expand(
+        [
+            ({"offset": -1},),
+            ({"offset": "first"},),
+            ({"limit": "0"},),
+            ({"limit": None},),
+            ({"limit": "many", "cursor": "cursor"},),
+        ]
+    )
+    def test_list_datarequests_invalid_page(self, page):
+        with self.assertRaises(self._tk.ValidationError):
+            actions.list_datarequests(self.context, page)
+
+        self.assertEquals(0, actions.db.DataRequest.get_ordered_by_date.call_count)
+
+    @parameterized.expand(
+        [(0, 10, False, True), (4, 10, True, True), (4, 6, True, False)]
+    )
+    def test_list_datarequests_relevance(self, offset, count, has_previous, has_next):
+        test_data._initialize_basic_actions(actions, {}, {}, {})
+        self._mock_batch_lookups({}, test_data._organization_show, {})
+        limit = 2
+        ddbb_response = test_data._generate_basic_ddbb_response(limit)
+
+        actions.db.DataRequest.get_ordered_by_date.return_value = ddbb_response
+        actions.db.DataRequest.get_facets.return_value = [(None, False, count)]
+
+        # Call the function
+        content = {"q": "free-text", "sort": "relevance", "limit": limit}
+        if offset:
+            content["cursor"] = actions._encode_offset_cursor(offset)
+        response = actions.list_datarequests(self.context, content)
+
+        # Assertions
+        actions.db.DataRequest.get_ordered_by_date.assert_called_once_with(
+            desc=False,
+            offset=offset,
+            limit=limit,
+            relevance=True,
+            organization_id=None,
+            user_id=None,
+            closed=None,
+            q="free-text",
+        )
+        expected_next_cursor = (
+            actions._encode_offset_cursor(offset + limit) if has_next else None
+        )
+        expected_previous_cursor = (
+            actions._encode_offset_cursor(offset - limit) if has_previous else None
+        )
+        self.assertEquals(expected_next_cursor, response["next_cursor"])
+        self.assertEquals(expected_previous_cursor, response["previous_cursor"])
+
+    def test_list_datarequests_relevance_invalid_cursor(self):
+        # Cursors of the lists sorted by date cannot be used
+        cursor = actions._encode_cursor(test_data._generate_basic_datarequest())
+
+        with self.assertRaises(self._tk.ValidationError):
+            actions.list_datarequests(
+                self.context, {"q": "free-text", "sort": "relevance", "cursor": cursor}
+            )
+
+        self.assertEquals(0, actions.db.DataRequest.get_ordered_by_date.call_count)
+
+    def test_list_datarequests_count_only(self):
+        actions.db.DataRequest.get_datarequests_number.return_value = 7
+
+        response = actions.list_datarequests(
+            self.context, {"closed": True, "count_only": "true"}
+        )
+
+        self.assertEquals({"count": 7}, response)
+        actions.db.DataRequest.get_datarequests_number.assert_called_once_with(
+            organization_id=None, user_id=None, closed=True, q=None
+        )
+        self.assertEquals(0, actions.db.DataRequest.get_ordered_by_date.call_count)
+        self.assertEquals(0, actions.db.DataRequest.get_facets.call_count)
+
+    def test_list_datarequests_no_facets(self):
+        get_organizations = self._mock_batch_lookups(
+            {}, test_data._organization_show, {}
+        )
+        ddbb_response = test_data._generate_basic_ddbb_response(2)
+        actions.db.DataRequest.get_ordered_by_date.return_value = ddbb_response
+        actions.db.DataRequest.get_datarequests_number.return_value = 5
+
+        response = actions.list_datarequests(
+            self.context, {"facets": "false", "expand": "", "limit": 2}
+        )
+
+        self.assertEquals(5, response["count"])
+        self.assertEquals({}, response["facets"])
+        self.assertIsNotNone(response["next_cursor"])
+        self.assertEquals(0, actions.db.DataRequest.get_facets.call_count)
+        # Nothing is expanded, so nothing is looked up
+        self.assertEquals(0, actions._get_users.call_count)
+        self.assertEquals(0, get_organizations.call_count)
+        self.assertEquals(0, actions._get_packages.call_count)
+        self.assertNotIn("user", response["result"][0])
+
+    def test_list_datarequests_fields(self):
+        get_organizations = self._mock_batch_lookups(
+            {}, test_data._organization_show, {}
+        )
+        ddbb_response = test_data._generate_basic_ddbb_response(2)
+        actions.db.DataRequest.get_ordered_by_date.return_value = ddbb_response
+        actions.db.DataRequest.get_facets.return_value = []
+
+        response = actions.list_datarequests(
+            self.context, {"fields": ["id", "title", "user"]}
+        )
+
+        for datarequest, datarequest_dict in zip(ddbb_response, response["result"]):
+            self.assertEquals(
+                {"id": datarequest.id, "title": datarequest.title, "user": {}},
+                datarequest_dict,
+            )
+        actions._get_users.assert_called_once()
+        self.assertEquals(0, actions._get_packages.call_count)
+        # The organizations of the facet are still retrieved
+        get_organizations.assert_called_once_with(set())
+
+    @parameterized.expand(
+        [
+            ({"fields": "id,unknown"},),
+            ({"fields": ["id", "unknown"]},),
+            ({"expand": "user,title"},),
+        ]
+    )
+    def test_list_datarequests_invalid_fields(self, content):
+        with self.assertRaises(self._tk.ValidationError):
+            actions.list_datarequests(self.context, content)
+
+        self.assertEquals(0, actions.db.DataRequest.get_ordered_by_date.call_count)
+
+    ######################################################################
+    ############################# PROJECTION #############################
+    ######################################################################
+
+    @parameterized.expand(
+        [
+            ({}, None, ("user", "organization", "accepted_dataset")),
+            ({"expand": "organization"}, None, ("organization",)),
+            ({"expand": []}, None, ()),
+            ({"fields": "id, title"}, ["id", "title"], ()),
+            (
+                {"fields": "id,user,organization", "expand": "user,accepted_dataset"},
+                ["id", "user", "organization"],
+                ("user",),
+            ),
+        ]
+    )
+    def test_get_projection(self, data_dict, expected_fields, expected_expand):
+        fields, expand = actions._get_projection(data_dict)
+
+        self.assertEquals(expected_fields, fields)
+        self.assertEquals(expected_expand, expand)
+
+    def test_show_datarequest_fields(self):
+        datarequest = test_data._generate_basic_datarequest()
+        datarequest.organization_id = "org_id"
+        actions.db.DataRequest.get.return_value = [datarequest]
+
+        result = actions.show_datarequest(
+            self.context, {"id": datarequest.id, "fields": "id,organization_id"}
+        )
+
+        self.assertEquals({"id": datarequest.id, "organization_id": "org_id"}, result)
+        self.assertEquals(0, actions.tk.get_action.call_count)
+
+    def test_show_datarequest_expand(self):
+        datarequest = test_data._generate_basic_datarequest()
+        datarequest.organization_id = "org_id"
+        actions.db.DataRequest.get.return_value = [datarequest]
+        default_org = {"id": "org_id", "name": "org_name"}
+        test_data._initialize_basic_actions(actions, {}, default_org, {})
+
+        result = actions.show_datarequest(
+            self.context, {"id": datarequest.id, "expand": "organization"}
+        )
+
+        self.assertEquals(default_org, result["organization"])
+        self.assertNotIn("user", result)
+        self.assertNotIn("accepted_dataset", result)
+        actions.tk.get_action.assert_called_once_with("organization_show")
+
     ######################################################################
     ############################### DELETE ###############################
     ######################################################################
@@ -768,8 +1334,8 @@ class ActionsTest(unittest.TestCase):
         datarequest.accepted_dataset_id = accepted_dataset_id
         actions.db.DataRequest.get.return_value = [datarequest]
 
-        default_pkg = {"pkg": 1}
-        default_org = {"org": 2}
+        default_pkg = {"id": "pkg_id", "name": "pkg_name"}
+        default_org = {"id": "org_id", "name": "org_name"}
         default_user = {"user": 3}
         test_data._initialize_basic_actions(
             actions, default_user, default_org, default_pkg
@@ -785,7 +1351,11 @@ class ActionsTest(unittest.TestCase):
             constants.DELETE_DATAREQUEST, self.context, expected_data_dict
         )
         self.context["session"].delete.assert_called_once_with(datarequest)
+        actions.db.Change.add.assert_called_once_with(
+            expected_data_dict["id"], "deleted", self.context["auth_user_obj"].id
+        )
         self.context["session"].commit.assert_called_once_with()
+        self.assertEquals(0, len(actions.OPEN_DATAREQUESTS_CACHE))
 
         org = default_org if organization_id else None
         pkg = default_pkg if accepted_dataset_id else None
@@ -843,9 +1413,9 @@ class ActionsTest(unittest.TestCase):
         datarequest.accepted_dataset_id = None
         actions.db.DataRequest.get.return_value = [datarequest]
 
-        send_mail_patch = patch("ckanext.datarequests.actions._send_mail")
-        send_mail_mock = send_mail_patch.start()
-        self.addCleanup(send_mail_patch.stop)
+        notifications_patch = patch("ckanext.datarequests.actions.notifications")
+        notifications_mock = notifications_patch.start()
+        self.addCleanup(notifications_patch.stop)
 
         get_datarequest_involved_users_patch = patch(
             "ckanext.datarequests.actions._get_datarequest_involved_users"
@@ -856,8 +1426,8 @@ class ActionsTest(unittest.TestCase):
         self.addCleanup(get_datarequest_involved_users_patch.stop)
 
         # Mock actions
-        default_pkg = {"pkg": 1}
-        default_org = {"org": 2}
+        default_pkg = {"id": "pkg_id", "name": "pkg_name"}
+        default_org = {"id": "org_id", "name": "org_name"}
         default_user = {"user": 3}
         test_data._initialize_basic_actions(
             actions, default_user, default_org, default_pkg
@@ -873,7 +1443,11 @@ class ActionsTest(unittest.TestCase):
             constants.CLOSE_DATAREQUEST, self.context, expected_data_dict
         )
         self.context["session"].add.assert_called_once_with(datarequest)
+        actions.db.Change.add.assert_called_once_with(
+            expected_data_dict["id"], "closed", self.context["auth_user_obj"].id
+        )
         self.context["session"].commit.assert_called_once_with()
+        self.assertEquals(0, len(actions.OPEN_DATAREQUESTS_CACHE))
 
         # The data object returned by the database has been modified appropriately
         self.assertTrue(datarequest.closed)
@@ -889,11 +1463,13 @@ class ActionsTest(unittest.TestCase):
         pkg = default_pkg if expected_accepted_ds else None
         self._check_basic_response(datarequest, result, default_user, org, pkg)
 
-        send_mail_mock.assert_called_once_with(
+        notifications_mock.add_notification.assert_called_once_with(
+            self.context["session"],
             get_datarequest_involved_users_mock.return_value,
             "close_datarequest",
             result,
         )
+        notifications_mock.enqueue_notifications.assert_called_once_with()
         get_datarequest_involved_users_mock.assert_called_once_with(
             self.context, result
         )
@@ -942,9 +1518,9 @@ class ActionsTest(unittest.TestCase):
         self.assertEquals(0, self.context["session"].add.call_count)
         self.assertEquals(0, self.context["session"].commit.call_count)
 
-    @patch("ckanext.datarequests.actions._send_mail")
+    @patch("ckanext.datarequests.actions.notifications")
     @patch("ckanext.datarequests.actions._get_datarequest_involved_users")
-    def test_comment(self, get_datarequest_involved_users_mock, send_mail_mock):
+    def test_comment(self, get_datarequest_involved_users_mock, notifications_mock):
         # Configure the mocks
         current_time = self._datetime.datetime.utcnow()
         datarequest_dict = MagicMock()
@@ -973,6 +1549,22 @@ class ActionsTest(unittest.TestCase):
         actions.db.Comment.assert_called_once()
 
         self.context["session"].add.assert_called_once_with(comment)
+        actions.db.DataRequest.update_counters.assert_called_once_with(
+            test_data.comment_request_data["datarequest_id"], comments=1
+        )
+        actions.db.Participant.add.assert_called_once_with(
+            test_data.comment_request_data["datarequest_id"],
+            self.context["auth_user_obj"].id,
+            "commenter",
+        )
+        # The comment is flushed to log its ID
+        self.context["session"].flush.assert_called_once_with()
+        actions.db.Change.add.assert_called_once_with(
+            test_data.comment_request_data["datarequest_id"],
+            "commented",
+            self.context["auth_user_obj"].id,
+            comment.id,
+        )
         self.context["session"].commit.assert_called_once()
 
         # Check the object stored in the database
@@ -986,11 +1578,13 @@ class ActionsTest(unittest.TestCase):
         # Check that the response is OK
         self._check_comment(comment, result, default_user)
 
-        send_mail_mock.assert_called_once_with(
+        notifications_mock.add_notification.assert_called_once_with(
+            self.context["session"],
             get_datarequest_involved_users_mock.return_value,
             "new_comment",
             datarequest_dict,
         )
+        notifications_mock.enqueue_notifications.assert_called_once_with()
         get_datarequest_involved_users_mock.assert_called_once_with(
             self.context, datarequest_dict
         )
@@ -1059,6 +1653,7 @@ class ActionsTest(unittest.TestCase):
         # User
         default_user = {"user": "value"}
         test_data._initialize_basic_actions(actions, default_user, None, None)
+        self._mock_batch_lookups(default_user, None, None)
 
         # Call the function
         params = test_data.comment_show_request_data.copy()
@@ -1076,9 +1671,167 @@ class ActionsTest(unittest.TestCase):
         )
 
         # Check that the response is OK
+        self.assertEquals(len(comments), len(results))
         for i in range(0, len(results)):
             self._check_comment(comments[i], results[i], default_user)
 
+    @parameterized.expand(
+        [(0, 10, False, True), (4, 10, True, True), (4, 6, True, False)]
+    )
+    def test_comment_list_page(self, offset, count, has_previous, has_next):
+        comments = [test_data._generate_basic_comment(id=f"id_{n}") for n in range(2)]
+        actions.db.Comment.get_ordered_by_date.return_value = comments
+        actions.db.Comment.get_comment_datarequests_number.return_value = count
+
+        default_user = {"user": "value"}
+        self._mock_batch_lookups(default_user, None, None)
+        datarequest_id = test_data.comment_show_request_data["datarequest_id"]
+
+        # Call the function
+        response = actions.list_datarequest_comments(
+            self.context,
+            {"datarequest_id": datarequest_id, "offset": offset, "limit": 2},
+        )
+
+        # Only the page is retrieved from the database
+        actions.db.Comment.get_ordered_by_date.assert_called_once_with(
+            datarequest_id=datarequest_id, desc=False, offset=offset, limit=2
+        )
+        actions.db.Comment.get_comment_datarequests_number.assert_called_once_with(
+            datarequest_id=datarequest_id
+        )
+
+        self.assertEquals(count, response["count"])
+        self.assertEquals(len(comments), len(response["result"]))
+        for comment, result in zip(comments, response["result"]):
+            self._check_comment(comment, result, default_user)
+
+        expected_previous_cursor = (
+            actions._encode_comment_cursor(comments[0], backwards=True)
+            if has_previous
+            else None
+        )
+        expected_next_cursor = (
+            actions._encode_comment_cursor(comments[1]) if has_next else None
+        )
+        self.assertEquals(expected_previous_cursor, response["previous_cursor"])
+        self.assertEquals(expected_next_cursor, response["next_cursor"])
+
+    @parameterized.expand([(False, True), (False, False), (True, True), (True, False)])
+    def test_comment_list_cursor(self, backwards, more_pages):
+        actions.datetime = self._datetime
+        limit = 3
+        comments = [test_data._generate_basic_comment(id=f"id_{n}") for n in range(4)]
+        comments = comments if more_pages else comments[:limit]
+        actions.db.Comment.get_ordered_by_date.return_value = list(comments)
+        actions.db.Comment.get_comment_datarequests_number.return_value = 10
+        self._mock_batch_lookups({"user": "value"}, None, None)
+
+        cursor_comment = test_data._generate_basic_comment(id="cursor_id")
+        cursor = actions._encode_comment_cursor(cursor_comment, backwards)
+        datarequest_id = test_data.comment_show_request_data["datarequest_id"]
+
+        # Call the function
+        response = actions.list_datarequest_comments(
+            self.context,
+            {
+                "datarequest_id": datarequest_id,
+                "cursor": cursor,
+                "limit": limit,
+                "sort": "desc",
+            },
+        )
+
+        # Previous pages are retrieved in the opposite order
+        actions.db.Comment.get_ordered_by_date.assert_called_once_with(
+            datarequest_id=datarequest_id,
+            desc=not backwards,
+            limit=limit + 1,
+            after=(cursor_comment.time, "cursor_id"),
+        )
+
+        if backwards:
+            self.assertEquals(
+                ["id_2", "id_1", "id_0"],
+                [comment["id"] for comment in response["result"]],
+            )
+            self.assertEquals(
+                actions._encode_comment_cursor(comments[0]), response["next_cursor"]
+            )
+            expected_previous_cursor = (
+                actions._encode_comment_cursor(comments[2], backwards=True)
+                if more_pages
+                else None
+            )
+            self.assertEquals(expected_previous_cursor, response["previous_cursor"])
+        else:
+            self.assertEquals(
+                ["id_0", "id_1", "id_2"],
+                [comment["id"] for comment in response["result"]],
+            )
+            self.assertEquals(
+                actions._encode_comment_cursor(comments[0], backwards=True),
+                response["previous_cursor"],
+            )
+            expected_next_cursor = (
+                actions._encode_comment_cursor(comments[2]) if more_pages else None
+            )
+            self.assertEquals(expected_next_cursor, response["next_cursor"])
+
+    def test_comment_list_invalid_cursor(self):
+        actions.datetime = self._datetime
+        with self.assertRaises(self._tk.ValidationError):
+            actions.list_datarequest_comments(
+                self.context, {"datarequest_id": "example_dr_id", "cursor": "invalid"}
+            )
+
+        self.assertEquals(0, actions.db.Comment.get_ordered_by_date.call_count)
+
+    @parameterized.expand(
+        [
+            ("4", "2", 4, 2),
+            (4, "5000", 4, constants.MAX_COMMENTS_PER_PAGE),
+        ]
+    )
+    def test_comment_list_page_strings(
+        self, offset, limit, expected_offset, expected_limit
+    ):
+        actions.db.Comment.get_ordered_by_date.return_value = []
+        actions.db.Comment.get_comment_datarequests_number.return_value = 0
+        datarequest_id = test_data.comment_show_request_data["datarequest_id"]
+
+        # Call the function
+        actions.list_datarequest_comments(
+            self.context,
+            {"datarequest_id": datarequest_id, "offset": offset, "limit": limit},
+        )
+
+        # GET requests send the offset and the limit as strings and the limit
+        # cannot be too high
+        actions.db.Comment.get_ordered_by_date.assert_called_once_with(
+            datarequest_id=datarequest_id,
+            desc=False,
+            offset=expected_offset,
+            limit=expected_limit,
+        )
+
+    @parameterized.expand(
+        [
+            ({"offset": "-1"},),
+            ({"offset": "first"},),
+            ({"limit": 0},),
+            ({"limit": "many"},),
+            ({"limit": "many", "cursor": "cursor"},),
+        ]
+    )
+    def test_comment_list_invalid_page(self, page):
+        with self.assertRaises(self._tk.ValidationError):
+            actions.list_datarequest_comments(
+                self.context, dict(page, datarequest_id="example_dr_id")
+            )
+
+        self.assertEquals(0, actions.db.Comment.get_ordered_by_date.call_count)
+
     ######################################################################
     ########################### UPDATE COMMENT ###########################
     ######################################################################
@@ -1143,6 +1896,12 @@ class ActionsTest(unittest.TestCase):
         )
 
         self.context["session"].add.assert_called_once_with(comment)
+        actions.db.Change.add.assert_called_once_with(
+            comment.datarequest_id,
+            "comment_updated",
+            self.context["auth_user_obj"].id,
+            comment.id,
+        )
         self.context["session"].commit.assert_called_once()
 
         # Check the object stored in the database
@@ -1201,6 +1960,19 @@ class ActionsTest(unittest.TestCase):
             constants.DELETE_DATAREQUEST_COMMENT, self.context, expected_data_dict
         )
         self.context["session"].delete.assert_called_once_with(comment)
+        actions.db.DataRequest.update_counters.assert_called_once_with(
+            comment.datarequest_id, comments=-1
+        )
+        self.context["session"].flush.assert_called_once_with()
+        actions.db.Participant.remove_commenter.assert_called_once_with(
+            comment.datarequest_id, comment.user_id
+        )
+        actions.db.Change.add.assert_called_once_with(
+            comment.datarequest_id,
+            "comment_deleted",
+            self.context["auth_user_obj"].id,
+            comment.id,
+        )
         self.context["session"].commit.assert_called_once_with()
 
         self._check_comment(comment, result, default_user)
@@ -1261,6 +2033,19 @@ class ActionsTest(unittest.TestCase):
         actions.db.DataRequestFollower.assert_called_once()
 
         self.context["session"].add.assert_called_once_with(follower)
+        actions.db.DataRequest.update_counters.assert_called_once_with(
+            test_data.follow_data_request_data["id"], followers=1
+        )
+        actions.db.Participant.add.assert_called_once_with(
+            test_data.follow_data_request_data["id"],
+            self.context["auth_user_obj"].id,
+            "follower",
+        )
+        actions.db.Change.add.assert_called_once_with(
+            test_data.follow_data_request_data["id"],
+            "followed",
+            self.context["auth_user_obj"].id,
+        )
         self.context["session"].commit.assert_called_once()
 
         # Check the object stored in the database
@@ -1272,6 +2057,27 @@ class ActionsTest(unittest.TestCase):
 
         self.assertTrue(result)
 
+    @parameterized.expand([(True,), (False,)])
+    def test_follow_integrity_error(self, already_following):
+        # Another request has stored the follower after the check
+        actions.db.DataRequestFollower.get.return_value = []
+        error = actions.IntegrityError("INSERT", {}, Exception())
+        self.context["session"].flush.side_effect = error
+        actions.db.is_already_following_error.return_value = already_following
+
+        expected_exception = (
+            self._tk.ValidationError if already_following else actions.IntegrityError
+        )
+        with self.assertRaises(expected_exception):
+            actions.follow_datarequest(self.context, test_data.follow_data_request_data)
+
+        # Assertions
+        self.context["session"].rollback.assert_called_once_with()
+        actions.db.is_already_following_error.assert_called_once_with(error)
+        self.assertEquals(0, actions.db.DataRequest.update_counters.call_count)
+        self.assertEquals(0, actions.db.Change.add.call_count)
+        self.assertEquals(0, self.context["session"].commit.call_count)
+
     ######################################################################
     ######################## UNFOLLOW DATAREQUEST ########################
     ######################################################################
@@ -1318,6 +2124,188 @@ class ActionsTest(unittest.TestCase):
         )
 
         self.context["session"].delete.assert_called_once_with(follower)
+        actions.db.DataRequest.update_counters.assert_called_once_with(
+            test_data.follow_data_request_data["id"], followers=-1
+        )
+        actions.db.Participant.remove.assert_called_once_with(
+            test_data.follow_data_request_data["id"],
+            self.context["auth_user_obj"].id,
+            "follower",
+        )
+        actions.db.Change.add.assert_called_once_with(
+            test_data.follow_data_request_data["id"],
+            "unfollowed",
+            self.context["auth_user_obj"].id,
+        )
         self.context["session"].commit.assert_called_once()
 
         self.assertTrue(result)
+
+    ######################################################################
+    ######################### DATAREQUEST CHANGES ########################
+    ######################################################################
+
+    def _generate_changes(self, ids):
+        changes = []
+        for change_id in ids:
+            change = MagicMock()
+            change.id = change_id
+            change.datarequest_id = "example_dr_id"
+            change.change_type = "commented"
+            change.user_id = "example_uuidv4_user"
+            change.object_id = f"comment_{change_id}"
+            change.time = self._datetime.datetime(2016, 1, 1, 0, 0, change_id)
+            changes.append(change)
+
+        return changes
+
+    def _mock_now(self):
+        now = self._datetime.datetime(2016, 1, 1, 0, 1, 0)
+        actions.datetime.datetime.utcnow.return_value = now
+        actions.datetime.timedelta = self._datetime.timedelta
+
+        # Changes logged in the last seconds are not returned
+        return now - self._datetime.timedelta(seconds=constants.CHANGES_SAFETY_LAG)
+
+    def test_datarequest_changes_not_authorized(self):
+        self._test_not_authorized(
+            actions.datarequest_changes, constants.DATAREQUEST_CHANGES, {}
+        )
+        self.assertEquals(0, actions.db.Change.get_after.call_count)
+
+    @parameterized.expand([(3, False), (4, True)])
+    def test_datarequest_changes(self, returned, has_more):
+        before = self._mock_now()
+        actions.db.Change.get_after.return_value = self._generate_changes(
+            range(1, returned + 1)
+        )
+
+        # Call the function
+        result = actions.datarequest_changes(self.context, {"limit": 3})
+
+        # Assertions
+        actions.db.init_db.assert_called_once_with(self.context["model"])
+        actions.tk.check_access.assert_called_once_with(
+            constants.DATAREQUEST_CHANGES, self.context, {"limit": 3}
+        )
+        actions.db.Change.get_after.assert_called_once_with(
+            change_id=0, since=None, before=before, limit=4
+        )
+        actions.db.Change.get_last_id.assert_called_once_with(before=before)
+        self.assertEquals([1, 2, 3], [change["id"] for change in result["result"]])
+        self.assertEquals(
+            {
+                "id": 1,
+                "datarequest_id": "example_dr_id",
+                "change_type": "commented",
+                "user_id": "example_uuidv4_user",
+                "object_id": "comment_1",
+                "time": "2016-01-01 00:00:01",
+            },
+            result["result"][0],
+        )
+        self.assertEquals(actions._encode_change_cursor(3), result["next_cursor"])
+        self.assertEquals(has_more, result["has_more"])
+
+    def test_datarequest_changes_cursor(self):
+        before = self._mock_now()
+        actions.db.Change.get_after.return_value = self._generate_changes([8, 9])
+
+        # Call the function
+        result = actions.datarequest_changes(
+            self.context, {"cursor": actions._encode_change_cursor(7)}
+        )
+
+        # Only the changes logged after the cursor are retrieved
+        actions.db.Change.get_after.assert_called_once_with(
+            change_id=7,
+            since=None,
+            before=before,
+            limit=constants.CHANGES_PER_PAGE + 1,
+        )
+        self.assertEquals(0, actions.db.Change.get_last_id.call_count)
+        self.assertEquals([8, 9], [change["id"] for change in result["result"]])
+        self.assertEquals(actions._encode_change_cursor(9), result["next_cursor"])
+        self.assertFalse(result["has_more"])
+
+    @parameterized.expand([(None, 12), (5, 5)])
+    def test_datarequest_changes_empty(self, cursor_id, expected_cursor_id):
+        self._mock_now()
+        actions.db.Change.get_after.return_value = []
+        actions.db.Change.get_last_id.return_value = 12
+        data_dict = {}
+        if cursor_id is not None:
+            data_dict["cursor"] = actions._encode_change_cursor(cursor_id)
+
+        # Call the function
+        result = actions.datarequest_changes(self.context, data_dict)
+
+        # The next changes are the ones logged after the cursor or, when it's
+        # not included, the ones logged after the last change
+        self.assertEquals([], result["result"])
+        self.assertEquals(
+            actions._encode_change_cursor(expected_cursor_id), result["next_cursor"]
+        )
+        self.assertFalse(result["has_more"])
+
+    @parameterized.expand(
+        [
+            ("2016-01-01T10:00:00", (2016, 1, 1, 10, 0, 0)),
+            ("2016-01-01 10:00:00.500000", (2016, 1, 1, 10, 0, 0, 500000)),
+            ("2016-01-01T12:00:00+02:00", (2016, 1, 1, 10, 0, 0)),
+            ("2016-01-01T10:00:00Z", (2016, 1, 1, 10, 0, 0)),
+        ]
+    )
+    def test_datarequest_changes_since(self, since, expected_since):
+        actions.datetime = self._datetime
+        actions.db.Change.get_after.return_value = []
+        actions.db.Change.get_last_id.return_value = 0
+
+        # Call the function
+        actions.datarequest_changes(self.context, {"since": since})
+
+        # Times are compared in UTC
+        self.assertEquals(
+            self._datetime.datetime(*expected_since),
+            actions.db.Change.get_after.call_args[1]["since"],
+        )
+
+    @parameterized.expand(
+        [
+            ("50", 50),
+            (50, 50),
+            ("5000", constants.MAX_CHANGES_PER_PAGE),
+        ]
+    )
+    def test_datarequest_changes_limit(self, limit, expected_limit):
+        before = self._mock_now()
+        actions.db.Change.get_after.return_value = []
+        actions.db.Change.get_last_id.return_value = 0
+
+        # Call the function
+        actions.datarequest_changes(self.context, {"limit": limit})
+
+        # GET requests send the limit as a string and it cannot be too high
+        actions.db.Change.get_after.assert_called_once_with(
+            change_id=0, since=None, before=before, limit=expected_limit + 1
+        )
+
+    @parameterized.expand(
+        [
+            ({"since": "yesterday"},),
+            ({"limit": "many"},),
+            ({"limit": None},),
+            ({"limit": 0},),
+            ({"limit": "-1"},),
+            ({"cursor": "invalid"},),
+            ({"cursor": actions._dump_cursor({"change": -1})},),
+            ({"cursor": actions._dump_cursor({"offset": 1})},),
+        ]
+    )
+    def test_datarequest_changes_invalid(self, data_dict):
+        actions.datetime = self._datetime
+
+        with self.assertRaises(self._tk.ValidationError):
+            actions.datarequest_changes(self.context, data_dict)
+
+        self.assertEquals(0, actions.db.Change.get_after.call_count)
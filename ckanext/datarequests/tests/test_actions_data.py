@@ -24,6 +24,7 @@ COMMENT_ID = "comment_uuid4"
 DATAREQUEST_ID = "example_uuidv4"
 FREE_TEXT = "free-text"
 DEFAULT_FOLLOWERS = 3
+DEFAULT_COMMENTS = 5
 
 ######################################################################
 ############################## FUNCTIONS #############################
@@ -44,6 +45,7 @@ def dictice_ddbb_response(datarequest):
         else datarequest.close_time,
         "closed": datarequest.closed,
         "followers": DEFAULT_FOLLOWERS,
+        "comments": DEFAULT_COMMENTS,
     }
 
 
@@ -106,6 +108,8 @@ def _generate_basic_datarequest(
     datarequest.close_time = None
     datarequest.accepted_dataset_id = None
     datarequest.accepted_dataset = {"test": "test1", "test2": "test3"}
+    datarequest.follower_count = DEFAULT_FOLLOWERS
+    datarequest.comment_count = DEFAULT_COMMENTS
 
     return datarequest
 
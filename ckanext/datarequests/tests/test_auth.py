@@ -18,11 +18,10 @@
 
 import unittest
 
-from mock import MagicMock
+from mock import MagicMock, patch
 from nose_parameterized import parameterized
 
 import ckanext.datarequests.auth as auth
-import ckanext.datarequests.constants as constants
 
 # Needed for the test
 context = {
@@ -92,6 +91,9 @@ class AuthTest(unittest.TestCase):
             (auth.unfollow_datarequest, context, None),
             (auth.unfollow_datarequest, None, request_follow),
             (auth.unfollow_datarequest, context, request_follow),
+            # Changes
+            (auth.datarequest_changes, None, None),
+            (auth.datarequest_changes, context, None),
         ]
     )
     def test_everyone_can_create_show_and_index(self, function, context, request_data):
@@ -99,200 +101,72 @@ class AuthTest(unittest.TestCase):
 
     @parameterized.expand(
         [
-            # Data Requests
-            (
-                auth.update_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                True,
-                True,
-            ),
-            (
-                auth.update_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                False,
-                True,
-            ),
-            (
-                auth.update_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                True,
-                False,
-            ),
-            (
-                auth.update_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                False,
-                False,
-            ),
-            (
-                auth.delete_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                True,
-                True,
-            ),
-            (
-                auth.delete_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                False,
-                True,
-            ),
-            (
-                auth.delete_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                True,
-                False,
-            ),
-            (
-                auth.delete_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                False,
-                False,
-            ),
-            (
-                auth.close_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                True,
-                True,
-            ),
-            (
-                auth.close_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                False,
-                True,
-            ),
-            (
-                auth.close_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                True,
-                False,
-            ),
-            (
-                auth.close_datarequest,
-                constants.SHOW_DATAREQUEST,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                False,
-                False,
-            ),
-            # Comments
-            (
-                auth.update_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                True,
-                True,
-            ),
-            (
-                auth.update_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                False,
-                True,
-            ),
-            (
-                auth.update_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                True,
-                False,
-            ),
-            (
-                auth.update_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                False,
-                False,
-            ),
-            (
-                auth.delete_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                True,
-                True,
-            ),
-            (
-                auth.delete_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "user_id"},
-                False,
-                True,
-            ),
-            (
-                auth.delete_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                True,
-                False,
-            ),
-            (
-                auth.delete_datarequest_comment,
-                constants.SHOW_DATAREQUEST_COMMENT,
-                "user_id",
-                {"id": "id", "user_id": "other_user_id"},
-                False,
-                False,
-            ),
+            (function, entity, owner_id, expected_result)
+            for function, entity in [
+                # Data Requests
+                (auth.update_datarequest, "DataRequest"),
+                (auth.delete_datarequest, "DataRequest"),
+                (auth.close_datarequest, "DataRequest"),
+                # Comments
+                (auth.update_datarequest_comment, "Comment"),
+                (auth.delete_datarequest_comment, "Comment"),
+            ]
+            for owner_id, expected_result in [
+                ("user_id", True),
+                ("other_user_id", False),
+            ]
         ]
     )
+    @patch("ckanext.datarequests.auth.db")
     def test_update_delete_datarequest(
-        self,
-        function,
-        show_function,
-        user_id,
-        request_data,
-        action_called,
-        expected_result,
+        self, function, entity, owner_id, expected_result, db_mock
     ):
-
         user_obj = MagicMock()
-        user_obj.id = user_id
+        user_obj.id = "user_id"
+        get_owner_id = getattr(db_mock, entity).get_owner_id
+        get_owner_id.return_value = owner_id
 
         context = {"auth_user_obj": user_obj}
+        # The user_id included in the request is not taken into account
+        request_data = {"id": "id", "user_id": "user_id"}
 
-        if action_called:
-            initial_request_data = {"id": request_data["id"]}
-            xyz_show = auth.tk.get_action.return_value
-            xyz_show.return_value = request_data
-        else:
-            initial_request_data = request_data
+        result = function(context, request_data).get("success")
 
-        result = function(context, initial_request_data).get("success")
         self.assertEquals(expected_result, result)
+        get_owner_id.assert_called_once_with("id")
+
+    @parameterized.expand(
+        [
+            (auth.update_datarequest, "DataRequest"),
+            (auth.delete_datarequest, "DataRequest"),
+            (auth.close_datarequest, "DataRequest"),
+            (auth.update_datarequest_comment, "Comment"),
+            (auth.delete_datarequest_comment, "Comment"),
+        ]
+    )
+    @patch("ckanext.datarequests.auth.db")
+    def test_update_delete_not_found(self, function, entity, db_mock):
+        auth.tk.ObjectNotFound = self._tk.ObjectNotFound
+        getattr(db_mock, entity).get_owner_id.return_value = None
+        user_obj = MagicMock()
+        user_obj.id = "user_id"
+
+        # The data request or the comment does not exist
+        with self.assertRaises(self._tk.ObjectNotFound):
+            function({"auth_user_obj": user_obj}, {"id": "id"})
+
+    @patch("ckanext.datarequests.auth.db")
+    def test_owner_remembered_during_request(self, db_mock):
+        db_mock.DataRequest.get_owner_id.return_value = "user_id"
+        user_obj = MagicMock()
+        user_obj.id = "user_id"
+        context = {"auth_user_obj": user_obj}
+
+        self.assertTrue(auth.update_datarequest(context, {"id": "id"})["success"])
+        self.assertTrue(auth.close_datarequest(context, {"id": "id"})["success"])
 
-        if action_called:
-            auth.tk.get_action.assert_called_once_with(show_function)
-            xyz_show = auth.tk.get_action.return_value
-            xyz_show.assert_called_once_with(
-                {"ignore_auth": True}, {"id": request_data["id"]}
-            )
-        else:
-            self.assertEquals(0, auth.tk.get_action.call_count)
+        db_mock.DataRequest.get_owner_id.assert_called_once_with("id")
+        self.assertEquals(
+            {("DataRequest", "id"): {"owner_id": "user_id"}},
+            context["datarequests_cache"],
+        )
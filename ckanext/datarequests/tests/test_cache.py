@@ -0,0 +1,172 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import unittest
+
+import flask
+from mock import patch
+
+import ckanext.datarequests.cache as cache
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.time_patch = patch("ckanext.datarequests.cache.time")
+        self.time_mock = self.time_patch.start()
+        self.time_mock.monotonic.side_effect = lambda: self.now
+
+        self.cache = cache.LRUCache(max_size=2, ttl=10)
+
+    def tearDown(self):
+        self.time_patch.stop()
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEquals("default", self.cache.get("key", "default"))
+
+    def test_set_get(self):
+        self.cache.set("key", "value")
+        self.assertEquals("value", self.cache.get("key"))
+
+    def test_expired(self):
+        self.cache.set("key", "value")
+        self.now += 10
+
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEquals(0, len(self.cache))
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set("key_1", "value_1")
+        self.cache.set("key_2", "value_2")
+        # key_1 is used, so key_2 becomes the least recently used entry
+        self.cache.get("key_1")
+        self.cache.set("key_3", "value_3")
+
+        self.assertEquals("value_1", self.cache.get("key_1"))
+        self.assertIsNone(self.cache.get("key_2"))
+        self.assertEquals("value_3", self.cache.get("key_3"))
+        self.assertEquals(1, self.cache.stats()["evictions"])
+
+    def test_invalidate(self):
+        self.cache.set("key_1", "value_1")
+        self.cache.set("key_2", "value_2")
+
+        self.cache.invalidate("key_1")
+        self.cache.invalidate("missing")
+
+        self.assertIsNone(self.cache.get("key_1"))
+        self.assertEquals("value_2", self.cache.get("key_2"))
+
+    def test_clear(self):
+        self.cache.set("key", "value")
+        self.cache.clear()
+        self.assertEquals(0, len(self.cache))
+
+    def test_stats(self):
+        self.cache.set("key", "value")
+        self.cache.get("key")
+        self.cache.get("key")
+        self.cache.get("missing")
+
+        self.assertEquals(
+            {
+                "size": 1,
+                "max_size": 2,
+                "ttl": 10,
+                "hits": 2,
+                "misses": 1,
+                "evictions": 0,
+            },
+            self.cache.stats(),
+        )
+
+    def test_configure(self):
+        self.cache.set("key", "value")
+        self.cache.get("key")
+
+        self.cache.configure(5, 20)
+
+        self.assertEquals(0, len(self.cache))
+        stats = self.cache.stats()
+        self.assertEquals((5, 20, 0), (stats["max_size"], stats["ttl"], stats["hits"]))
+
+    def test_configure_invalid_size(self):
+        with self.assertRaises(ValueError):
+            self.cache.configure(0, 10)
+
+    def test_threads(self):
+        lru = cache.LRUCache(max_size=50, ttl=10)
+
+        def worker(thread):
+            for i in range(200):
+                lru.set((thread, i), i)
+                lru.get((thread, i - 1))
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = lru.stats()
+        self.assertEquals(50, stats["size"])
+        self.assertEquals(8 * 200 - 50, stats["evictions"])
+        self.assertEquals(8 * 200, stats["hits"] + stats["misses"])
+
+
+class RequestCacheTest(unittest.TestCase):
+    def test_no_request_no_context(self):
+        cache.get_request_entry(None, "DataRequest", "id")["key"] = "value"
+        self.assertEquals({}, cache.get_request_entry(None, "DataRequest", "id"))
+
+    def test_context(self):
+        context = {}
+        cache.get_request_entry(context, "DataRequest", "id")["key"] = "value"
+
+        self.assertEquals(
+            {"key": "value"}, cache.get_request_entry(context, "DataRequest", "id")
+        )
+        self.assertEquals({}, cache.get_request_entry(context, "Comment", "id"))
+        self.assertEquals({}, cache.get_request_entry({}, "DataRequest", "id"))
+
+    def test_request(self):
+        app = flask.Flask(__name__)
+
+        with app.test_request_context():
+            # Values are shared by all the callers of the same request
+            cache.get_request_entry({}, "DataRequest", "id")["key"] = "value"
+            self.assertEquals(
+                {"key": "value"}, cache.get_request_entry(None, "DataRequest", "id")
+            )
+
+        with app.test_request_context():
+            self.assertEquals({}, cache.get_request_entry(None, "DataRequest", "id"))
+
+    def test_invalidate(self):
+        context = {}
+        cache.get_request_entry(context, "DataRequest", "id")["key"] = "value"
+        cache.get_request_entry(context, "DataRequest", "other")["key"] = "value"
+
+        cache.invalidate_request_entry(context, "DataRequest", "id")
+        cache.invalidate_request_entry(context, "DataRequest", "missing")
+
+        self.assertEquals({}, cache.get_request_entry(context, "DataRequest", "id"))
+        self.assertEquals(
+            {"key": "value"}, cache.get_request_entry(context, "DataRequest", "other")
+        )
@@ -15,9 +15,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
 import unittest
 
-from mock import MagicMock
+from mock import MagicMock, call, patch
 from nose_parameterized import parameterized
 
 import ckanext.datarequests.db as db
@@ -33,6 +34,10 @@ class DBTest(unittest.TestCase):
         db.DataRequest = None
         db.Comment = None
         db.DataRequestFollower = None
+        db.Notification = None
+        db.Participant = None
+        db.Change = None
+        db.search_backend = None
 
         # Create mocks
         self._sa = db.sa
@@ -48,6 +53,10 @@ class DBTest(unittest.TestCase):
         db.Comment = None
         db.DataRequest = None
         db.DataRequestFollower = None
+        db.Notification = None
+        db.Participant = None
+        db.Change = None
+        db.search_backend = None
         db.sa = self._sa
         db.func = self._func
         db.or_ = self._or_
@@ -82,7 +91,34 @@ class DBTest(unittest.TestCase):
         self.assertEquals(db_response, result)
         final_query.filter_by.assert_called_once_with(**params)
 
-    def _test_get_ordered_by_date(self, table, time_column, params):
+    def _test_get_owner_id(self, table):
+        """
+        Aux method for Comment and Data Requests
+        """
+        final_query = MagicMock()
+        final_query.filter_by.return_value.scalar.return_value = "user_id"
+
+        query = MagicMock()
+        query.autoflush = MagicMock(return_value=final_query)
+
+        model = MagicMock()
+        model.DomainObject = object
+        model.Session.query = MagicMock(return_value=query)
+
+        # Init the database
+        db.init_db(model)
+        table_class = getattr(db, table)
+        table_class.user_id = "user_id_column"
+
+        # Call the method
+        result = table_class.get_owner_id("example_uuid_v4")
+
+        # Only the user_id column is read
+        self.assertEquals("user_id", result)
+        model.Session.query.assert_called_once_with("user_id_column")
+        final_query.filter_by.assert_called_once_with(id="example_uuid_v4")
+
+    def _test_get_ordered_by_date(self, table, time_column, params, tiebreaker=False):
 
         db_response = [MagicMock(), MagicMock(), MagicMock()]
 
@@ -108,9 +144,11 @@ class DBTest(unittest.TestCase):
         # Mapping
         table = getattr(db, table)
         time_column_value = MagicMock()
+        id_column_value = MagicMock()
         title_column_value = MagicMock()
         description_column_value = MagicMock()
         setattr(table, time_column, time_column_value)
+        setattr(table, "id", id_column_value)
         setattr(table, "title", title_column_value)
         setattr(table, "description", description_column_value)
 
@@ -131,8 +169,10 @@ class DBTest(unittest.TestCase):
 
         # Assertions
         self.assertEquals(db_response, result)
-        order = time_column_value.desc() if desc else time_column_value.asc()
-        no_ordered.order_by.assert_called_once_with(order)
+        order = [time_column_value.desc() if desc else time_column_value.asc()]
+        if tiebreaker:
+            order.append(id_column_value.desc() if desc else id_column_value.asc())
+        no_ordered.order_by.assert_called_once_with(*order)
         final_query.filter_by.assert_called_once_with(**expected_filter_by_params)
 
         # This only happens with the table of data requests
@@ -151,9 +191,19 @@ class DBTest(unittest.TestCase):
         table_data_request = MagicMock()
         table_comment = MagicMock()
         table_datarequest_follower = MagicMock()
+        table_notification = MagicMock()
+        table_participant = MagicMock()
+        table_change = MagicMock()
 
         db.sa.Table = MagicMock(
-            side_effect=[table_data_request, table_comment, table_datarequest_follower]
+            side_effect=[
+                table_data_request,
+                table_comment,
+                table_datarequest_follower,
+                table_notification,
+                table_participant,
+                table_change,
+            ]
         )
 
         # Call the function
@@ -161,17 +211,34 @@ class DBTest(unittest.TestCase):
         db.init_db(model)
 
         # Assert that table method has been called
-        self.assertEquals(3, db.sa.Table.call_count)
+        self.assertEquals(6, db.sa.Table.call_count)
         model.meta.mapper.assert_any_call(db.DataRequest, table_data_request)
         model.meta.mapper.assert_any_call(db.Comment, table_comment)
         model.meta.mapper.assert_any_call(
             db.DataRequestFollower, table_datarequest_follower
         )
+        model.meta.mapper.assert_any_call(db.Notification, table_notification)
+        model.meta.mapper.assert_any_call(db.Participant, table_participant)
+        model.meta.mapper.assert_any_call(db.Change, table_change)
+
+        # Tables are not created at runtime
+        for table in (
+            table_data_request,
+            table_comment,
+            table_datarequest_follower,
+            table_notification,
+            table_participant,
+            table_change,
+        ):
+            self.assertEquals(0, table.create.call_count)
 
     def test_initdb_initialized(self):
         db.DataRequest = MagicMock()
         db.Comment = MagicMock()
         db.DataRequestFollower = MagicMock()
+        db.Notification = MagicMock()
+        db.Participant = MagicMock()
+        db.Change = MagicMock()
 
         # Call the function
         model = MagicMock()
@@ -181,54 +248,91 @@ class DBTest(unittest.TestCase):
         self.assertEquals(0, db.sa.Table.call_count)
         self.assertEquals(0, model.meta.mapper.call_count)
 
-    def test_datarequest_get(self):
-        self._test_get("DataRequest")
+    def test_initdb_called_again(self):
+        model = MagicMock()
+        db.init_db(model)
+        db.init_db(model)
 
-    @parameterized.expand([(None, False), (1, True)])
-    def test_datarequest_exist(self, first_result, expected_result):
+        # The classes are mapped once
+        self.assertEquals(6, db.sa.Table.call_count)
+        self.assertEquals(6, model.meta.mapper.call_count)
 
-        title = "DataRequest Title"
+    def test_create_tables(self):
+        model = MagicMock()
 
-        # Prepare the mocks
-        def _lower(text):
-            # If expected_result == true it's because lower is supossed
-            # to return the same result in the two calls
-            if expected_result:
-                return title.lower()
-            else:
-                return text
+        db.create_tables(model)
 
-        db.func.lower.side_effect = _lower
+        # The tables are created in order and only if they do not exist
+        tables = model.meta.metadata.tables
+        self.assertEquals(
+            [call(name) for name in db.TABLES], tables.__getitem__.call_args_list
+        )
+        self.assertEquals(
+            [call(bind=model.meta.engine, checkfirst=True)] * len(db.TABLES),
+            tables.__getitem__.return_value.create.call_args_list,
+        )
+        self.assertEquals(6, model.meta.mapper.call_count)
 
-        # Query
-        query_result = MagicMock()
-        query_result.first.return_value = first_result
+    def test_datarequest_get(self):
+        self._test_get("DataRequest")
 
-        final_query = MagicMock()
-        final_query.filter.return_value = query_result
+    @parameterized.expand(
+        [
+            ("postgresql", True, False, db.POSTGRESQL_SEARCH, True),
+            ("postgresql", False, False, db.ILIKE_SEARCH, False),
+            ("postgresql", None, False, db.ILIKE_SEARCH, False),
+            ("sqlite", None, True, db.SQLITE_SEARCH, True),
+            ("sqlite", None, False, db.ILIKE_SEARCH, False),
+            ("mysql", None, False, db.ILIKE_SEARCH, True),
+        ]
+    )
+    def test_get_search_backend(
+        self, dialect, index_is_valid, has_search_table, expected_backend, remembered
+    ):
+        model = MagicMock()
+        model.Session.get_bind.return_value.dialect.name = dialect
+        model.Session.execute.return_value.scalar.return_value = index_is_valid
+        db.sa.inspect.return_value.has_table.return_value = has_search_table
 
-        query = MagicMock()
-        query.autoflush = MagicMock(return_value=final_query)
+        self.assertEquals(expected_backend, db._get_search_backend(model))
 
-        model = MagicMock()
-        model.DomainObject = object
-        model.Session.query = MagicMock(return_value=query)
+        # The database is checked again until the full text search is found
+        self.assertEquals(expected_backend if remembered else None, db.search_backend)
 
-        # Init the database
-        db.init_db(model)
+    @parameterized.expand(
+        [
+            (
+                'duplicate key value violates unique constraint "idx_datarequests_title"',
+                True,
+            ),
+            ("UNIQUE constraint failed: index 'idx_datarequests_title'", True),
+            ("UNIQUE constraint failed: datarequests.id", False),
+        ]
+    )
+    def test_is_title_in_use_error(self, message, expected_result):
+        error = MagicMock()
+        error.orig = Exception(message)
+        self.assertEquals(expected_result, db.is_title_in_use_error(error))
 
-        # Call the method
-        db.DataRequest.title = "TITLE"
-        result = db.DataRequest.datarequest_exists(title)
-
-        # Assertion
-        self.assertEquals(expected_result, result)
-        db.func.lower.assert_any_call(db.DataRequest.title)
-        db.func.lower.assert_any_call(title)
-        # If expected_result == true is because lower is supossed
-        # to return the same result in the two calls and the
-        # equalization of these results must be True
-        final_query.filter.assert_called_once_with(expected_result)
+    @parameterized.expand(
+        [
+            (
+                "duplicate key value violates unique constraint "
+                '"uq_datarequests_followers_datarequest_id_user_id"',
+                True,
+            ),
+            (
+                "UNIQUE constraint failed: datarequests_followers.datarequest_id, "
+                "datarequests_followers.user_id",
+                True,
+            ),
+            ("FOREIGN KEY constraint failed", False),
+        ]
+    )
+    def test_is_already_following_error(self, message, expected_result):
+        error = MagicMock()
+        error.orig = Exception(message)
+        self.assertEquals(expected_result, db.is_already_following_error(error))
 
     @parameterized.expand(
         [
@@ -242,7 +346,226 @@ class DBTest(unittest.TestCase):
         ]
     )
     def test_datarequest_get_ordered_by_date(self, params):
-        self._test_get_ordered_by_date("DataRequest", "open_time", params)
+        self._test_get_ordered_by_date("DataRequest", "open_time", params, True)
+
+    def _init_filtered_query(self):
+        filtered_query = MagicMock()
+
+        query = MagicMock()
+        query.autoflush.return_value.filter_by.return_value = filtered_query
+
+        model = MagicMock()
+        model.DomainObject = object
+        model.Session.query = MagicMock(return_value=query)
+
+        # Init the database
+        db.init_db(model)
+        db.DataRequest.id = MagicMock()
+        db.DataRequest.open_time = MagicMock()
+
+        return filtered_query
+
+    def test_datarequest_get_ordered_by_date_paginated(self):
+        filtered_query = self._init_filtered_query()
+
+        ordered_query = filtered_query.order_by.return_value
+        offset_query = ordered_query.offset.return_value
+        limit_query = offset_query.limit.return_value
+
+        # Call the method
+        result = db.DataRequest.get_ordered_by_date(
+            closed=True, desc=True, offset=20, limit=10
+        )
+
+        # Assertions
+        self.assertEquals(limit_query.all.return_value, result)
+        filtered_query.order_by.assert_called_once_with(
+            db.DataRequest.open_time.desc(), db.DataRequest.id.desc()
+        )
+        ordered_query.offset.assert_called_once_with(20)
+        offset_query.limit.assert_called_once_with(10)
+
+    @parameterized.expand([(True,), (False,)])
+    def test_datarequest_get_ordered_by_date_after(self, desc):
+        filtered_query = self._init_filtered_query()
+        key = MagicMock()
+        key.__lt__.return_value = "lower_than"
+        key.__gt__.return_value = "greater_than"
+        db.sa.tuple_.return_value = key
+
+        after_query = filtered_query.filter.return_value
+        limit_query = after_query.order_by.return_value.limit.return_value
+
+        # Call the method
+        after = ("2016-01-01 00:00:00", "example_uuid_v4")
+        result = db.DataRequest.get_ordered_by_date(desc=desc, limit=11, after=after)
+
+        # Assertions
+        self.assertEquals(limit_query.all.return_value, result)
+        db.sa.tuple_.assert_called_once_with(
+            db.DataRequest.open_time, db.DataRequest.id
+        )
+        expected_filter = "lower_than" if desc else "greater_than"
+        filtered_query.filter.assert_called_once_with(expected_filter)
+        after_query.order_by.return_value.limit.assert_called_once_with(11)
+
+    def _init_search_query(self, search_backend):
+        query = MagicMock()
+        query.join.return_value = query
+        query.filter.return_value = query
+
+        model = MagicMock()
+        model.DomainObject = object
+        model.Session.query.return_value.autoflush.return_value = query
+
+        db.init_db(model)
+        db.search_backend = search_backend
+        db.DataRequest.id = MagicMock()
+        db.DataRequest.open_time = MagicMock()
+
+        return query.filter_by.return_value
+
+    def test_datarequest_get_ordered_by_date_relevance(self):
+        filtered_query = self._init_search_query(db.ILIKE_SEARCH)
+        db.DataRequest.title = MagicMock()
+        db.DataRequest.description = MagicMock()
+
+        # Call the method
+        result = db.DataRequest.get_ordered_by_date(
+            q=self.FREE_TEXT_QUERY, relevance=True
+        )
+
+        # Assertions. Data requests are searched with ILIKE by default and the
+        # ones whose title matches go first
+        query = f"%{self.FREE_TEXT_QUERY}%"
+        self.assertEquals(filtered_query.order_by.return_value.all.return_value, result)
+        db.DataRequest.title.ilike.assert_called_once_with(query)
+        db.DataRequest.description.ilike.assert_called_once_with(query)
+        db.sa.case.assert_called_once_with(
+            (db.DataRequest.title.ilike.return_value, 0), else_=1
+        )
+        filtered_query.order_by.assert_called_once_with(
+            db.sa.case.return_value,
+            db.DataRequest.open_time.asc(),
+            db.DataRequest.id.asc(),
+        )
+
+    def test_datarequest_search_postgresql(self):
+        filtered_query = self._init_search_query(db.POSTGRESQL_SEARCH)
+        search_vector = db.sa.literal_column.return_value
+
+        # Call the method
+        db.DataRequest.get_ordered_by_date(q="Water (quality)", relevance=True)
+
+        # Assertions. Operators are removed and the last word is a prefix
+        db.sa.literal_column.assert_called_once_with("datarequests.search_vector")
+        db.func.to_tsquery.assert_called_once_with(
+            db.SEARCH_CONFIG, "Water & quality:*"
+        )
+        search_vector.op.assert_called_once_with("@@")
+        search_vector.op.return_value.assert_called_once_with(
+            db.func.to_tsquery.return_value
+        )
+        db.func.ts_rank_cd.assert_called_once_with(
+            search_vector, db.func.to_tsquery.return_value
+        )
+        filtered_query.order_by.assert_called_once_with(
+            db.func.ts_rank_cd.return_value.desc(),
+            db.DataRequest.open_time.asc(),
+            db.DataRequest.id.asc(),
+        )
+
+    def test_datarequest_search_sqlite(self):
+        filtered_query = self._init_search_query(db.SQLITE_SEARCH)
+        search_table = db.sa.table.return_value
+        search_column = db.sa.literal_column.return_value
+
+        # Call the method
+        db.DataRequest.get_ordered_by_date(q='Water "quality', relevance=True)
+
+        # Assertions. Operators are removed and the last word is a prefix
+        db.sa.table.assert_called_once_with(
+            "datarequests_search", db.sa.column.return_value, db.sa.column.return_value
+        )
+        # The index is joined on its own integer column, which is not changed by VACUUM
+        db.sa.literal_column.assert_any_call("datarequests.search_rowid")
+        db.sa.literal_column.assert_any_call("datarequests_search")
+        search_column.op.assert_called_once_with("MATCH")
+        search_column.op.return_value.assert_called_once_with('"Water" "quality"*')
+        filtered_query.order_by.assert_called_once_with(
+            search_table.c.rank.asc(),
+            db.DataRequest.open_time.asc(),
+            db.DataRequest.id.asc(),
+        )
+
+    def test_datarequest_iter_ordered_by_date(self):
+        filtered_query = self._init_filtered_query()
+        ordered_query = filtered_query.order_by.return_value
+
+        # Call the method
+        result = db.DataRequest.iter_ordered_by_date(closed=True, batch_size=50)
+
+        # The data requests are fetched in batches
+        self.assertEquals(ordered_query.yield_per.return_value, result)
+        filtered_query.order_by.assert_called_once_with(
+            db.DataRequest.open_time.asc(), db.DataRequest.id.asc()
+        )
+        ordered_query.yield_per.assert_called_once_with(50)
+
+    def test_get_datarequests_number(self):
+        filtered_query = self._init_filtered_query()
+        filtered_query.with_entities.return_value.scalar.return_value = 7
+
+        # Call the method
+        result = db.DataRequest.get_datarequests_number(closed=False)
+
+        # Assertions
+        self.assertEquals(7, result)
+        filtered_query.with_entities.assert_called_once_with(db.func.count.return_value)
+        db.func.count.assert_called_once_with(db.DataRequest.id)
+
+    def test_get_facets(self):
+        filtered_query = self._init_filtered_query()
+        db.DataRequest.organization_id = MagicMock()
+        db.DataRequest.closed = MagicMock()
+        entities_query = filtered_query.with_entities.return_value
+        group_by_query = entities_query.group_by.return_value
+
+        # Call the method
+        result = db.DataRequest.get_facets(user_id=self.EXAMPLE_UUID)
+
+        # Assertions
+        self.assertEquals(group_by_query.all.return_value, result)
+        filtered_query.with_entities.assert_called_once_with(
+            db.DataRequest.organization_id,
+            db.DataRequest.closed,
+            db.func.count.return_value,
+        )
+        entities_query.group_by.assert_called_once_with(
+            db.DataRequest.organization_id, db.DataRequest.closed
+        )
+
+    def test_update_counters(self):
+        model = MagicMock()
+        model.DomainObject = object
+        db.init_db(model)
+        db.DataRequest.comment_count = MagicMock()
+        db.DataRequest.follower_count = MagicMock()
+
+        # Call the method
+        db.DataRequest.update_counters(self.EXAMPLE_UUID, comments=-1)
+
+        # Assertions. Counters are updated by the database
+        model.Session.query.assert_called_once_with(db.DataRequest)
+        query = model.Session.query.return_value
+        query.filter_by.assert_called_once_with(id=self.EXAMPLE_UUID)
+        query.filter_by.return_value.update.assert_called_once_with(
+            {
+                db.DataRequest.comment_count: db.DataRequest.comment_count + -1,
+                db.DataRequest.follower_count: db.DataRequest.follower_count + 0,
+            },
+            synchronize_session=False,
+        )
 
     def test_get_open_datarequests_number(self):
 
@@ -278,6 +601,12 @@ class DBTest(unittest.TestCase):
     def test_comment_get(self):
         self._test_get("Comment")
 
+    def test_comment_get_owner_id(self):
+        self._test_get_owner_id("Comment")
+
+    def test_datarequest_get_owner_id(self):
+        self._test_get_owner_id("DataRequest")
+
     @parameterized.expand(
         [
             ({"datarequest_id": "example_uuid_v4"},),
@@ -286,7 +615,55 @@ class DBTest(unittest.TestCase):
         ]
     )
     def test_comment_get_ordered_by_date(self, params):
-        self._test_get_ordered_by_date("Comment", "time", params)
+        self._test_get_ordered_by_date("Comment", "time", params, True)
+
+    def test_comment_get_ordered_by_date_paginated(self):
+        filtered_query = self._init_filtered_query()
+        db.Comment.id = MagicMock()
+        db.Comment.time = MagicMock()
+
+        ordered_query = filtered_query.order_by.return_value
+        offset_query = ordered_query.offset.return_value
+        limit_query = offset_query.limit.return_value
+
+        # Call the method
+        result = db.Comment.get_ordered_by_date(
+            datarequest_id=self.EXAMPLE_UUID, desc=True, offset=20, limit=10
+        )
+
+        # Assertions
+        self.assertEquals(limit_query.all.return_value, result)
+        filtered_query.order_by.assert_called_once_with(
+            db.Comment.time.desc(), db.Comment.id.desc()
+        )
+        ordered_query.offset.assert_called_once_with(20)
+        offset_query.limit.assert_called_once_with(10)
+
+    @parameterized.expand([(True,), (False,)])
+    def test_comment_get_ordered_by_date_after(self, desc):
+        filtered_query = self._init_filtered_query()
+        db.Comment.id = MagicMock()
+        db.Comment.time = MagicMock()
+        key = MagicMock()
+        key.__lt__.return_value = "lower_than"
+        key.__gt__.return_value = "greater_than"
+        db.sa.tuple_.return_value = key
+
+        after_query = filtered_query.filter.return_value
+        limit_query = after_query.order_by.return_value.limit.return_value
+
+        # Call the method
+        after = ("2016-01-01 00:00:00", "example_uuid_v4")
+        result = db.Comment.get_ordered_by_date(
+            datarequest_id=self.EXAMPLE_UUID, desc=desc, limit=21, after=after
+        )
+
+        # Assertions
+        self.assertEquals(limit_query.all.return_value, result)
+        db.sa.tuple_.assert_called_once_with(db.Comment.time, db.Comment.id)
+        expected_filter = "lower_than" if desc else "greater_than"
+        filtered_query.filter.assert_called_once_with(expected_filter)
+        after_query.order_by.return_value.limit.assert_called_once_with(21)
 
     def test_get_datarequests_comments(self):
 
@@ -323,34 +700,288 @@ class DBTest(unittest.TestCase):
     def test_datarequest_follower_get(self):
         self._test_get("DataRequestFollower")
 
-    def test_get_datarequest_followers_number(self):
+    def _init_notification(self, dialect):
+        model = MagicMock()
+        model.DomainObject = object
+        model.Session.get_bind.return_value.dialect.name = dialect
 
-        n_followers = 7
-        count = "example"
+        db.init_db(model)
 
-        db.func = MagicMock()
-        db.func.count.return_value = count
+        for column in (
+            "id",
+            "created",
+            "delivered",
+            "failed",
+            "claim_token",
+            "claimed_until",
+        ):
+            setattr(db.Notification, column, MagicMock())
 
-        filter_by = MagicMock()
-        filter_by.scalar.return_value = n_followers
+        return model
 
-        query = MagicMock()
-        query.filter_by = MagicMock(return_value=filter_by)
+    @parameterized.expand(
+        [
+            ("postgresql", True),
+            ("sqlite", False),
+        ]
+    )
+    @patch("ckanext.datarequests.db.datetime")
+    def test_notification_claim(self, dialect, skip_locked, datetime_mock):
+        model = self._init_notification(dialect)
+        now = datetime.datetime(2015, 1, 1)
+        datetime_mock.datetime.utcnow.return_value = now
+        lease = datetime.timedelta(minutes=5)
+        db.Notification.claimed_until.__lt__.return_value = "lease_expired"
+
+        session_query = model.Session.query.return_value
+        limit = session_query.filter.return_value.order_by.return_value.limit
+        pending = limit.return_value
+        if skip_locked:
+            pending = pending.with_for_update.return_value
+        claimed_query = session_query.filter_by.return_value.order_by.return_value
+
+        result = db.Notification.claim(10, lease)
+
+        self.assertEquals(claimed_query.all.return_value, result)
+
+        # The pending notifications whose lease has expired are claimed
+        model.Session.query.assert_any_call(db.Notification.id)
+        session_query.filter.assert_any_call(
+            db.Notification.delivered.is_.return_value,
+            db.Notification.failed.is_.return_value,
+            db.or_.return_value,
+        )
+        db.Notification.delivered.is_.assert_called_once_with(None)
+        db.Notification.failed.is_.assert_called_once_with(None)
+        db.Notification.claimed_until.__lt__.assert_called_once_with(now)
+        db.or_.assert_called_once_with(
+            db.Notification.claimed_until.is_.return_value, "lease_expired"
+        )
+        limit.assert_called_once_with(10)
+
+        # PostgreSQL skips the notifications locked by other drainers
+        with_for_update = limit.return_value.with_for_update
+        if skip_locked:
+            with_for_update.assert_called_once_with(skip_locked=True)
+        else:
+            self.assertEquals(0, with_for_update.call_count)
+        pending.subquery.assert_called_once_with()
+
+        update = session_query.filter.return_value.update
+        update.assert_called_once()
+        values = update.call_args[0][0]
+        self.assertEquals(now + lease, values[db.Notification.claimed_until])
+
+        # The claim is committed by the caller
+        self.assertEquals(0, model.Session.commit.call_count)
+
+        # The notifications claimed with the token are returned
+        session_query.filter_by.assert_called_once_with(
+            claim_token=values[db.Notification.claim_token]
+        )
 
+    def _init_participant(self, dialect="postgresql"):
         model = MagicMock()
         model.DomainObject = object
-        model.Session.query = MagicMock(return_value=query)
+        model.Session.get_bind.return_value.dialect.name = dialect
 
-        # Init the database
         db.init_db(model)
 
+        for table in (db.DataRequest, db.Comment, db.DataRequestFollower):
+            for column in ("id", "user_id", "datarequest_id", "organization_id"):
+                setattr(table, column, MagicMock())
+        for column in ("datarequest_id", "user_id", "role"):
+            setattr(db.Participant, column, MagicMock())
+
+        return model
+
+    @parameterized.expand([("postgresql",), ("sqlite",)])
+    def test_participant_add(self, dialect):
+        model = self._init_participant(dialect)
+
+        with patch(f"ckanext.datarequests.db.{dialect}") as dialect_mock:
+            db.Participant.add(self.EXAMPLE_UUID, "user_id", "follower")
+
+        # Existing participants are ignored by the database
+        dialect_mock.insert.assert_called_once_with(db.Participant)
+        values = dialect_mock.insert.return_value.values
+        values.assert_called_once_with(
+            datarequest_id=self.EXAMPLE_UUID, user_id="user_id", role="follower"
+        )
+        model.Session.execute.assert_called_once_with(
+            values.return_value.on_conflict_do_nothing.return_value
+        )
+
+    @parameterized.expand([(0, 1), (1, 0)])
+    def test_participant_add_other_database(self, existing, inserted):
+        model = self._init_participant("mysql")
+        model.Session.query.return_value.filter_by.return_value.count.return_value = (
+            existing
+        )
+
+        db.Participant.add(self.EXAMPLE_UUID, "user_id", "follower")
+
+        model.Session.query.return_value.filter_by.assert_called_once_with(
+            datarequest_id=self.EXAMPLE_UUID, user_id="user_id", role="follower"
+        )
+        self.assertEquals(inserted, model.Session.execute.call_count)
+        self.assertEquals(inserted, db.sa.insert.call_count)
+
+    def test_participant_remove(self):
+        model = self._init_participant()
+
+        db.Participant.remove(self.EXAMPLE_UUID, "user_id", "follower")
+
+        model.Session.query.assert_called_once_with(db.Participant)
+        query = model.Session.query.return_value
+        query.filter_by.assert_called_once_with(
+            datarequest_id=self.EXAMPLE_UUID, user_id="user_id", role="follower"
+        )
+        query.filter_by.return_value.delete.assert_called_once_with(
+            synchronize_session=False
+        )
+
+    def test_participant_remove_commenter(self):
+        model = self._init_participant()
+        comments, participants = MagicMock(), MagicMock()
+        model.Session.query.side_effect = [comments, participants]
+
+        db.Participant.remove_commenter(self.EXAMPLE_UUID, "user_id")
+
+        # The participant is removed if there are no more comments
+        db.Comment.datarequest_id.__eq__.assert_called_once_with(self.EXAMPLE_UUID)
+        db.Comment.user_id.__eq__.assert_called_once_with("user_id")
+        db.Participant.role.__eq__.assert_called_once_with("commenter")
+        exists = comments.filter.return_value.exists
+        participants.filter.assert_called_once()
+        self.assertIn(~exists.return_value, participants.filter.call_args[0])
+        participants.filter.return_value.delete.assert_called_once_with(
+            synchronize_session=False
+        )
+
+    def test_participant_get_user_ids(self):
+        model = self._init_participant()
+        participants, members = MagicMock(), MagicMock()
+        model.Session.query.side_effect = [participants, members]
+        union = participants.filter.return_value.union
+        union.return_value = [("user1",), ("user2",)]
+
         # Call the method
-        params = {"datarequest_id": "example_uuid_v4"}
-        db.DataRequestFollower.id = "id"
-        result = db.DataRequestFollower.get_datarequest_followers_number(**params)
+        result = db.Participant.get_user_ids(self.EXAMPLE_UUID)
 
-        # Assertions
-        self.assertEquals(n_followers, result)
-        query.filter_by.assert_called_once_with(**params)
-        model.Session.query.assert_called_once_with(count)
-        db.func.count.assert_called_once_with(db.DataRequestFollower.id)
+        # Assertions. The users are read with one query
+        self.assertEquals({"user1", "user2"}, result)
+        model.Session.query.assert_has_calls(
+            [call(db.Participant.user_id), call(model.Member.table_id)]
+        )
+        union.assert_called_once_with(members.filter.return_value)
+        db.Participant.datarequest_id.__eq__.assert_called_once_with(self.EXAMPLE_UUID)
+        db.DataRequest.id.__eq__.assert_called_once_with(self.EXAMPLE_UUID)
+        model.Member.group_id.__eq__.assert_called_once_with(
+            db.DataRequest.organization_id
+        )
+
+    def test_participant_rebuild(self):
+        model = self._init_participant()
+        model.Session.execute.return_value.rowcount = 5
+
+        result = db.Participant.rebuild()
+
+        # The participants are computed by the database
+        self.assertEquals(5, result)
+        self.assertEquals(3, db.sa.select.call_count)
+        model.Session.query.return_value.delete.assert_called_once_with(
+            synchronize_session=False
+        )
+        db.sa.insert.assert_called_once_with(db.Participant)
+        db.sa.insert.return_value.from_select.assert_called_once_with(
+            ["datarequest_id", "user_id", "role"], db.sa.union.return_value
+        )
+        model.Session.execute.assert_called_once_with(
+            db.sa.insert.return_value.from_select.return_value
+        )
+
+    def _init_change(self):
+        model = MagicMock()
+        model.DomainObject = object
+
+        db.init_db(model)
+
+        for column in ("id", "time"):
+            setattr(db.Change, column, MagicMock())
+
+        return model
+
+    @patch("ckanext.datarequests.db.datetime")
+    def test_change_add(self, datetime_mock):
+        model = self._init_change()
+
+        db.Change.add(self.EXAMPLE_UUID, "commented", "user_id", "comment_id")
+
+        # The change is appended to the log
+        db.sa.insert.assert_called_once_with(db.Change)
+        values = db.sa.insert.return_value.values
+        values.assert_called_once_with(
+            datarequest_id=self.EXAMPLE_UUID,
+            change_type="commented",
+            user_id="user_id",
+            object_id="comment_id",
+            time=datetime_mock.datetime.utcnow.return_value,
+        )
+        model.Session.execute.assert_called_once_with(values.return_value)
+
+    @parameterized.expand([(None,), ("2016-01-01 00:00:00",)])
+    def test_change_get_after(self, since):
+        model = self._init_change()
+        query = model.Session.query.return_value.autoflush.return_value
+        query.filter.return_value = query
+        ordered_query = query.order_by.return_value
+        db.Change.id.__gt__.return_value = "after_change"
+        db.Change.time.__ge__.return_value = "after_since"
+
+        result = db.Change.get_after(change_id=10, since=since, limit=101)
+
+        # The changes are returned in the order they were logged
+        self.assertEquals(ordered_query.limit.return_value.all.return_value, result)
+        db.Change.id.__gt__.assert_called_once_with(10)
+        expected_filters = [call("after_change")]
+        if since is not None:
+            db.Change.time.__ge__.assert_called_once_with(since)
+            expected_filters.append(call("after_since"))
+        self.assertEquals(expected_filters, query.filter.call_args_list)
+        query.order_by.assert_called_once_with(db.Change.id.asc())
+        ordered_query.limit.assert_called_once_with(101)
+
+    def test_change_get_after_before(self):
+        model = self._init_change()
+        query = model.Session.query.return_value.autoflush.return_value
+        query.filter.return_value = query
+        db.Change.id.__gt__.return_value = "after_change"
+        changes = [
+            MagicMock(time=datetime.datetime(2016, 1, 1, 0, 0, s)) for s in (1, 3, 2)
+        ]
+        query.order_by.return_value.all.return_value = changes
+
+        result = db.Change.get_after(before=datetime.datetime(2016, 1, 1, 0, 0, 3))
+
+        # The changes are returned up to the first recent one, even if there
+        # are older ones after it
+        self.assertEquals(changes[:1], result)
+
+    @parameterized.expand([(None, 0), (7, 7)])
+    def test_change_get_last_id(self, last_id, expected_result):
+        model = self._init_change()
+        model.Session.query.return_value.scalar.return_value = last_id
+
+        self.assertEquals(expected_result, db.Change.get_last_id())
+        model.Session.query.assert_called_once_with(db.func.max(db.Change.id))
+
+    def test_change_get_last_id_before(self):
+        model = self._init_change()
+        query = model.Session.query.return_value
+        query.filter.return_value.scalar.return_value = 7
+        db.Change.time.__lt__.return_value = "before"
+
+        self.assertEquals(7, db.Change.get_last_id(before="time"))
+        db.Change.time.__lt__.assert_called_once_with("time")
+        query.filter.assert_called_once_with("before")
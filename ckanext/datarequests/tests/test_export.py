@@ -0,0 +1,160 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import csv
+import datetime
+import io
+import json
+import unittest
+
+from mock import MagicMock, patch
+from nose_parameterized import parameterized
+
+import ckanext.datarequests.export as export
+
+
+def _generate_datarequest(n, closed=False):
+    datarequest = MagicMock()
+    datarequest.id = f"id_{n}"
+    datarequest.user_id = "user_id"
+    datarequest.title = f"Title, {n}"
+    datarequest.description = "Line 1\nLine 2"
+    datarequest.organization_id = None
+    datarequest.open_time = datetime.datetime(2016, 1, 1, 0, 0, n)
+    datarequest.accepted_dataset_id = "dataset_id" if closed else None
+    datarequest.close_time = datetime.datetime(2016, 2, 1) if closed else None
+    datarequest.closed = closed
+    datarequest.follower_count = 2
+    datarequest.comment_count = 3
+    return datarequest
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.db_patch = patch("ckanext.datarequests.export.db")
+        self.db_mock = self.db_patch.start()
+
+        self.tk_patch = patch("ckanext.datarequests.export.tk")
+        self.tk_mock = self.tk_patch.start()
+
+        self.datarequests = [
+            _generate_datarequest(0),
+            _generate_datarequest(1, closed=True),
+            _generate_datarequest(2),
+        ]
+        self.db_mock.DataRequest.iter_ordered_by_date.return_value = iter(
+            self.datarequests
+        )
+        self.filters = {
+            "organization_id": None,
+            "user_id": None,
+            "closed": None,
+            "q": None,
+        }
+
+    def tearDown(self):
+        self.db_patch.stop()
+        self.tk_patch.stop()
+
+    def test_get_filters_empty(self):
+        self.assertEquals(self.filters, export.get_filters())
+        self.assertEquals(0, self.tk_mock.get_action.call_count)
+
+    def test_get_filters(self):
+        actions = {
+            "organization_show": MagicMock(return_value={"id": "org_id"}),
+            "user_show": MagicMock(return_value={"id": "user_id"}),
+        }
+        self.tk_mock.get_action.side_effect = lambda name: actions[name]
+
+        result = export.get_filters("org_name", "user_name", False, "free-text")
+
+        # Names are converted into IDs
+        self.assertEquals(
+            {
+                "organization_id": "org_id",
+                "user_id": "user_id",
+                "closed": False,
+                "q": "free-text",
+            },
+            result,
+        )
+        actions["organization_show"].assert_called_once_with(
+            {"ignore_auth": True}, {"id": "org_name"}
+        )
+        actions["user_show"].assert_called_once_with(
+            {"ignore_auth": True}, {"id": "user_name"}
+        )
+
+    def test_export_csv(self):
+        chunks = list(export.export_datarequests(export.CSV, self.filters))
+
+        rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+        self.assertEquals(["id_0", "id_1", "id_2"], [row["id"] for row in rows])
+        self.assertEquals(
+            {
+                "id": "id_1",
+                "user_id": "user_id",
+                "title": "Title, 1",
+                "description": "Line 1\nLine 2",
+                "organization_id": "",
+                "open_time": "2016-01-01 00:00:01",
+                "accepted_dataset_id": "dataset_id",
+                "close_time": "2016-02-01 00:00:00",
+                "closed": "True",
+                "followers": "2",
+                "comments": "3",
+            },
+            rows[1],
+        )
+        self.db_mock.DataRequest.iter_ordered_by_date.assert_called_once_with(
+            batch_size=export.DEFAULT_BATCH_SIZE, **self.filters
+        )
+
+    def test_export_jsonl(self):
+        chunks = list(export.export_datarequests(export.JSONL, self.filters))
+
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEquals(["id_0", "id_1", "id_2"], [row["id"] for row in rows])
+        self.assertEquals(list(export.FIELDS), list(rows[0]))
+        self.assertIsNone(rows[0]["close_time"])
+        self.assertFalse(rows[0]["closed"])
+        self.assertEquals("2016-02-01 00:00:00", rows[1]["close_time"])
+
+    @parameterized.expand([(1, 3), (2, 2), (3, 1), (10, 1)])
+    def test_export_batches(self, batch_size, expected_chunks):
+        chunks = list(
+            export.export_datarequests(export.JSONL, self.filters, batch_size)
+        )
+
+        # The text is returned in chunks of batch_size data requests
+        self.assertEquals(expected_chunks, len(chunks))
+        self.assertEquals(3, sum(chunk.count("\n") for chunk in chunks))
+        self.db_mock.DataRequest.iter_ordered_by_date.assert_called_once_with(
+            batch_size=batch_size, **self.filters
+        )
+
+    @parameterized.expand(
+        [(export.CSV, ",".join(export.FIELDS) + "\r\n"), (export.JSONL, "")]
+    )
+    def test_export_empty(self, fmt, expected_text):
+        self.db_mock.DataRequest.iter_ordered_by_date.return_value = iter([])
+
+        text = "".join(export.export_datarequests(fmt, self.filters))
+
+        # Only the CSV header is written
+        self.assertEquals(expected_text, text)
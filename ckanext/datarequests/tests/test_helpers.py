@@ -17,6 +17,7 @@
 
 import unittest
 
+import flask
 from mock import MagicMock, patch
 
 import ckanext.datarequests.helpers as helpers
@@ -33,10 +34,17 @@ class HelpersTest(unittest.TestCase):
         self.db_patch = patch("ckanext.datarequests.helpers.db")
         self.db_patch.start()
 
-        self.c_patch = patch("ckanext.datarequests.helpers.c")
+        # c is a proxy to the context of the current request
+        self.c_patch = patch("ckanext.datarequests.helpers.c", new=MagicMock())
         self.c = self.c_patch.start()
 
+        self.actions_patch = patch("ckanext.datarequests.helpers.actions")
+        self.actions_patch.start()
+
+        helpers.BADGES_CACHE.clear()
+
     def tearDown(self):
+        self.actions_patch.stop()
         self.tk_patch.stop()
         self.model_patch.stop()
         self.db_patch.stop()
@@ -80,36 +88,42 @@ class HelpersTest(unittest.TestCase):
     def test_get_open_datarequests_number(self):
         # Mocking
         n_datarequests = 3
-        helpers.db.DataRequest.get_open_datarequests_number.return_value = (
-            n_datarequests
-        )
+        helpers.actions.get_open_datarequests_number.return_value = n_datarequests
 
         # Call the function
         result = helpers.get_open_datarequests_number()
 
-        # Assertions
-        helpers.db.init_db.assert_called_once_with(helpers.model)
-        helpers.db.DataRequest.get_open_datarequests_number.assert_called_once_with()
+        # Assertions. The cached number is used
+        helpers.actions.get_open_datarequests_number.assert_called_once_with()
         self.assertEquals(result, n_datarequests)
 
     def test_get_open_datarequests_badge_true(self):
         # Mocking
         n_datarequests = 3
-        helpers.db.DataRequest.get_open_datarequests_number.return_value = (
-            n_datarequests
-        )
+        helpers.actions.get_open_datarequests_number.return_value = n_datarequests
 
         # Call the function
         result = helpers.get_open_datarequests_badge(True)
 
         # Assertions
-        helpers.db.init_db.assert_called_once_with(helpers.model)
-        helpers.db.DataRequest.get_open_datarequests_number.assert_called_once_with()
+        helpers.actions.get_open_datarequests_number.assert_called_once_with()
         self.assertEquals(result, helpers.tk.render_snippet.return_value)
         helpers.tk.render_snippet.assert_called_once_with(
             "datarequests/snippets/badge.html", {"comments_count": n_datarequests}
         )
 
+    def test_badge_rendered_once_per_number(self):
+        helpers.tk.render_snippet.side_effect = lambda template, data: (
+            f"badge {data['comments_count']}"
+        )
+        numbers = helpers.actions.get_open_datarequests_number
+        numbers.side_effect = [3, 3, 4, 3]
+
+        results = [helpers.get_open_datarequests_badge(True) for _ in range(4)]
+
+        self.assertEquals(["badge 3", "badge 3", "badge 4", "badge 3"], results)
+        self.assertEquals(2, helpers.tk.render_snippet.call_count)
+
     def test_get_open_datarequests_badge_false(self):
         self.assertEquals(helpers.get_open_datarequests_badge(False), "")
 
@@ -133,3 +147,19 @@ class HelpersTest(unittest.TestCase):
         helpers.db.DataRequestFollower.get.assert_called_once_with(
             datarequest_id=datarequest_id, user_id=self.c.userobj.id
         )
+
+    def test_values_remembered_during_request(self):
+        helpers.db.Comment.get_comment_datarequests_number.return_value = 3
+        helpers.db.DataRequestFollower.get.return_value = []
+
+        with flask.Flask(__name__).test_request_context():
+            for _ in range(2):
+                self.assertEquals(3, helpers.get_comments_number("example_id"))
+                self.assertFalse(helpers.is_following_datarequest("example_id"))
+
+        helpers.db.Comment.get_comment_datarequests_number.assert_called_once_with(
+            datarequest_id="example_id"
+        )
+        helpers.db.DataRequestFollower.get.assert_called_once_with(
+            datarequest_id="example_id", user_id=self.c.userobj.id
+        )
@@ -0,0 +1,154 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import email
+import smtplib
+import unittest
+
+from mock import MagicMock, patch
+from nose_parameterized import parameterized
+
+import ckanext.datarequests.mail as mail
+
+
+class SMTPSenderTest(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            "smtp.server": "smtp.example.com:25",
+            "smtp.mail_from": "ckan@example.com",
+            "ckan.site_title": "CKAN",
+        }
+        config_patch = patch("ckanext.datarequests.mail.config", new=self.config)
+        config_patch.start()
+        self.addCleanup(config_patch.stop)
+
+        smtp_patch = patch("ckanext.datarequests.mail.smtplib.SMTP")
+        self.smtp_mock = smtp_patch.start()
+        self.addCleanup(smtp_patch.stop)
+        self.connection = self.smtp_mock.return_value
+
+    def _send(self, sender, n_messages):
+        for i in range(n_messages):
+            sender.send(f"User {i}", f"user{i}@example.com", "Subject", "Body")
+
+    def test_one_connection(self):
+        with mail.SMTPSender(max_messages=10) as sender:
+            self._send(sender, 3)
+
+        self.smtp_mock.assert_called_once_with("smtp.example.com:25")
+        connection = self.connection
+        connection.ehlo.assert_called_once_with()
+        self.assertEquals(3, connection.sendmail.call_count)
+        connection.quit.assert_called_once_with()
+
+        mail_from, recipients, message = connection.sendmail.call_args_list[0][0]
+        self.assertEquals("ckan@example.com", mail_from)
+        self.assertEquals(["user0@example.com"], recipients)
+        message = email.message_from_string(message)
+        self.assertEquals("Subject", message["Subject"])
+        self.assertEquals("User 0 <user0@example.com>", message["To"])
+        self.assertEquals("CKAN <ckan@example.com>", message["From"])
+        self.assertEquals("Body", message.get_payload(decode=True).decode().strip())
+
+    def test_no_messages_no_connection(self):
+        with mail.SMTPSender(max_messages=10):
+            pass
+
+        self.assertEquals(0, self.smtp_mock.call_count)
+
+    def test_max_messages(self):
+        with mail.SMTPSender(max_messages=2) as sender:
+            self._send(sender, 5)
+
+        self.assertEquals(3, self.smtp_mock.call_count)
+
+    def test_max_messages_from_config(self):
+        self.config["ckan.datarequests.notifications.messages_per_connection"] = "7"
+        self.assertEquals(7, mail.SMTPSender().max_messages)
+
+    def test_starttls_login(self):
+        self.config.update(
+            {"smtp.starttls": "true", "smtp.user": "user", "smtp.password": "pass"}
+        )
+
+        with mail.SMTPSender(max_messages=10) as sender:
+            self._send(sender, 1)
+
+        self.connection.has_extn.assert_called_once_with("STARTTLS")
+        self.connection.starttls.assert_called_once_with()
+        self.assertEquals(2, self.connection.ehlo.call_count)
+        self.connection.login.assert_called_once_with("user", "pass")
+        self.assertEquals(1, self.connection.sendmail.call_count)
+
+    def test_starttls_not_supported(self):
+        self.config["smtp.starttls"] = "true"
+        connection = self.connection
+        connection.has_extn.return_value = False
+
+        sender = mail.SMTPSender(max_messages=10)
+        with self.assertRaises(smtplib.SMTPNotSupportedError):
+            self._send(sender, 1)
+
+        connection.close.assert_called_once_with()
+        self.assertEquals(0, connection.sendmail.call_count)
+
+    @parameterized.expand(
+        [
+            (smtplib.SMTPServerDisconnected(),),
+            (ConnectionResetError(),),
+            (smtplib.SMTPResponseException(421, "Closing connection"),),
+        ]
+    )
+    def test_reconnect(self, error):
+        lost, new = MagicMock(), MagicMock()
+        lost.sendmail.side_effect = error
+        lost.quit.side_effect = smtplib.SMTPServerDisconnected()
+        self.smtp_mock.side_effect = [lost, new]
+
+        with mail.SMTPSender(max_messages=10) as sender:
+            self._send(sender, 2)
+
+        lost.close.assert_called_once_with()
+        self.assertEquals(2, new.sendmail.call_count)
+        new.quit.assert_called_once_with()
+
+    def test_reconnect_once(self):
+        connections = [MagicMock(), MagicMock()]
+        for connection in connections:
+            connection.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+        self.smtp_mock.side_effect = connections
+
+        sender = mail.SMTPSender(max_messages=10)
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            self._send(sender, 1)
+
+        self.assertEquals(2, self.smtp_mock.call_count)
+
+    def test_recipient_refused_no_reconnect(self):
+        connection = self.connection
+        connection.sendmail.side_effect = [
+            smtplib.SMTPRecipientsRefused({"user0@example.com": (550, "Unknown")}),
+            {},
+        ]
+
+        with mail.SMTPSender(max_messages=10) as sender:
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                self._send(sender, 1)
+            sender.send("User 1", "user1@example.com", "Subject", "Body")
+
+        self.smtp_mock.assert_called_once_with("smtp.example.com:25")
+        self.assertEquals(2, connection.sendmail.call_count)
@@ -0,0 +1,390 @@
+# Copyright (c) 2015 CoNWeT Lab., Universidad Politécnica de Madrid
+
+# This file is part of CKAN Data Requests Extension.
+
+# CKAN Data Requests Extension is free software: you can redistribute it and/or
+# modify it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# CKAN Data Requests Extension is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import unittest
+
+import jinja2
+
+from mock import MagicMock, call, patch
+from nose_parameterized import parameterized
+
+import ckanext.datarequests.notifications as notifications
+
+
+class NotificationsTest(unittest.TestCase):
+    def setUp(self):
+        self.subject = "SUBJECT"
+        self.body = "BODY"
+        self.sender = MagicMock()
+
+        for name in ("base", "config", "mail", "model", "time", "tk"):
+            patcher = patch(f"ckanext.datarequests.notifications.{name}")
+            setattr(self, f"{name}_mock", patcher.start())
+            self.addCleanup(patcher.stop)
+
+        self.config_mock.get.side_effect = lambda key, default=None: default or key
+        self.tk_mock.asint.side_effect = int
+
+        # Templates are rendered with jinja2. They are up to date while they
+        # are not changed
+        self.templates = {"subjects": self.subject, "bodies": self.body}
+
+        def load(template):
+            part = template.split("/")[1]
+            source = self.templates[part]
+            return source, None, lambda: self.templates[part] == source
+
+        env = self.env = jinja2.Environment(loader=jinja2.FunctionLoader(load))
+        patcher = patch(
+            "ckanext.datarequests.notifications.current_app",
+            new=MagicMock(jinja_env=env),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.dict(notifications._recipient_uses, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.base_mock.render_jinja2.side_effect = lambda template, extra_vars: (
+            env.get_template(template).render(**extra_vars)
+        )
+
+    def _set_users(self, *user_ids):
+        users = []
+        for i, user_id in enumerate(user_ids):
+            user = MagicMock()
+            user.id = user_id
+            user.fullname = f"User {i + 1}"
+            users.append(user)
+
+        self.model_mock.Session.query.return_value.filter.return_value = users
+        return users
+
+    def test_send_notifications_two_users(self):
+        users = self._set_users("user1", "user2")
+        action_type = "new_datarequest"
+        datarequest = {"title": "Title"}
+
+        self.templates = {
+            "subjects": "[{{ site_title }}] {{ datarequest['title'] }}",
+            "bodies": "Dear {{ user.fullname }} ({{ user['name'] }}),\n{{ site_url }}",
+        }
+
+        result = notifications.send_notifications(
+            self.sender, ["user1", "user2"], action_type, datarequest
+        )
+
+        self.assertEquals([], result)
+
+        # The templates are rendered once for all the users
+        self.assertEquals(
+            [
+                f"emails/subjects/{action_type}.txt",
+                f"emails/bodies/{action_type}.txt",
+            ],
+            [c[0][0] for c in self.base_mock.render_jinja2.call_args_list],
+        )
+        # The users are read with one query
+        self.model_mock.Session.query.assert_called_once_with(self.model_mock.User)
+
+        for user in users:
+            self.sender.send.assert_any_call(
+                user.display_name,
+                user.email,
+                "[ckan.site_title] Title",
+                f"Dear {user.fullname} ({user.name}),\nckan.site_url",
+            )
+
+        self.assertEquals(0, self.time_mock.sleep.call_count)
+
+    def test_send_notifications_rendered_for_each_user(self):
+        users = self._set_users("user1", "user2")
+        users[0].sysadmin = True
+        users[1].sysadmin = False
+        self.templates["bodies"] = (
+            "{% if user.sysadmin %}Admin{% else %}User{% endif %} "
+            "{{ user.fullname|upper }}"
+        )
+
+        result = notifications.send_notifications(
+            self.sender, ["user1", "user2"], "new_comment", {}
+        )
+
+        # The body uses the attributes of the users, so it's rendered for each
+        # of them. The subject is rendered once
+        self.assertEquals([], result)
+        self.assertEquals(3, self.base_mock.render_jinja2.call_count)
+        self.assertEquals(
+            ["Admin USER 1", "User USER 2"],
+            [c[0][3] for c in self.sender.send.call_args_list],
+        )
+
+    @parameterized.expand(
+        [
+            ("Dear {{ user.fullname }} ({{ user['name'] }})", True),
+            ("{{ datarequest['title'] }}", True),
+            ("{{ user }}", False),
+            ("{{ user.fullname|upper }}", False),
+            ("{{ user.fullname or user.name }}", False),
+            ("{% if user.sysadmin %}Admin{% endif %}", False),
+            ("{% set name = user.name %}{{ name }}", False),
+            ("{% include 'emails/footer.txt' %}", False),
+        ]
+    )
+    def test_only_prints_recipient(self, template, expected_result):
+        self.templates["bodies"] = template
+
+        self.assertEquals(
+            expected_result,
+            notifications._only_prints_recipient("emails/bodies/new_comment.txt"),
+        )
+
+    @parameterized.expand([(True, False), (False, True)])
+    def test_only_prints_recipient_parsed_once(self, auto_reload, expected_result):
+        self.env.auto_reload = auto_reload
+        template_name = "emails/bodies/new_comment.txt"
+        self.templates["bodies"] = "Dear {{ user.fullname }}"
+
+        with patch.object(self.env, "parse", wraps=self.env.parse) as parse_mock:
+            self.assertTrue(notifications._only_prints_recipient(template_name))
+            self.assertTrue(notifications._only_prints_recipient(template_name))
+
+            # Templates are parsed once while they are not changed
+            self.assertEquals(1, parse_mock.call_count)
+
+            # Changed templates are parsed again when they are reloaded
+            self.templates["bodies"] = "{{ user.fullname|upper }}"
+            self.assertEquals(
+                expected_result,
+                notifications._only_prints_recipient(template_name),
+            )
+            self.assertEquals(2 if auto_reload else 1, parse_mock.call_count)
+
+    def test_send_notifications_render_error(self):
+        self.base_mock.render_jinja2.side_effect = Exception()
+
+        result = notifications.send_notifications(
+            self.sender, ["user1"], "new_comment", {}
+        )
+
+        # Nobody has been notified
+        self.assertEquals(["user1"], result)
+        self.assertEquals(0, self.sender.send.call_count)
+        self.assertEquals(0, self.time_mock.sleep.call_count)
+
+    def test_send_notifications_retried(self):
+        self._set_users("user1")
+        self.sender.send.side_effect = [Exception(), None]
+
+        result = notifications.send_notifications(
+            self.sender, ["user1"], "new_comment", MagicMock()
+        )
+
+        self.assertEquals([], result)
+        self.assertEquals(2, self.sender.send.call_count)
+        self.time_mock.sleep.assert_called_once_with(notifications.RETRY_DELAY)
+
+    def test_send_notifications_exception_no_risen(self):
+        self._set_users("user1", "user2")
+        self.sender.send.side_effect = Exception()
+
+        result = notifications.send_notifications(
+            self.sender, ["user1", "user2"], "new_comment", {}
+        )
+
+        self.assertEquals(["user1", "user2"], result)
+
+        # Every user is tried DEFAULT_RETRIES + 1 times
+        attempts = notifications.DEFAULT_RETRIES + 1
+        self.assertEquals(2 * attempts, self.sender.send.call_count)
+        self.assertEquals(
+            [call(1), call(2)] * 2,
+            self.time_mock.sleep.call_args_list,
+        )
+
+    def test_send_notifications_no_email(self):
+        users = self._set_users("user1", "user2")
+        users[0].email = None
+
+        # user3 does not exist
+        notifications.send_notifications(
+            self.sender, ["user1", "user2", "user3"], "new_comment", {}
+        )
+
+        self.assertEquals(1, self.sender.send.call_count)
+        self.assertEquals(users[1].email, self.sender.send.call_args[0][1])
+        self.assertEquals(0, self.time_mock.sleep.call_count)
+
+    @patch("ckanext.datarequests.notifications.db")
+    def test_add_notification(self, db_mock):
+        session = MagicMock()
+        datarequest = {"id": "datarequest_id", "open_time": "2015-01-01"}
+
+        result = notifications.add_notification(
+            session, {"user2", "user1"}, "new_comment", datarequest
+        )
+
+        self.assertTrue(result)
+        notification = db_mock.Notification.return_value
+        session.add.assert_called_once_with(notification)
+        self.assertEquals("new_comment", notification.action_type)
+        self.assertEquals('["user1", "user2"]', notification.user_ids)
+        self.assertEquals(datarequest, json.loads(notification.datarequest))
+        self.assertEquals(0, session.commit.call_count)
+
+    @patch("ckanext.datarequests.notifications.db")
+    def test_add_notification_no_users(self, db_mock):
+        session = MagicMock()
+
+        self.assertFalse(
+            notifications.add_notification(session, set(), "new_comment", {})
+        )
+        self.assertEquals(0, session.add.call_count)
+
+    @patch("ckanext.datarequests.notifications.send_notifications")
+    @patch("ckanext.datarequests.notifications.db")
+    def test_send_pending_notifications(self, db_mock, send_notifications_mock):
+        def notification(user_ids, action_type, datarequest_id):
+            notification = MagicMock()
+            notification.user_ids = json.dumps(user_ids)
+            notification.action_type = action_type
+            notification.datarequest = json.dumps({"id": datarequest_id})
+            return notification
+
+        batches = [
+            [
+                notification(["user1"], "new_comment", "dr1"),
+                notification(["user1", "user2"], "close_datarequest", "dr2"),
+            ],
+            [notification(["user3"], "new_datarequest", "dr3")],
+            [],
+        ]
+        db_mock.Notification.claim.side_effect = batches
+        send_notifications_mock.return_value = []
+
+        result = notifications.send_pending_notifications(batch_size=2)
+        sender = self.mail_mock.SMTPSender.return_value.__enter__.return_value
+
+        self.assertEquals(3, result)
+        self.assertEquals(
+            [call(2, notifications.LEASE)] * 3,
+            db_mock.Notification.claim.call_args_list,
+        )
+        self.assertEquals(
+            [
+                call(sender, ["user1"], "new_comment", {"id": "dr1"}),
+                call(sender, ["user1", "user2"], "close_datarequest", {"id": "dr2"}),
+                call(sender, ["user3"], "new_datarequest", {"id": "dr3"}),
+            ],
+            send_notifications_mock.call_args_list,
+        )
+        # Every batch is sent over its own connection and marked as delivered
+        # once it has been sent. Claims are committed before sending them
+        self.assertEquals(2, self.mail_mock.SMTPSender.call_count)
+        self.assertEquals(2, self.mail_mock.SMTPSender.return_value.__exit__.call_count)
+        self.assertEquals(5, self.model_mock.Session.commit.call_count)
+        for batch in batches:
+            for notification in batch:
+                self.assertIsNotNone(notification.delivered)
+
+    @parameterized.expand(
+        [
+            (0, False),
+            (3, False),
+            (4, True),
+        ]
+    )
+    @patch("ckanext.datarequests.notifications.datetime")
+    @patch("ckanext.datarequests.notifications.db")
+    def test_send_pending_notifications_error(
+        self, attempts, gives_up, db_mock, datetime_mock
+    ):
+        now = datetime.datetime(2015, 1, 1)
+        datetime_mock.datetime.utcnow.return_value = now
+        users = self._set_users("user1", "user2")
+        sender = self.mail_mock.SMTPSender.return_value.__enter__.return_value
+
+        # The mail cannot be sent to the second user
+        def send(name, email, subject, body):
+            if email == users[1].email:
+                raise Exception()
+
+        sender.send.side_effect = send
+
+        notification = MagicMock()
+        notification.user_ids = json.dumps(["user1", "user2"])
+        notification.action_type = "new_comment"
+        notification.datarequest = json.dumps({"id": "dr1"})
+        notification.attempts = attempts
+        notification.delivered = None
+        notification.failed = None
+        notification.claimed_until = None
+        db_mock.Notification.claim.side_effect = [[notification], []]
+
+        result = notifications.send_pending_notifications()
+
+        # The notification is left pending for the user that has not received
+        # it and it's not claimed again until the lease expires. It's marked
+        # as failed after 5 attempts
+        self.assertEquals(0, result)
+        self.assertIsNone(notification.delivered)
+        self.assertEquals(["user2"], json.loads(notification.user_ids))
+        self.assertEquals(attempts + 1, notification.attempts)
+        if gives_up:
+            self.assertEquals(now, notification.failed)
+            self.assertIsNone(notification.claimed_until)
+        else:
+            self.assertIsNone(notification.failed)
+            self.assertEquals(now + notifications.LEASE, notification.claimed_until)
+        self.assertEquals(3, self.model_mock.Session.commit.call_count)
+
+    def test_enqueue_notifications(self):
+        notifications.enqueue_notifications()
+
+        self.tk_mock.enqueue_job.assert_called_once_with(
+            notifications.send_pending_notifications,
+            title="datarequests notifications",
+        )
+
+    @patch("ckanext.datarequests.notifications._get_executor")
+    def test_enqueue_notifications_without_jobs_queue(self, get_executor_mock):
+        self.tk_mock.enqueue_job.side_effect = Exception("Redis is not available")
+
+        notifications.enqueue_notifications()
+
+        get_executor_mock.return_value.submit.assert_called_once_with(
+            notifications._send_pending_notifications_in_thread, None
+        )
+
+    @patch("ckanext.datarequests.notifications.send_pending_notifications")
+    def test_send_pending_notifications_in_thread(self, send_pending_mock):
+        app = MagicMock()
+
+        notifications._send_pending_notifications_in_thread(app)
+
+        app.app_context.assert_called_once_with()
+        send_pending_mock.assert_called_once_with()
+        self.model_mock.Session.remove.assert_called_once_with()
+
+    @patch("ckanext.datarequests.notifications.send_pending_notifications")
+    def test_send_pending_notifications_in_thread_error(self, send_pending_mock):
+        send_pending_mock.side_effect = Exception()
+
+        notifications._send_pending_notifications_in_thread(None)
+
+        self.model_mock.Session.remove.assert_called_once_with()
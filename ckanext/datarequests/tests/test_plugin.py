@@ -23,7 +23,7 @@ from nose_parameterized import parameterized
 import ckanext.datarequests.constants as constants
 import ckanext.datarequests.plugin as plugin
 
-TOTAL_ACTIONS = 13
+TOTAL_ACTIONS = 14
 COMMENTS_ACTIONS = 5
 ACTIONS_NO_COMMENTS = TOTAL_ACTIONS - COMMENTS_ACTIONS
 
@@ -48,9 +48,6 @@ class DataRequestPluginTest(unittest.TestCase):
         self.partial_patch = patch("ckanext.datarequests.plugin.partial")
         self.partial_mock = self.partial_patch.start()
 
-        self.h_patch = patch("ckanext.datarequests.plugin.h")
-        self.h_mock = self.h_patch.start()
-
         self.create_datarequest = constants.CREATE_DATAREQUEST
         self.show_datarequest = constants.SHOW_DATAREQUEST
         self.update_datarequest = constants.UPDATE_DATAREQUEST
@@ -63,6 +60,7 @@ class DataRequestPluginTest(unittest.TestCase):
         self.delete_datarequest_comment = constants.DELETE_DATAREQUEST_COMMENT
         self.follow_datarequest = constants.FOLLOW_DATAREQUEST
         self.unfollow_datarequest = constants.UNFOLLOW_DATAREQUEST
+        self.datarequest_changes = constants.DATAREQUEST_CHANGES
 
     def tearDown(self):
         self.actions_patch.stop()
@@ -71,7 +69,6 @@ class DataRequestPluginTest(unittest.TestCase):
         self.config_patch.stop()
         self.helpers_patch.stop()
         self.partial_patch.stop()
-        self.h_patch.stop()
 
     @parameterized.expand([("True",), ("False",)])
     def test_get_actions(self, comments_enabled):
@@ -109,6 +106,9 @@ class DataRequestPluginTest(unittest.TestCase):
         self.assertEquals(
             plugin.actions.unfollow_datarequest, actions[self.unfollow_datarequest]
         )
+        self.assertEquals(
+            plugin.actions.datarequest_changes, actions[self.datarequest_changes]
+        )
 
         if comments_enabled == "True":
             self.assertEquals(
@@ -167,6 +167,9 @@ class DataRequestPluginTest(unittest.TestCase):
         self.assertEquals(
             plugin.auth.unfollow_datarequest, auth_functions[self.unfollow_datarequest]
         )
+        self.assertEquals(
+            plugin.auth.datarequest_changes, auth_functions[self.datarequest_changes]
+        )
 
         if comments_enabled == "True":
             self.assertEquals(
@@ -199,130 +202,154 @@ class DataRequestPluginTest(unittest.TestCase):
         self.plg_instance.update_config(config)
         plugin.tk.add_template_directory.assert_called_once_with(config, "templates")
 
-    @parameterized.expand([("True",), ("False")])
-    def test_before_map(self, comments_enabled):
+    @patch("ckanext.datarequests.plugin.model")
+    @patch("ckanext.datarequests.plugin.db")
+    def test_configure(self, db_mock, model_mock):
+        self.plg_instance = plugin.DataRequestsPlugin()
 
-        urls_set = 12
-        mapa_calls = urls_set if comments_enabled == "True" else urls_set - 2
+        self.plg_instance.configure(MagicMock())
 
-        # Configure config and get instance
-        plugin.config.get.return_value = comments_enabled
+        # The classes are mapped but the tables are not created
+        db_mock.init_db.assert_called_once_with(model_mock)
+        self.assertEquals(0, db_mock.create_tables.call_count)
+
+    @patch("ckanext.datarequests.plugin.db")
+    def test_caches_configured(self, db_mock):
+        config = {
+            "ckan.datarequests.cache.max_size": "50",
+            "ckan.datarequests.cache.ttl": "60",
+        }
+        plugin.tk.asint.side_effect = int
         self.plg_instance = plugin.DataRequestsPlugin()
 
-        mock_icon = "question-circle"
-        # get_question_icon_patch = patch(
-        #     "ckanext.datarequests.plugin.get_question_icon", return_value=mock_icon
-        # )
-        # get_question_icon_patch.start()
-        # self.addCleanup(get_question_icon_patch.stop)
+        # The caches are not sized until the plugin is configured
+        self.assertEquals(0, plugin.actions.USERS_CACHE.configure.call_count)
 
-        # Test
-        mapa = MagicMock()
-        dr_basic_path = "datarequest"
-        self.plg_instance.before_map(mapa)
+        self.plg_instance.configure(config)
 
-        self.assertEquals(mapa_calls, mapa.connect.call_count)
-        mapa.connect.assert_any_call(
-            "datarequests_index",
-            f"/{dr_basic_path}",
-            controller="datarequests",
-            action="index",
-            conditions=dict(method=["GET"]),
-        )
+        plugin.actions.USERS_CACHE.configure.assert_called_once_with(50, 60)
+        plugin.actions.ORGANIZATIONS_CACHE.configure.assert_called_once_with(50, 60)
+        plugin.actions.PACKAGES_CACHE.configure.assert_called_once_with(50, 60)
 
-        mapa.connect.assert_any_call(
-            f"/{dr_basic_path}/new",
-            controller="datarequests",
-            action="new",
-            conditions=dict(method=["GET", "POST"]),
-        )
+    def test_get_signal_subscriptions(self):
+        self.plg_instance = plugin.DataRequestsPlugin()
 
-        mapa.connect.assert_any_call(
-            "show_datarequest",
-            f"/{dr_basic_path}/{{id}}",
-            controller="datarequests",
-            action="show",
-            conditions=dict(method=["GET"]),
-            ckan_icon=mock_icon,
-        )
+        subscriptions = self.plg_instance.get_signal_subscriptions()
 
-        mapa.connect.assert_any_call(
-            f"/{dr_basic_path}/edit/{{id}}",
-            controller="datarequests",
-            action="update",
-            conditions=dict(method=["GET", "POST"]),
-        )
+        receivers = {
+            subscription["sender"]: subscription["receiver"]
+            for subscription in subscriptions[plugin.tk.signals.action_succeeded]
+        }
+        invalidate_user = plugin.actions.invalidate_cached_user
+        invalidate_organization = plugin.actions.invalidate_cached_organization
+        self.assertEquals(
+            {
+                "user_update": invalidate_user,
+                "user_delete": invalidate_user,
+                "organization_create": invalidate_organization,
+                "organization_update": invalidate_organization,
+                "organization_delete": invalidate_organization,
+                "organization_purge": invalidate_organization,
+            },
+            receivers,
+        )
+
+    @parameterized.expand([(True,), (False,)])
+    @patch("ckanext.datarequests.plugin.model")
+    def test_notify(self, is_package, model_mock):
+        self.plg_instance = plugin.DataRequestsPlugin()
+        model_mock.Package = MagicMock
+        entity = MagicMock() if is_package else object()
 
-        mapa.connect.assert_any_call(
-            f"/{dr_basic_path}/delete/{{id}}",
-            controller="datarequests",
-            action="delete",
-            conditions=dict(method=["POST"]),
-        )
+        self.plg_instance.notify(entity, "changed")
 
-        mapa.connect.assert_any_call(
-            f"/{dr_basic_path}/close/{{id}}",
-            controller="datarequests",
-            action="close",
-            conditions=dict(method=["GET", "POST"]),
-        )
+        if is_package:
+            plugin.actions.invalidate_cached_package.assert_called_once_with(entity)
+        else:
+            self.assertEquals(0, plugin.actions.invalidate_cached_package.call_count)
 
-        mapa.connect.assert_any_call(
-            "organization_datarequests",
-            f"/organization/{dr_basic_path}/{{id}}",
-            controller="datarequests",
-            action="organization_datarequests",
-            conditions=dict(method=["GET"]),
-            ckan_icon=mock_icon,
-        )
+    @parameterized.expand([("True",), ("False",)])
+    @patch("ckanext.datarequests.plugin.datarequests_bp")
+    def test_get_blueprint(self, comments_enabled, blueprint_mock):
 
-        mapa.connect.assert_any_call(
-            "user_datarequests",
-            f"/user/{dr_basic_path}/{{id}}",
-            controller="datarequests",
-            action="user_datarequests",
-            conditions=dict(method=["GET"]),
-            ckan_icon=mock_icon,
-        )
+        rules = 13 if comments_enabled == "True" else 11
 
-        mapa.connect.assert_any_call(
-            "user_datarequests",
-            f"/user/{dr_basic_path}/{{id}}",
-            controller="datarequests",
-            action="user_datarequests",
-            conditions=dict(method=["GET"]),
-            ckan_icon=mock_icon,
-        )
+        # Configure config and get instance
+        plugin.config.get.return_value = comments_enabled
+        self.plg_instance = plugin.DataRequestsPlugin()
 
-        mapa.connect(
-            f"/{dr_basic_path}/follow/{{id}}",
-            controller="datarequests",
-            action="follow",
-            conditions=dict(method=["POST"]),
-        )
+        # Test
+        self.assertEquals([blueprint_mock], self.plg_instance.get_blueprint())
 
-        mapa.connect(
-            f"/{dr_basic_path}/unfollow/{{id}}",
-            controller="datarequests",
-            action="unfollow",
-            conditions=dict(method=["POST"]),
+        dr_basic_path = "datarequest"
+        add_url_rule = blueprint_mock.add_url_rule
+        self.assertEquals(rules, add_url_rule.call_count)
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}",
+            endpoint="index",
+            view_func=plugin.ui_controller.index,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/new",
+            endpoint="new",
+            view_func=plugin.ui_controller.new,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/export",
+            endpoint="export",
+            view_func=plugin.ui_controller.export_datarequests,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/<id>",
+            endpoint="show",
+            view_func=plugin.ui_controller.show,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/edit/<id>",
+            endpoint="update",
+            view_func=plugin.ui_controller.update,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/delete/<id>",
+            endpoint="delete",
+            view_func=plugin.ui_controller.delete,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/close/<id>",
+            endpoint="close",
+            view_func=plugin.ui_controller.close,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/follow/<datarequest_id>",
+            endpoint="follow",
+            view_func=plugin.ui_controller.follow,
+        )
+        add_url_rule.assert_any_call(
+            f"/{dr_basic_path}/unfollow/<datarequest_id>",
+            endpoint="unfollow",
+            view_func=plugin.ui_controller.unfollow,
+        )
+        add_url_rule.assert_any_call(
+            f"/organization/{dr_basic_path}/<id>",
+            endpoint="organization",
+            view_func=plugin.ui_controller.organization,
+        )
+        add_url_rule.assert_any_call(
+            f"/user/{dr_basic_path}/<id>",
+            endpoint="user",
+            view_func=plugin.ui_controller.user,
         )
 
         if comments_enabled == "True":
-            mapa.connect.assert_any_call(
-                "comment_datarequest",
-                f"/{dr_basic_path}/comment/{{id}}",
-                controller="datarequests",
-                action="comment",
-                conditions=dict(method=["GET", "POST"]),
-                ckan_icon="comment",
+            add_url_rule.assert_any_call(
+                f"/{dr_basic_path}/comment/<id>",
+                endpoint="comment",
+                view_func=plugin.ui_controller.comment,
             )
-
-            mapa.connect.assert_any_call(
-                f"/{dr_basic_path}/comment/{{datarequest_id}}/delete/{{comment_id}}",
-                controller="datarequests",
-                action="delete_comment",
-                conditions=dict(method=["GET", "POST"]),
+            add_url_rule.assert_any_call(
+                f"/{dr_basic_path}/comment/<datarequest_id>/delete/<comment_id>",
+                endpoint="delete_comment",
+                view_func=plugin.ui_controller.delete_comment,
             )
 
     @parameterized.expand(
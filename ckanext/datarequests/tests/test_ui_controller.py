@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with CKAN Data Requests Extension. If not, see <http://www.gnu.org/licenses/>.
 
+
 import unittest
 
 from mock import MagicMock
@@ -24,15 +25,12 @@ import ckanext.datarequests.constants as constants
 import ckanext.datarequests.controllers.ui_controller as controller
 
 INDEX_FUNCTION = "index"
-ORGANIZATION_DATAREQUESTS_FUNCTION = "organization_datarequests"
-USER_DATAREQUESTS_FUNCTION = "user_datarequests"
+ORGANIZATION_DATAREQUESTS_FUNCTION = "organization"
+USER_DATAREQUESTS_FUNCTION = "user"
 
 
 class UIControllerTest(unittest.TestCase):
     def setUp(self):
-        self._plugins = controller.plugins
-        controller.plugins = MagicMock()
-
         self._tk = controller.tk
         controller.tk = MagicMock()
         controller.tk._ = self._tk._
@@ -40,44 +38,54 @@ class UIControllerTest(unittest.TestCase):
         controller.tk.NotAuthorized = self._tk.NotAuthorized
         controller.tk.ObjectNotFound = self._tk.ObjectNotFound
 
-        self._c = controller.c
-        controller.c = MagicMock()
+        self._g = controller.g
+        controller.g = MagicMock()
 
         self._request = controller.request
         controller.request = MagicMock()
+        controller.request.method = "GET"
+        controller.request.args = {}
+        controller.request.form = {}
 
         self._model = controller.model
         controller.model = MagicMock()
 
-        self._request = controller.request
-        controller.request = MagicMock()
-
         self._helpers = controller.helpers
         controller.helpers = MagicMock()
 
-        self._base = controller.base
-        controller.base = MagicMock()
+        self._h = controller.h
+        controller.h = MagicMock()
+
+        self._export = controller.export
+        controller.export = MagicMock()
+        controller.export.FORMATS = self._export.FORMATS
+        controller.export.CONTENT_TYPES = self._export.CONTENT_TYPES
+
+        self._response = controller.Response
+        controller.Response = MagicMock()
+
+        self._stream_with_context = controller.stream_with_context
+        controller.stream_with_context = MagicMock()
 
         self._datarequests_per_page = controller.constants.DATAREQUESTS_PER_PAGE
 
         self.expected_context = {
             "model": controller.model,
             "session": controller.model.Session,
-            "user": controller.c.user,
-            "auth_user_obj": controller.c.userobj,
+            "user": controller.g.user,
+            "auth_user_obj": controller.g.userobj,
         }
 
-        self.controller_instance = controller.DataRequestsUI()
-
     def tearDown(self):
-        controller.plugins = self._plugins
         controller.tk = self._tk
-        controller.c = self._c
+        controller.g = self._g
         controller.request = self._request
         controller.model = self._model
-        controller.request = self._request
         controller.helpers = self._helpers
-        controller.base = self._base
+        controller.h = self._h
+        controller.export = self._export
+        controller.Response = self._response
+        controller.stream_with_context = self._stream_with_context
         controller.constants.DATAREQUESTS_PER_PAGE = self._datarequests_per_page
 
     ######################################################################
@@ -101,7 +109,6 @@ class UIControllerTest(unittest.TestCase):
             403, f"You are not authorized to {action} the Data Request {datarequest_id}"
         )
         self.assertEquals(0, controller.tk.render.call_count)
-        self.assertIsNone(result)
 
     def _test_not_found(self, function, get_action_func):
         datarequest_id = "example_uuidv4"
@@ -128,23 +135,26 @@ class UIControllerTest(unittest.TestCase):
         self.assertEquals(0, controller.tk.render.call_count)
         self.assertIsNone(result)
 
+    def _url_for(self, endpoint, id=None):
+        # Like Flask, URLs cannot be built without the ID of the data request
+        if id is None:
+            raise Exception("Could not build url for endpoint")
+
+        return f"/datarequest/{id}"
+
     ######################################################################
     ################################# NEW ################################
     ######################################################################
 
     @parameterized.expand([(True,), (False,)])
     def test_new_no_post(self, authorized):
-        controller.tk.response.location = None
-        controller.tk.response.status_int = 200
-        controller.request.POST = {}
-
         # Raise exception if the user is not authorized to create a new data request
         if not authorized:
             controller.tk.check_access.side_effect = controller.tk.NotAuthorized(
                 "User not authorized"
             )
 
-        result = self.controller_instance.new()
+        result = controller.new()
 
         controller.tk.check_access.assert_called_once_with(
             constants.CREATE_DATAREQUEST, self.expected_context, None
@@ -160,15 +170,15 @@ class UIControllerTest(unittest.TestCase):
             )
             self.assertEquals(0, controller.tk.render.call_count)
 
-        self.assertIsNone(controller.tk.response.location)
-        self.assertEquals(200, controller.tk.response.status_int)
-        self.assertEquals({}, controller.c.errors)
-        self.assertEquals({}, controller.c.errors_summary)
-        self.assertEquals({}, controller.c.datarequest)
+        self.assertEquals(0, controller.tk.get_action.call_count)
+        self.assertEquals({}, controller.g.errors)
+        self.assertEquals({}, controller.g.errors_summary)
+        self.assertEquals({}, controller.g.datarequest)
 
     @parameterized.expand([(False, False), (True, False), (True, True)])
     def test_new_post_content(self, authorized, validation_error):
         datarequest_id = "this-represents-an-uuidv4()"
+        controller.h.url_for.side_effect = self._url_for
 
         # Raise exception if the user is not authorized to create a new data request
         if not authorized:
@@ -186,12 +196,13 @@ class UIControllerTest(unittest.TestCase):
             action.return_value = {"id": datarequest_id}
 
         # Create the request
-        request_data = controller.request.POST = {
+        controller.request.method = "POST"
+        request_data = controller.request.form = {
             "title": "Example Title",
             "description": "Example Description",
             "organization_id": "organization uuid4",
         }
-        result = self.controller_instance.new()
+        result = controller.new()
 
         # Authorize function has been called
         controller.tk.check_access.assert_called_once_with(
@@ -200,39 +211,42 @@ class UIControllerTest(unittest.TestCase):
 
         if authorized:
             self.assertEquals(0, controller.tk.abort.call_count)
-            self.assertEquals(controller.tk.render.return_value, result)
-            controller.tk.render.assert_called_once_with("datarequests/new.html")
-
-            controller.tk.get_action.return_value.assert_called_once_with(
-                self.expected_context, request_data
+            controller.tk.get_action.assert_called_once_with(
+                constants.CREATE_DATAREQUEST
             )
+            action.assert_called_once_with(self.expected_context, request_data)
 
             if validation_error:
+                # The form is rendered again with the errors
                 errors_summary = {}
                 for key, error in action.side_effect.error_dict.items():
                     errors_summary[key] = ", ".join(error)
 
-                self.assertEquals(action.side_effect.error_dict, controller.c.errors)
+                self.assertEquals(action.side_effect.error_dict, controller.g.errors)
                 expected_request_data = request_data.copy()
                 expected_request_data["id"] = ""
-                self.assertEquals(expected_request_data, controller.c.datarequest)
-                self.assertEquals(errors_summary, controller.c.errors_summary)
+                self.assertEquals(expected_request_data, controller.g.datarequest)
+                self.assertEquals(errors_summary, controller.g.errors_summary)
+                self.assertEquals(controller.tk.render.return_value, result)
+                controller.tk.render.assert_called_once_with("datarequests/new.html")
+                self.assertEquals(0, controller.h.redirect_to.call_count)
             else:
-                self.assertEquals({}, controller.c.errors)
-                self.assertEquals({}, controller.c.errors_summary)
-                self.assertEquals({}, controller.c.datarequest)
-                controller.helpers.url_for.assert_called_once_with(
-                    controller="datarequests",
-                    action="show",
-                    id=datarequest_id,
+                self.assertEquals({}, controller.g.errors)
+                self.assertEquals({}, controller.g.errors_summary)
+                self.assertEquals({}, controller.g.datarequest)
+                controller.h.url_for.assert_called_once_with(
+                    "datarequests_show", id=datarequest_id
                 )
-                controller.tk.redirect_to.assert_called_once_with(
-                    controller.helpers.url_for.return_value
+                controller.h.redirect_to.assert_called_once_with(
+                    f"/datarequest/{datarequest_id}"
                 )
+                self.assertEquals(controller.h.redirect_to.return_value, result)
+                self.assertEquals(0, controller.tk.render.call_count)
         else:
             controller.tk.abort.assert_called_once_with(
                 403, "Unauthorized to create a Data Request"
             )
+            self.assertEquals(0, action.call_count)
             self.assertEquals(0, controller.tk.render.call_count)
 
     ######################################################################
@@ -240,90 +254,24 @@ class UIControllerTest(unittest.TestCase):
     ######################################################################
 
     def test_show_not_authorized(self):
-        self._test_not_authorized(
-            self.controller_instance.show, "view", constants.SHOW_DATAREQUEST
-        )
+        self._test_not_authorized(controller.show, "view", constants.SHOW_DATAREQUEST)
 
     def test_show_not_found(self):
-        self._test_not_found(self.controller_instance.show, constants.SHOW_DATAREQUEST)
-
-    @parameterized.expand(
-        {
-            (False, False, None),
-            (False, True, None),
-            (True, False, None),
-            (True, True, None),
-            (False, False, "uudiv4", False),
-            (False, True, "uudiv4", False),
-            (True, False, "uudiv4", False),
-            (True, True, "uudiv4", False),
-            (False, False, "uudiv4", True),
-            (False, True, "uudiv4", True),
-            (True, False, "uudiv4", True),
-            (True, True, "uudiv4", True),
-        }
-    )
-    def test_show_found(
-        self,
-        user_show_exception,
-        organization_show_exception,
-        accepted_dataset,
-        package_show_exception=False,
-    ):
+        self._test_not_found(controller.show, constants.SHOW_DATAREQUEST)
 
+    def test_show_found(self):
         datarequest_id = "example_uuidv4"
-        default_user = {"display_name": "User Display Name"}
-        default_organization = {"display_name": "Organization Name"}
-        default_package = {"title": "Package"}
-
-        show_datarequest = MagicMock(
-            return_value={
-                "id": "example_uuidv4",
-                "user_id": "example_uuidv4_user",
-                "organization_id": "example_uuidv4_organization",
-                "accepted_dataset_id": accepted_dataset,
-                "user": default_user,
-                "organization": default_organization,
-                "accepted_dataset": default_package,
-            }
-        )
-
-        def _user_show(context, data_request):
-            if user_show_exception:
-                raise controller.tk.ObjectNotFound("User not Found")
-            else:
-                return default_user
-
-        def _organization_show(context, data_request):
-            if organization_show_exception:
-                raise controller.tk.ObjectNotFound("Organization not Found")
-            else:
-                return default_organization
-
-        def _package_show(context, data_request):
-            if package_show_exception:
-                raise controller.tk.ObjectNotFound("Package nof Found")
-            else:
-                return default_package
-
-        user_show = MagicMock(side_effect=_user_show)
-        organization_show = MagicMock(side_effect=_organization_show)
-        package_show = MagicMock(side_effect=_package_show)
-
-        def _get_action(action):
-            if action == "show_datarequest":
-                return show_datarequest
-            elif action == "user_show":
-                return user_show
-            elif action == "organization_show":
-                return organization_show
-            elif action == "package_show":
-                return package_show
-
-        controller.tk.get_action.side_effect = _get_action
+        show_datarequest = controller.tk.get_action.return_value
+        show_datarequest.return_value = {
+            "id": datarequest_id,
+            "user_id": "example_uuidv4_user",
+            "organization_id": "example_uuidv4_organization",
+            "user": {"display_name": "User Display Name"},
+            "organization": {"display_name": "Organization Name"},
+        }
 
         # Call the function
-        result = self.controller_instance.show(datarequest_id)
+        result = controller.show(datarequest_id)
 
         # Authorize function has been called
         controller.tk.check_access.assert_called_once_with(
@@ -331,14 +279,11 @@ class UIControllerTest(unittest.TestCase):
         )
 
         # Assertions
-        expected_datarequest = show_datarequest.return_value.copy()
-        if not user_show_exception:
-            expected_datarequest["user"] = default_user
-        if not organization_show_exception:
-            expected_datarequest["organization"] = default_organization
-        if not package_show_exception and accepted_dataset:
-            expected_datarequest["accepted_dataset"] = default_package
-        self.assertEquals(expected_datarequest, controller.c.datarequest)
+        controller.tk.get_action.assert_called_once_with(constants.SHOW_DATAREQUEST)
+        show_datarequest.assert_called_once_with(
+            self.expected_context, {"id": datarequest_id}
+        )
+        self.assertEquals(show_datarequest.return_value, controller.g.datarequest)
         controller.tk.render.assert_called_once_with("datarequests/show.html")
         self.assertEquals(controller.tk.render.return_value, result)
 
@@ -348,26 +293,20 @@ class UIControllerTest(unittest.TestCase):
 
     def test_update_not_authorized(self):
         self._test_not_authorized(
-            self.controller_instance.update, "update", constants.UPDATE_DATAREQUEST
+            controller.update, "update", constants.UPDATE_DATAREQUEST
         )
 
     def test_update_not_found(self):
-        self._test_not_found(
-            self.controller_instance.update, constants.UPDATE_DATAREQUEST
-        )
+        self._test_not_found(controller.update, constants.SHOW_DATAREQUEST)
 
     def test_update_no_post_content(self):
-        controller.tk.response.location = None
-        controller.tk.response.status_int = 200
-        controller.request.POST = {}
-
         datarequest_id = "example_uuidv4"
         datarequest = {"id": "uuid4", "user_id": "user_uuid4", "title": "example_title"}
         show_datarequest = controller.tk.get_action.return_value
         show_datarequest.return_value = datarequest
 
         # Call the function
-        result = self.controller_instance.update(datarequest_id)
+        result = controller.update(datarequest_id)
 
         # Authorize function has been called
         controller.tk.check_access.assert_called_once_with(
@@ -375,19 +314,19 @@ class UIControllerTest(unittest.TestCase):
         )
 
         # Assertions
+        controller.tk.get_action.assert_called_once_with(constants.SHOW_DATAREQUEST)
         controller.tk.render.assert_called_once_with("datarequests/edit.html")
         self.assertEquals(result, controller.tk.render.return_value)
 
-        self.assertIsNone(controller.tk.response.location)
-        self.assertEquals(200, controller.tk.response.status_int)
-        self.assertEquals({}, controller.c.errors)
-        self.assertEquals({}, controller.c.errors_summary)
-        self.assertEquals(datarequest, controller.c.datarequest)
-        self.assertEquals(datarequest["title"], controller.c.original_title)
+        self.assertEquals({}, controller.g.errors)
+        self.assertEquals({}, controller.g.errors_summary)
+        self.assertEquals(datarequest, controller.g.datarequest)
+        self.assertEquals(datarequest["title"], controller.g.original_title)
 
     @parameterized.expand([(False, False), (True, False), (True, True)])
     def test_update_post_content(self, authorized, validation_error):
         datarequest_id = "this-represents-an-uuidv4()"
+        controller.h.url_for.side_effect = self._url_for
 
         original_dr = {
             "id": datarequest_id,
@@ -402,7 +341,7 @@ class UIControllerTest(unittest.TestCase):
         def _get_action(action):
             if action == constants.SHOW_DATAREQUEST:
                 return show_datarequest
-            else:
+            elif action == constants.UPDATE_DATAREQUEST:
                 return update_datarequest
 
         controller.tk.get_action.side_effect = _get_action
@@ -422,13 +361,14 @@ class UIControllerTest(unittest.TestCase):
             update_datarequest.return_value = {"id": datarequest_id}
 
         # Create the request
-        request_data = controller.request.POST = {
+        controller.request.method = "POST"
+        request_data = controller.request.form = {
             "id": datarequest_id,
             "title": "Example Title",
             "description": "Example Description",
             "organization_id": "organization uuid4",
         }
-        result = self.controller_instance.update(datarequest_id)
+        result = controller.update(datarequest_id)
 
         # Authorize function has been called
         controller.tk.check_access.assert_called_once_with(
@@ -437,8 +377,6 @@ class UIControllerTest(unittest.TestCase):
 
         if authorized:
             self.assertEquals(0, controller.tk.abort.call_count)
-            self.assertEquals(controller.tk.render.return_value, result)
-            controller.tk.render.assert_called_once_with("datarequests/edit.html")
 
             show_datarequest.assert_called_once_with(
                 self.expected_context, {"id": datarequest_id}
@@ -448,35 +386,38 @@ class UIControllerTest(unittest.TestCase):
             )
 
             if validation_error:
+                # The form is rendered again with the errors
                 errors_summary = {}
                 for key, error in update_datarequest.side_effect.error_dict.items():
                     errors_summary[key] = ", ".join(error)
 
                 self.assertEquals(
-                    update_datarequest.side_effect.error_dict, controller.c.errors
+                    update_datarequest.side_effect.error_dict, controller.g.errors
                 )
-                expected_request_data = request_data.copy()
-                expected_request_data["id"] = datarequest_id
-                self.assertEquals(expected_request_data, controller.c.datarequest)
-                self.assertEquals(errors_summary, controller.c.errors_summary)
-                self.assertEquals(original_dr["title"], controller.c.original_title)
+                self.assertEquals(request_data, controller.g.datarequest)
+                self.assertEquals(errors_summary, controller.g.errors_summary)
+                self.assertEquals(original_dr["title"], controller.g.original_title)
+                self.assertEquals(controller.tk.render.return_value, result)
+                controller.tk.render.assert_called_once_with("datarequests/edit.html")
+                self.assertEquals(0, controller.h.redirect_to.call_count)
             else:
-                self.assertEquals({}, controller.c.errors)
-                self.assertEquals({}, controller.c.errors_summary)
-                self.assertEquals(original_dr, controller.c.datarequest)
-                controller.helpers.url_for.assert_called_once_with(
-                    controller="datarequests",
-                    action="show",
-                    id=datarequest_id,
+                self.assertEquals({}, controller.g.errors)
+                self.assertEquals({}, controller.g.errors_summary)
+                self.assertEquals(original_dr, controller.g.datarequest)
+                controller.h.url_for.assert_called_once_with(
+                    "datarequests_show", id=datarequest_id
                 )
-                controller.tk.redirect_to.assert_called_once_with(
-                    controller.helpers.url_for.return_value
+                controller.h.redirect_to.assert_called_once_with(
+                    f"/datarequest/{datarequest_id}"
                 )
+                self.assertEquals(controller.h.redirect_to.return_value, result)
+                self.assertEquals(0, controller.tk.render.call_count)
         else:
             controller.tk.abort.assert_called_once_with(
                 403,
                 f"You are not authorized to update the Data Request {datarequest_id}",
             )
+            self.assertEquals(0, update_datarequest.call_count)
             self.assertEquals(0, controller.tk.render.call_count)
 
     ######################################################################
@@ -488,10 +429,10 @@ class UIControllerTest(unittest.TestCase):
             "User is not authorized"
         )
         organization_name = "org"
-        controller.request.GET = {"organization": organization_name}
+        controller.request.args = {"organization": organization_name}
 
         # Call the function
-        result = self.controller_instance.index()
+        result = controller.index()
 
         # Assertions
         expected_data_req = {
@@ -511,10 +452,10 @@ class UIControllerTest(unittest.TestCase):
         self.assertIsNone(result)
 
     def test_index_invalid_page(self):
-        controller.request.GET = controller.request.params = {"page": "2a"}
+        controller.request.args = {"page": "2a"}
 
         # Call the function
-        result = self.controller_instance.index()
+        result = controller.index()
 
         # Assertions
         controller.tk.abort.assert_called_once_with(
@@ -525,57 +466,72 @@ class UIControllerTest(unittest.TestCase):
         self.assertEquals(0, controller.tk.render.call_count)
         self.assertIsNone(result)
 
+    def test_index_invalid_cursor(self):
+        controller.request.args = {"cursor": "invalid"}
+        controller.tk.get_action.return_value.side_effect = (
+            controller.tk.ValidationError({"cursor": ["Invalid cursor"]})
+        )
+
+        # Call the function
+        result = controller.index()
+
+        # Assertions
+        controller.tk.abort.assert_called_once_with(
+            400, '"cursor" parameter is not valid'
+        )
+        self.assertEquals(0, controller.tk.render.call_count)
+        self.assertIsNone(result)
+
     @parameterized.expand(
         [
             (INDEX_FUNCTION, "1", "conwet", "", 0, 10),
             (INDEX_FUNCTION, "2", "conwet", "", 10, 10),
             (INDEX_FUNCTION, "7", "conwet", "", 60, 10),
             (INDEX_FUNCTION, "1", "conwet", "", 0, 25, 25),
-            (INDEX_FUNCTION, "2", "conwet", "", 25, 25, 25),
             (INDEX_FUNCTION, "7", "conwet", "", 150, 25, 25),
             (INDEX_FUNCTION, "5", None, "", 40, 10),
-            (INDEX_FUNCTION, "1", None, "", 0, 10, 10, "asc"),
-            (INDEX_FUNCTION, "1", None, "", 0, 10, 10, "desc"),
-            (INDEX_FUNCTION, "1", None, "", 0, 10, 10, "invalid"),
-            (INDEX_FUNCTION, "1", None, "", 0, 10, 10, None, "free-text"),
+            (INDEX_FUNCTION, None, None, "", 0, 10, 10, "asc"),
+            (INDEX_FUNCTION, None, None, "", 0, 10, 10, "desc"),
+            (INDEX_FUNCTION, None, None, "", 0, 10, 10, "invalid"),
+            (INDEX_FUNCTION, None, None, "", 0, 10, 10, None, "free-text"),
+            (INDEX_FUNCTION, None, None, "", 0, 10, 10, "relevance", "free-text"),
+            (INDEX_FUNCTION, None, None, "", 0, 10, 10, "relevance"),
+            (INDEX_FUNCTION, None, "conwet", "", 0, 10, 10, None, None, "cursor"),
+            (INDEX_FUNCTION, None, None, "", 0, 10, 10, None, None, None, "closed"),
             (ORGANIZATION_DATAREQUESTS_FUNCTION, "1", "conwet", "", 0, 10),
             (ORGANIZATION_DATAREQUESTS_FUNCTION, "2", "conwet", "", 10, 10),
-            (ORGANIZATION_DATAREQUESTS_FUNCTION, "7", "conwet", "", 60, 10),
-            (ORGANIZATION_DATAREQUESTS_FUNCTION, "1", "conwet", "", 0, 25, 25),
-            (ORGANIZATION_DATAREQUESTS_FUNCTION, "2", "conwet", "", 25, 25, 25),
             (ORGANIZATION_DATAREQUESTS_FUNCTION, "7", "conwet", "", 150, 25, 25),
-            (ORGANIZATION_DATAREQUESTS_FUNCTION, "1", "conwet", "", 0, 10, 10, "asc"),
-            (ORGANIZATION_DATAREQUESTS_FUNCTION, "1", "conwet", "", 0, 10, 10, "desc"),
+            (ORGANIZATION_DATAREQUESTS_FUNCTION, None, "conwet", "", 0, 10, 10, "asc"),
             (
                 ORGANIZATION_DATAREQUESTS_FUNCTION,
-                "1",
+                None,
                 "conwet",
                 "",
                 0,
                 10,
                 10,
-                "invalid",
-                "",
+                None,
+                "free-text",
+                "cursor",
+                "open",
             ),
+            (USER_DATAREQUESTS_FUNCTION, "1", "conwet", "ckan", 0, 10),
+            (USER_DATAREQUESTS_FUNCTION, "1", "", "ckan", 0, 10),
+            (USER_DATAREQUESTS_FUNCTION, "7", "", "ckan", 150, 25, 25),
+            (USER_DATAREQUESTS_FUNCTION, None, "", "ckan", 0, 10, 10, "invalid"),
+            (USER_DATAREQUESTS_FUNCTION, None, "", "ckan", 0, 10, 10, "relevance"),
             (
-                ORGANIZATION_DATAREQUESTS_FUNCTION,
-                "1",
+                USER_DATAREQUESTS_FUNCTION,
+                None,
                 "conwet",
-                "",
+                "ckan",
                 0,
                 10,
                 10,
-                None,
+                "asc",
                 "free-text",
+                "cursor",
             ),
-            (USER_DATAREQUESTS_FUNCTION, "1", "conwet", "ckan", 0, 10),
-            (USER_DATAREQUESTS_FUNCTION, "1", "", "ckan", 0, 10),
-            (USER_DATAREQUESTS_FUNCTION, "7", "conwet", "ckan", 60, 10),
-            (USER_DATAREQUESTS_FUNCTION, "7", "", "ckan", 150, 25, 25),
-            (USER_DATAREQUESTS_FUNCTION, "1", "", "ckan", 0, 10, 10, "asc"),
-            (USER_DATAREQUESTS_FUNCTION, "1", "", "ckan", 0, 10, 10, "desc"),
-            (USER_DATAREQUESTS_FUNCTION, "1", "", "ckan", 0, 10, 10, "invalid"),
-            (USER_DATAREQUESTS_FUNCTION, "1", "", "ckan", 0, 10, 10, None, "free-text"),
         ]
     )
     def test_index_organization_user_dr(
@@ -589,12 +545,15 @@ class UIControllerTest(unittest.TestCase):
         datarequests_per_page=10,
         sort=None,
         query=None,
+        cursor=None,
+        state=None,
     ):
         params = {}
         user_show_action = "user_show"
         organization_show_action = "organization_show"
         base_url = "http://someurl.com/somepath/otherpath"
-        expected_sort = sort if sort and sort in ["asc", "desc"] else "desc"
+        valid_sorts = ["asc", "desc", "relevance"] if query else ["asc", "desc"]
+        expected_sort = sort if sort in valid_sorts else "desc"
 
         # Expected data_dict
         expected_data_dict = {
@@ -606,15 +565,21 @@ class UIControllerTest(unittest.TestCase):
         if query:
             expected_data_dict["q"] = query
 
+        if cursor:
+            expected_data_dict["cursor"] = cursor
+
+        if state:
+            expected_data_dict["closed"] = state == "closed"
+
         # Set datarequests_per_page
         constants.DATAREQUESTS_PER_PAGE = datarequests_per_page
 
         # Get parameters
-        controller.request.GET = controller.request.params = {}
+        controller.request.args = {}
 
         # Set page
         if page:
-            controller.request.GET["page"] = page
+            controller.request.args["page"] = page
 
         # Set the organization in the correct place depending on the function
         if func == ORGANIZATION_DATAREQUESTS_FUNCTION:
@@ -626,24 +591,37 @@ class UIControllerTest(unittest.TestCase):
                 expected_data_dict["user_id"] = user
 
             if organization:
-                controller.request.GET["organization"] = organization
+                controller.request.args["organization"] = organization
                 expected_data_dict["organization_id"] = organization
 
         if sort:
-            controller.request.GET["sort"] = sort
+            controller.request.args["sort"] = sort
 
         if query:
-            controller.request.GET["q"] = query
+            controller.request.args["q"] = query
+
+        if cursor:
+            controller.request.args["cursor"] = cursor
+
+        if state:
+            controller.request.args["state"] = state
 
         # Mocking
         user_show = MagicMock()
         organization_show = MagicMock()
         list_datarequests = MagicMock()
+        list_datarequests.return_value = {
+            "count": 30,
+            "result": [{"id": "dr1"}, {"id": "dr2"}],
+            "facets": {"state": {"items": []}},
+            "next_cursor": "next",
+            "previous_cursor": "previous" if cursor else None,
+        }
 
         def _get_action(action):
             if action == organization_show_action:
                 return organization_show
-            elif action == "user_show":
+            elif action == user_show_action:
                 return user_show
             else:
                 return list_datarequests
@@ -652,7 +630,7 @@ class UIControllerTest(unittest.TestCase):
         controller.helpers.url_for.return_value = base_url
 
         # Call the function
-        function = getattr(self.controller_instance, func)
+        function = getattr(controller, func)
         result = function(**params)
 
         # Assertions
@@ -671,7 +649,7 @@ class UIControllerTest(unittest.TestCase):
             self.assertEquals(2, controller.tk.get_action.call_count)
             controller.tk.get_action.assert_any_call(constants.LIST_DATAREQUESTS)
             controller.tk.get_action.assert_any_call(organization_show_action)
-            self.assertEquals(organization_show.return_value, controller.c.group_dict)
+            self.assertEquals(organization_show.return_value, controller.g.group_dict)
             organization_show.assert_called_once_with(
                 self.expected_context, {"id": organization}
             )
@@ -680,51 +658,60 @@ class UIControllerTest(unittest.TestCase):
             self.assertEquals(2, controller.tk.get_action.call_count)
             controller.tk.get_action.assert_any_call(constants.LIST_DATAREQUESTS)
             controller.tk.get_action.assert_any_call(user_show_action)
-            self.assertEquals(user_show.return_value, controller.c.user_dict)
+            self.assertEquals(user_show.return_value, controller.g.user_dict)
             user_show.assert_called_once_with(
                 self.expected_context, {"id": user, "include_num_followers": True}
             )
             expected_render_page = "user/datarequests.html"
 
-        # Check the values put in c
+        # Check the values put in g
         list_datarequests.assert_called_once_with(
             self.expected_context, expected_data_dict
         )
         expected_response = list_datarequests.return_value
-        self.assertEquals(expected_response["count"], controller.c.datarequest_count)
-        self.assertEquals(expected_response["result"], controller.c.datarequests)
-        self.assertEquals(expected_response["facets"], controller.c.search_facets)
-        self.assertEquals(controller.helpers.Page.return_value, controller.c.page)
-
-        # Check the pager
-        page_arguments = controller.helpers.Page.call_args[1]
-        self.assertEquals(datarequests_per_page, page_arguments["items_per_page"])
-        self.assertEquals(int(page), page_arguments["page"])
-        self.assertEquals(expected_response["count"], page_arguments["item_count"])
-        self.assertEquals(expected_response["result"], page_arguments["collection"])
-        silly_page = 72
-        query_param = f"q={query}&" if query else ""
-        self.assertEquals(
-            f"{base_url}?{query_param}sort={expected_sort}&page={silly_page}",
-            page_arguments["url"](q=query, page=silly_page),
-        )
+        self.assertEquals(expected_response["count"], controller.g.datarequest_count)
+        self.assertEquals(expected_response["result"], controller.g.datarequests)
+        self.assertEquals(expected_response["facets"], controller.g.search_facets)
+        self.assertEquals(expected_sort, controller.g.sort)
+        self.assertEquals(query or "", controller.g.q)
+
+        # Results can only be sorted by relevance when there is a free text
+        expected_filters = [("Newest", "desc"), ("Oldest", "asc")]
+        if query:
+            expected_filters.insert(0, ("Relevance", "relevance"))
+        self.assertEquals(expected_filters, controller.g.filters)
+
+        # Pages are navigated with the cursors
+        expected_params = f"q={query}&" if query else ""
+        if state:
+            expected_params += f"state={state}&"
+        if func != ORGANIZATION_DATAREQUESTS_FUNCTION and organization:
+            expected_params += f"organization={organization}&"
+        expected_params += f"sort={expected_sort}&cursor="
+        self.assertEquals(f"{base_url}?{expected_params}next", controller.g.next_url)
+        if cursor:
+            self.assertEquals(
+                f"{base_url}?{expected_params}previous", controller.g.previous_url
+            )
+        else:
+            self.assertIsNone(controller.g.previous_url)
 
         # When URL function is called, helpers.url_for is called to get the final URL
         if func == INDEX_FUNCTION:
-            controller.helpers.url_for.assert_called_once_with(
+            controller.helpers.url_for.assert_called_with(
                 controller="datarequests",
                 action="index",
             )
         elif func == ORGANIZATION_DATAREQUESTS_FUNCTION:
-            controller.helpers.url_for.assert_called_once_with(
+            controller.helpers.url_for.assert_called_with(
                 controller="datarequests",
-                action="organization_datarequests",
+                action="organization",
                 id=organization,
             )
         elif func == USER_DATAREQUESTS_FUNCTION:
-            controller.helpers.url_for.assert_called_once_with(
+            controller.helpers.url_for.assert_called_with(
                 controller="datarequests",
-                action="user_datarequests",
+                action="user",
                 id=user,
             )
 
@@ -734,17 +721,94 @@ class UIControllerTest(unittest.TestCase):
         if func != ORGANIZATION_DATAREQUESTS_FUNCTION:
             expected_facet_titles["organization"] = controller.tk._("Organizations")
 
-        self.assertEquals(expected_facet_titles, controller.c.facet_titles)
+        self.assertEquals(expected_facet_titles, controller.g.facet_titles)
 
         # Check that the render functions has been called with the suitable parameters
-        expected_user = (
-            controller.c.user_dict if hasattr(controller.c, "user_dict") else None
-        )
         self.assertEquals(controller.tk.render.return_value, result)
         controller.tk.render.assert_called_once_with(
             expected_render_page,
-            extra_vars={"user_dict": expected_user, "group_type": "organization"},
+            extra_vars={
+                "user_dict": controller.g.user_dict,
+                "group_type": "organization",
+                "group_dict": controller.g.group_dict,
+            },
+        )
+
+    ######################################################################
+    ############################### EXPORT ###############################
+    ######################################################################
+
+    @parameterized.expand([("csv",), ("jsonl",)])
+    def test_export(self, fmt):
+        controller.request.args = {
+            "format": fmt,
+            "organization_id": "conwet",
+            "closed": "true",
+            "q": "free-text",
+        }
+        controller.tk.asbool.return_value = True
+
+        # Call the function
+        result = controller.export_datarequests()
+
+        # Assertions
+        expected_data_dict = {
+            "organization_id": "conwet",
+            "user_id": None,
+            "closed": True,
+            "q": "free-text",
+        }
+        controller.tk.asbool.assert_called_once_with("true")
+        controller.tk.check_access.assert_called_once_with(
+            constants.LIST_DATAREQUESTS, self.expected_context, expected_data_dict
         )
+        controller.export.get_filters.assert_called_once_with(**expected_data_dict)
+        controller.export.export_datarequests.assert_called_once_with(
+            fmt, controller.export.get_filters.return_value
+        )
+
+        # The data requests are streamed
+        controller.stream_with_context.assert_called_once_with(
+            controller.export.export_datarequests.return_value
+        )
+        controller.Response.assert_called_once_with(
+            controller.stream_with_context.return_value,
+            mimetype=controller.export.CONTENT_TYPES[fmt],
+            headers={
+                "Content-Disposition": f'attachment; filename="datarequests.{fmt}"'
+            },
+        )
+        self.assertEquals(controller.Response.return_value, result)
+        self.assertEquals(0, controller.tk.abort.call_count)
+
+    def test_export_invalid_format(self):
+        controller.request.args = {"format": "xml"}
+        # abort raises an exception
+        controller.tk.abort.side_effect = Exception()
+
+        with self.assertRaises(Exception):
+            controller.export_datarequests()
+
+        self.assertEquals(400, controller.tk.abort.call_args[0][0])
+        self.assertEquals(0, controller.tk.check_access.call_count)
+        self.assertEquals(0, controller.Response.call_count)
+
+    @parameterized.expand(
+        [
+            (controller.tk.NotAuthorized("User not authorized"), 403),
+            (controller.tk.ObjectNotFound("Organization not found"), 404),
+        ]
+    )
+    def test_export_error(self, exception, expected_status):
+        controller.tk.check_access.side_effect = exception
+
+        # Call the function
+        result = controller.export_datarequests()
+
+        # Assertions
+        self.assertEquals(expected_status, controller.tk.abort.call_args[0][0])
+        self.assertEquals(0, controller.Response.call_count)
+        self.assertIsNone(result)
 
     ######################################################################
     ############################### DELETE ###############################
@@ -752,13 +816,11 @@ class UIControllerTest(unittest.TestCase):
 
     def test_delete_not_authorized(self):
         self._test_not_authorized(
-            self.controller_instance.delete, "delete", constants.DELETE_DATAREQUEST
+            controller.delete, "delete", constants.DELETE_DATAREQUEST
         )
 
     def test_delete_not_found(self):
-        self._test_not_found(
-            self.controller_instance.delete, constants.DELETE_DATAREQUEST
-        )
+        self._test_not_found(controller.delete, constants.DELETE_DATAREQUEST)
 
     def test_delete(self):
         datarequest_id = "example_uuidv4"
@@ -772,11 +834,7 @@ class UIControllerTest(unittest.TestCase):
         delete_datarequest.return_value = datarequest
 
         # Call the function
-        result = self.controller_instance.delete(datarequest_id)
-
-        # Assertions
-        # The result
-        self.assertIsNone(result)
+        result = controller.delete(datarequest_id)
 
         # Functions has been called
         expected_data_dict = {"id": datarequest_id}
@@ -800,6 +858,7 @@ class UIControllerTest(unittest.TestCase):
         controller.tk.redirect_to.assert_called_once_with(
             controller.helpers.url_for.return_value
         )
+        self.assertEquals(controller.tk.redirect_to.return_value, result)
 
     ######################################################################
     ################################ CLOSE ###############################
@@ -807,26 +866,39 @@ class UIControllerTest(unittest.TestCase):
 
     def test_close_not_authorized(self):
         self._test_not_authorized(
-            self.controller_instance.close, "close", constants.CLOSE_DATAREQUEST
+            controller.close, "close", constants.CLOSE_DATAREQUEST
         )
 
     def test_close_not_found(self):
-        self._test_not_found(
-            self.controller_instance.close, constants.CLOSE_DATAREQUEST
+        self._test_not_found(controller.close, constants.SHOW_DATAREQUEST)
+
+    def test_close_already_closed(self):
+        controller.tk.get_action.return_value.return_value = {"closed": True}
+
+        # Call the function
+        controller.close("example_uuidv4")
+
+        # Assertions
+        controller.tk.abort.assert_called_once_with(
+            403, "This data request is already closed"
         )
+        self.assertEquals(0, controller.tk.render.call_count)
 
     @parameterized.expand([(None,), ("organization_uuidv4",)])
-    def test_close(
+    def test_close(self, organization):
+        self._test_close(organization)
+
+    def _test_close(
         self,
         organization,
-        post_content={},
+        post_content=None,
         errors={},
         errors_summary={},
-        close_datarequest=MagicMock(),
+        close_datarequest=None,
     ):
-        controller.tk.response.location = None
-        controller.tk.response.status_int = 200
-        controller.request.POST = post_content
+        if post_content is not None:
+            controller.request.method = "POST"
+            controller.request.form = post_content
 
         datarequest_id = "example_uuidv4"
         datarequest = {"id": "uuid4", "user_id": "user_uuid4", "title": "example_title"}
@@ -858,7 +930,7 @@ class UIControllerTest(unittest.TestCase):
         controller.tk.get_action.side_effect = _get_action
 
         # Call the function
-        result = self.controller_instance.close(datarequest_id)
+        result = controller.close(datarequest_id)
 
         # Check that the methods has been called
         controller.tk.check_access.assert_called_once_with(
@@ -879,17 +951,16 @@ class UIControllerTest(unittest.TestCase):
         controller.tk.render.assert_called_once_with("datarequests/close.html")
         self.assertEquals(result, controller.tk.render.return_value)
 
-        self.assertIsNone(controller.tk.response.location)
-        self.assertEquals(200, controller.tk.response.status_int)
-        self.assertEquals(errors, controller.c.errors)
-        self.assertEquals(errors_summary, controller.c.errors_summary)
-        self.assertEquals(datarequest, controller.c.datarequest)
+        self.assertEquals(errors, controller.g.errors)
+        self.assertEquals(errors_summary, controller.g.errors_summary)
+        self.assertEquals(datarequest, controller.g.datarequest)
 
         expected_datasets = packages_org if organization else packages_no_org
-        self.assertEquals(expected_datasets, controller.c.datasets)
+        self.assertEquals(expected_datasets, controller.g.datasets)
 
     def test_close_post_no_error(self):
-        controller.request.POST = {"accepted_dataset": "example_ds"}
+        controller.request.method = "POST"
+        controller.request.form = {"accepted_dataset_id": "example_ds"}
 
         datarequest_id = "example_uuidv4"
         datarequest = {"id": "uuid4", "user_id": "user_uuid4", "title": "example_title"}
@@ -905,9 +976,13 @@ class UIControllerTest(unittest.TestCase):
         controller.tk.get_action.side_effect = _get_action
 
         # Call the function
-        result = self.controller_instance.close(datarequest_id)
+        result = controller.close(datarequest_id)
 
         # Checks
+        close_datarequest.assert_called_once_with(
+            self.expected_context,
+            {"accepted_dataset_id": "example_ds", "id": datarequest_id},
+        )
         controller.helpers.url_for.assert_called_once_with(
             controller="datarequests",
             action="show",
@@ -916,18 +991,19 @@ class UIControllerTest(unittest.TestCase):
         controller.tk.redirect_to.assert_called_once_with(
             controller.helpers.url_for.return_value
         )
-        self.assertIsNone(result)
+        self.assertEquals(controller.tk.redirect_to.return_value, result)
+        self.assertEquals(0, controller.tk.render.call_count)
 
     @parameterized.expand([(None,), ("organization_uuidv4",)])
     def test_close_post_errors(self, organization):
-        post_content = {"accepted_dataset": "example_ds"}
+        post_content = {"accepted_dataset_id": "example_ds"}
         exception = controller.tk.ValidationError(
             {"Accepted Dataset": ["error1", "error2"]}
         )
         close_datarequest = MagicMock(side_effect=exception)
 
         # Execute the test
-        self.test_close(
+        self._test_close(
             organization,
             post_content,
             exception.error_dict,
@@ -946,7 +1022,7 @@ class UIControllerTest(unittest.TestCase):
         )
 
         # Call the function
-        result = self.controller_instance.comment(datarequest_id)
+        result = controller.comment(datarequest_id)
 
         # Assertions
         controller.tk.check_access.assert_called_once_with(
@@ -968,16 +1044,38 @@ class UIControllerTest(unittest.TestCase):
         )
 
         # Call the function
-        result = self.controller_instance.comment(datarequest_id)
+        result = controller.comment(datarequest_id)
 
         # Assertions
-        controller.tk.get_action(constants.COMMENT_DATAREQUEST)
+        controller.tk.get_action.assert_called_once_with(constants.SHOW_DATAREQUEST)
         controller.tk.abort.assert_called_once_with(
             404, f"Data Request {datarequest_id} not found"
         )
         self.assertEquals(0, controller.tk.render.call_count)
         self.assertIsNone(result)
 
+    def test_comment_list_invalid_cursor(self):
+        controller.request.args = {"cursor": "invalid"}
+
+        def _get_action(action):
+            if action == constants.LIST_DATAREQUEST_COMMENTS:
+                return MagicMock(
+                    side_effect=controller.tk.ValidationError({"cursor": ["Invalid"]})
+                )
+            return MagicMock()
+
+        controller.tk.get_action.side_effect = _get_action
+
+        # Call the function
+        result = controller.comment("example_uuidv4")
+
+        # Assertions
+        controller.tk.abort.assert_called_once_with(
+            400, '"cursor" parameter is not valid'
+        )
+        self.assertEquals(0, controller.tk.render.call_count)
+        self.assertIsNone(result)
+
     @parameterized.expand(
         [
             (),
@@ -1002,15 +1100,14 @@ class UIControllerTest(unittest.TestCase):
     def test_comment_list(
         self, new_comment=False, update_comment=False, comment_or_update_exception=None
     ):
-
-        controller.request.POST = {}
         datarequest_id = "example_uuidv4"
         comment_id = "comment_uuidv4"
         comment = "example comment"
         new_comment_id = "another_uuidv4"
 
         if new_comment or update_comment:
-            controller.request.POST = {
+            controller.request.method = "POST"
+            controller.request.form = {
                 "datarequest_id": datarequest_id,
                 "comment": comment,
                 "comment-id": comment_id if update_comment else "",
@@ -1035,7 +1132,14 @@ class UIControllerTest(unittest.TestCase):
         }
 
         show_datarequest = MagicMock(return_value=datarequest)
-        list_datarequest_comments = MagicMock(return_value=comments_list)
+        list_datarequest_comments = MagicMock(
+            return_value={
+                "count": len(comments_list),
+                "result": comments_list,
+                "next_cursor": None,
+                "previous_cursor": None,
+            }
+        )
         default_action = MagicMock(
             side_effect=comment_or_update_exception, return_value=default_action_return
         )
@@ -1048,27 +1152,35 @@ class UIControllerTest(unittest.TestCase):
             else:
                 return default_action
 
-        delattr(controller.c, "updated_comment")
-        delattr(controller.c, "errors")
+        delattr(controller.g, "updated_comment")
+        delattr(controller.g, "errors")
         controller.tk.get_action.side_effect = _get_action
 
         # Call the function
-        result = self.controller_instance.comment(datarequest_id)
+        result = controller.comment(datarequest_id)
 
         # Check the result
         controller.tk.render.assert_called_once_with("datarequests/comment.html")
         self.assertEquals(result, controller.tk.render.return_value)
 
         # Verify comments and data request
-        self.assertEquals(controller.c.datarequest, datarequest)
-        self.assertEquals(controller.c.comments, comments_list)
+        self.assertEquals(controller.g.datarequest, datarequest)
+        # The latest comments are retrieved first and shown in order
+        self.assertEquals(controller.g.comments, list(reversed(comments_list)))
+        self.assertIsNone(controller.g.previous_url)
+        self.assertIsNone(controller.g.next_url)
 
         # Check calls
         show_datarequest.assert_called_once_with(
             self.expected_context, {"id": datarequest_id}
         )
         list_datarequest_comments.assert_called_once_with(
-            self.expected_context, {"datarequest_id": datarequest_id}
+            self.expected_context,
+            {
+                "datarequest_id": datarequest_id,
+                "sort": "desc",
+                "limit": constants.COMMENTS_PER_PAGE,
+            },
         )
 
         if new_comment:
@@ -1103,31 +1215,86 @@ class UIControllerTest(unittest.TestCase):
             # Abort never called
             self.assertEquals(0, controller.tk.abort.call_count)
 
-            # Check controller.c values
+            # Check controller.g values
             self.assertEquals(
-                comment_or_update_exception.error_dict, controller.c.errors
+                comment_or_update_exception.error_dict, controller.g.errors
             )
 
             errors_summary = {}
             for key, error in comment_or_update_exception.error_dict.items():
                 errors_summary[key] = ", ".join(error)
 
-            self.assertEquals(errors_summary, controller.c.errors_summary)
+            self.assertEquals(errors_summary, controller.g.errors_summary)
 
         if new_comment or update_comment:
-
-            # self.assertEquals(comment, controller.c.updated_comment['comment'])
-
             if new_comment:
                 if comment_or_update_exception:
-                    self.assertEquals("", controller.c.updated_comment["id"])
+                    self.assertEquals("", controller.g.updated_comment["id"])
                 else:
                     self.assertEquals(
-                        new_comment_id, controller.c.updated_comment["id"]
+                        new_comment_id, controller.g.updated_comment["id"]
                     )
 
             if update_comment:
-                self.assertEquals(comment_id, controller.c.updated_comment["id"])
+                self.assertEquals(comment_id, controller.g.updated_comment["id"])
+        else:
+            self.assertFalse(hasattr(controller.g, "updated_comment"))
+            self.assertEquals(0, default_action.call_count)
+
+    @parameterized.expand([(True, True), (True, False), (False, True)])
+    def test_comment_list_cursor(self, has_next, has_previous):
+        datarequest_id = "example_uuidv4"
+        base_url = "http://someurl.com/datarequest/comment/example_uuidv4"
+        controller.request.args = {"cursor": "cursor"}
+        controller.helpers.url_for.return_value = base_url
+        comments_list = [{"comment": "Comment 1"}, {"comment": "Comment 2"}]
+
+        list_datarequest_comments = MagicMock(
+            return_value={
+                "count": 50,
+                "result": comments_list,
+                "next_cursor": "next" if has_next else None,
+                "previous_cursor": "previous" if has_previous else None,
+            }
+        )
+
+        def _get_action(action):
+            if action == constants.LIST_DATAREQUEST_COMMENTS:
+                return list_datarequest_comments
+            return MagicMock()
+
+        controller.tk.get_action.side_effect = _get_action
+
+        # Call the function
+        controller.comment(datarequest_id)
+
+        # The page of the cursor is retrieved
+        list_datarequest_comments.assert_called_once_with(
+            self.expected_context,
+            {
+                "datarequest_id": datarequest_id,
+                "sort": "desc",
+                "limit": constants.COMMENTS_PER_PAGE,
+                "cursor": "cursor",
+            },
+        )
+        self.assertEquals(list(reversed(comments_list)), controller.g.comments)
+
+        # Comments are retrieved from the latest one, so the next page of the
+        # list contains the previous comments
+        controller.helpers.url_for.assert_called_with(
+            controller="datarequests",
+            action="comment",
+            id=datarequest_id,
+        )
+        self.assertEquals(
+            f"{base_url}?cursor=next" if has_next else None,
+            controller.g.previous_url,
+        )
+        self.assertEquals(
+            f"{base_url}?cursor=previous" if has_previous else None,
+            controller.g.next_url,
+        )
 
     ######################################################################
     ########################### DELETE COMMENT ###########################
@@ -1140,7 +1307,7 @@ class UIControllerTest(unittest.TestCase):
         )
 
         # Call the function
-        result = self.controller_instance.delete_comment("datarequest_id", comment_id)
+        result = controller.delete_comment("datarequest_id", comment_id)
 
         # Assertions
         controller.tk.check_access.assert_called_once_with(
@@ -1162,10 +1329,12 @@ class UIControllerTest(unittest.TestCase):
         )
 
         # Call the function
-        result = self.controller_instance.delete_comment(datarequest_id, comment_id)
+        result = controller.delete_comment(datarequest_id, comment_id)
 
         # Assertions
-        controller.tk.get_action(constants.DELETE_DATAREQUEST_COMMENT)
+        controller.tk.get_action.assert_called_once_with(
+            constants.DELETE_DATAREQUEST_COMMENT
+        )
         controller.tk.abort.assert_called_once_with(
             404, f"Comment {comment_id} not found"
         )
@@ -1177,7 +1346,7 @@ class UIControllerTest(unittest.TestCase):
         comment_id = "comment_uuidv4"
 
         # Call
-        self.controller_instance.delete_comment(datarequest_id, comment_id)
+        controller.delete_comment(datarequest_id, comment_id)
 
         # Check calls
         controller.tk.get_action.assert_called_once_with(
@@ -1187,6 +1356,9 @@ class UIControllerTest(unittest.TestCase):
         delete_datarequest_comment.assert_called_once_with(
             self.expected_context, {"id": comment_id}
         )
+        controller.helpers.flash_notice.assert_called_once_with(
+            "Comment has been deleted"
+        )
 
         # Check redirection
         controller.helpers.url_for.assert_called_once_with(
@@ -1203,7 +1375,7 @@ class UIControllerTest(unittest.TestCase):
     ######################################################################
 
     def test_follow(self):
-        self.controller_instance.follow("example_uuidv4")
+        controller.follow("example_uuidv4")
 
     def test_unfollow(self):
-        self.controller_instance.unfollow("example_uuidv4")
+        controller.unfollow("example_uuidv4")
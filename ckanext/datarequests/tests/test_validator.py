@@ -45,16 +45,11 @@ class ValidatorTest(unittest.TestCase):
         validator.tk.ValidationError = self._tk.ValidationError
         validator.tk._ = self._tk._
 
-        self._db = validator.db
-        validator.db = MagicMock()
-        validator.db.DataRequest.datarequest_exists.return_value = False
-
     def tearDown(self):
         validator.tk = self._tk
 
-    @parameterized.expand([(True,), (False,)])
-    def test_validate_valid_data_request(self, avoid_existing_title_check):
-        context = {"avoid_existing_title_check": avoid_existing_title_check}
+    def test_validate_valid_data_request(self):
+        context = {}
         self.assertIsNone(validator.validate_datarequest(context, self.request_data))
         validator.tk.get_validator.assert_called_once_with("group_id_exists")
         group_validator = validator.tk.get_validator.return_value
@@ -62,38 +57,25 @@ class ValidatorTest(unittest.TestCase):
             self.request_data["organization_id"], context
         )
 
-        if avoid_existing_title_check:
-            self.assertEquals(0, validator.db.DataRequest.datarequest_exists.call_count)
-        else:
-            validator.db.DataRequest.datarequest_exists.assert_called_once_with(
-                self.request_data["title"]
-            )
-
     @parameterized.expand(
         [
             (
                 "Title",
                 generate_string(validator.constants.NAME_MAX_LENGTH + 1),
-                False,
                 f"Title must be a maximum of {validator.constants.NAME_MAX_LENGTH} characters long",
             ),
-            ("Title", "", False, "Title cannot be empty"),
-            ("Title", "DR Example Tile", True, "That title is already in use"),
+            ("Title", "", "Title cannot be empty"),
             (
                 "Description",
                 generate_string(validator.constants.DESCRIPTION_MAX_LENGTH + 1),
-                False,
                 f"Description must be a maximum of {validator.constants.DESCRIPTION_MAX_LENGTH} characters long",
             ),
         ]
     )
-    def test_validate_name_description(
-        self, field, value, title_exists, excepction_msg
-    ):
+    def test_validate_name_description(self, field, value, excepction_msg):
         context = {}
         # request_data fields are always in lowercase
         self.request_data[field.lower()] = value
-        validator.db.DataRequest.datarequest_exists.return_value = title_exists
 
         with self.assertRaises(self._tk.ValidationError) as c:
             validator.validate_datarequest(context, self.request_data)
@@ -17,7 +17,7 @@
 
 from ckan.plugins import toolkit as tk
 
-from . import constants, db, plugin as datarequests
+from . import constants
 
 
 def validate_datarequest(context, request_data):
@@ -35,18 +35,13 @@ def validate_datarequest(context, request_data):
     if not request_data["title"]:
         errors[tk._("Title")] = [tk._("Title cannot be empty")]
 
-    # Title is only checked in the database when it's correct
-    avoid_existing_title_check = (
-        context["avoid_existing_title_check"]
-        if "avoid_existing_title_check" in context
-        else False
-    )
+    # Titles already in use are rejected by the database when the data
+    # request is stored
 
-    if "Title" not in errors and not avoid_existing_title_check:
-        if db.DataRequest.datarequest_exists(request_data["title"]):
-            errors[tk._("Title")] = [tk._("That title is already in use")]
+    # Check description. The plugin module is imported here because it
+    # imports the actions, which import this module
+    from . import plugin as datarequests
 
-    # Check description
     if (
         datarequests.get_config_bool_value(
             "ckan.datarequests.description_required", False